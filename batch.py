@@ -0,0 +1,222 @@
+"""
+Multi-Vault Batch Builder
+=========================
+
+Builds every vault init.sh has set up under a root, without prompting:
+- A vault is a directory holding master.tex and MdFiles
+- Each vault is split into a convert job and a compile job (build.py
+  --phase), run as separate processes so one vault's failure or crash
+  never touches another
+- Jobs share one pool of CPUs: each holds as many as it uses, and no job
+  starts while the pool cannot give it them
+- Vaults whose notes or assets changed most recently go first
+
+Ends with each vault's outcome, the documents it produced and the time
+spent in each phase. Each job's output is kept in the vault's Logs folder.
+
+    python3 batch.py ~/Notes
+    python3 batch.py ~/Notes --cpus 8 --cheat
+"""
+
+# Standard Library Imports
+import argparse
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import build
+
+# =============================================================================
+# DISCOVERY
+# =============================================================================
+
+VAULT_MARKERS = ('master.tex', 'MdFiles')
+
+# What a vault is built from, for ordering vaults by their last change
+SOURCE_FOLDERS = ('MdFiles', 'Assets/Codes', 'Assets/Images', 'CheatSheets')
+
+# Documents a build produces
+ARTEFACTS = ('master.pdf', 'cheatsheet.pdf')
+
+BUILD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build.py')
+
+def is_vault(path):
+    """Whether a directory was set up by init.sh."""
+    return (os.path.isfile(os.path.join(path, VAULT_MARKERS[0]))
+            and os.path.isdir(os.path.join(path, VAULT_MARKERS[1])))
+
+def find_vaults(root, max_depth=3):
+    """Vault directories under root, not looking inside vaults or hidden directories."""
+    vaults = []
+    for folder, dirs, _ in os.walk(root):
+        depth = os.path.relpath(folder, root).count(os.sep) + (folder != root)
+        if is_vault(folder):
+            vaults.append(folder)
+            dirs[:] = []
+        elif depth >= max_depth:
+            dirs[:] = []
+        else:
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+    return vaults
+
+def last_change(vault):
+    """Latest mtime of any source file of a vault."""
+    latest = os.stat(os.path.join(vault, VAULT_MARKERS[0])).st_mtime
+    for name in SOURCE_FOLDERS:
+        for folder, _, files in os.walk(os.path.join(vault, name)):
+            for file in files:
+                try:
+                    latest = max(latest, os.stat(os.path.join(folder, file)).st_mtime)
+                except OSError:
+                    continue
+    return latest
+
+# =============================================================================
+# SCHEDULER
+# =============================================================================
+# Jobs are dicts: {'vault', 'phase', 'cpus', 'command', 'log'}, filled in by
+# the run with 'status' and 'seconds'. A vault's jobs run in PHASES order;
+# its compile job is skipped once its convert job failed.
+
+def vault_jobs(vault, args, cpus):
+    """The jobs building one vault."""
+    options = ['--compiler', args.compiler, '--max-passes', str(args.max_passes)]
+    options += [flag for flag, on in (('--cheat', args.cheat), ('--dirty', args.dirty)) if on]
+    # Master and the cheat sheet compile side by side
+    compile_cpus = 2 if args.cheat else 1
+    return [
+        {'vault': vault, 'phase': 'convert', 'cpus': cpus,
+         'command': [sys.executable, BUILD_SCRIPT, '--phase', 'convert', '-j', str(cpus)] + options},
+        {'vault': vault, 'phase': 'compile', 'cpus': min(compile_cpus, args.cpus),
+         'command': [sys.executable, BUILD_SCRIPT, '--phase', 'compile', '-j', '1'] + options},
+    ]
+
+def run_job(job, timeout=None):
+    """Run one job in its vault, returning (status, seconds)."""
+    os.makedirs(os.path.join(job['vault'], build.LOG_DIR), exist_ok=True)
+    job['log'] = os.path.join(job['vault'], build.LOG_DIR, f"batch_{job['phase']}.log")
+    start = time.perf_counter()
+    with open(job['log'], 'w', encoding='utf-8') as log:
+        try:
+            process = subprocess.run(job['command'], cwd=job['vault'], stdout=log, stderr=subprocess.STDOUT,
+                                     timeout=timeout)
+            status = 'ok' if process.returncode == 0 else f"exit {process.returncode}"
+        except subprocess.TimeoutExpired:
+            status = f"timed out after {timeout} s"
+        except OSError as e:
+            status = f"{type(e).__name__}: {e}"
+    return status, time.perf_counter() - start
+
+def schedule(queues, cpu_cap, timeout=None):
+    """
+    Run the job queues, one per vault in priority order, within cpu_cap CPUs.
+
+    Whenever CPUs free up, the first waiting job that fits starts, so a
+    small compile job can use CPUs a larger convert job is still waiting for.
+    """
+    queues = [list(queue) for queue in queues]
+    free = cpu_cap
+    running = {}
+    with ThreadPoolExecutor(max_workers=cpu_cap) as pool:
+        while any(queues) or running:
+            busy = {job['vault'] for job in running.values()}
+            for queue in queues:
+                if queue and queue[0]['vault'] not in busy and queue[0]['cpus'] <= free:
+                    job = queue.pop(0)
+                    free -= job['cpus']
+                    busy.add(job['vault'])
+                    running[pool.submit(run_job, job, timeout)] = job
+                    print(f"[Start] {job['vault']} {job['phase']} on {job['cpus']} CPUs")
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job = running.pop(future)
+                free += job['cpus']
+                job['status'], job['seconds'] = future.result()
+                print(f"[{'Done' if job['status'] == 'ok' else 'Failed'}] {job['vault']} {job['phase']} "
+                      f"in {job['seconds']:.1f} s ({job['status']})")
+                if job['status'] != 'ok':
+                    # Leave the rest of this vault, the others go on
+                    for queue in queues:
+                        if queue and queue[0]['vault'] == job['vault']:
+                            for skipped in queue:
+                                skipped['status'] = 'skipped'
+                            queue.clear()
+
+# =============================================================================
+# SUMMARY
+# =============================================================================
+
+def artefacts(vault, since):
+    """(name, bytes) of the documents the vault's build wrote after since."""
+    found = []
+    for name in ARTEFACTS:
+        path = os.path.join(vault, name)
+        if os.path.exists(path) and os.stat(path).st_mtime >= since:
+            found.append((name, os.stat(path).st_size))
+    return found
+
+def last_counts(vault):
+    """Counts of the vault's last convert build, from its build history."""
+    records = build.load_history(os.path.join(vault, build.HISTORY_FILE))
+    for record in reversed(records):
+        if record.get('options', {}).get('phase') == 'convert':
+            return record['counts']
+    return {}
+
+def print_summary(queues, since, elapsed):
+    """Print each vault's outcome, artefacts and phase times."""
+    print("============================================================")
+    failed = 0
+    for queue in queues:
+        vault = queue[0]['vault']
+        status = next((job['status'] for job in queue if job['status'] != 'ok'), 'ok')
+        failed += status != 'ok'
+        times = ', '.join(f"{job['phase']} {job['seconds']:.1f} s" for job in queue if 'seconds' in job)
+        counts = last_counts(vault) if queue[0].get('status') == 'ok' else {}
+        produced = ', '.join(f"{name} ({size / 1024:.0f} KiB)" for name, size in artefacts(vault, since)) or 'nothing'
+        print(f"[{'OK' if status == 'ok' else 'Failed'}] {vault}: {times}")
+        if counts:
+            print(f"    {counts.get('rebuilt', 0)} notes rebuilt, {counts.get('hit', 0)} unchanged")
+        print(f"    produced {produced}")
+        if status != 'ok':
+            log = next(job['log'] for job in queue if job['status'] not in ('ok', 'skipped'))
+            print(f"    {status}, see {log}")
+    print(f"{len(queues) - failed} of {len(queues)} vaults built in {elapsed:.1f} seconds.")
+    print("============================================================")
+    return failed
+
+# =============================================================================
+# COMMAND LINE INTERFACE
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build every vault under a root on a shared pool of CPUs.')
+    parser.add_argument('root', help='Directory to search for vaults')
+    parser.add_argument('--cpus', type=int, default=os.cpu_count(), help='CPUs all jobs share (default: all)')
+    parser.add_argument('--vault-jobs', type=int, default=4, help='CPUs one vault converts on (default: 4)')
+    parser.add_argument('--max-depth', type=int, default=3, help='How deep under root to look for vaults')
+    parser.add_argument('--timeout', type=float, help='Seconds after which a job is stopped and its vault failed')
+    parser.add_argument('--cheat', action='store_true', help='Also convert and compile the cheat sheets')
+    parser.add_argument('--dirty', action='store_true', help='Draft builds typesetting only the chapters that changed')
+    parser.add_argument('--compiler', default=build.DEFAULT_COMPILER, help='Compiler command line for build.py')
+    parser.add_argument('--max-passes', type=int, default=build.MAX_PASSES, help='Most compiler passes per document')
+    parser.add_argument('--list', action='store_true', help='Only list the vaults in the order they would be built')
+    args = parser.parse_args()
+
+    vaults = sorted(find_vaults(args.root, args.max_depth), key=last_change, reverse=True)
+    if not vaults:
+        print(f"[Error] No vaults found under {args.root}.")
+        sys.exit(1)
+    if args.list:
+        for vault in vaults:
+            print(f"{time.strftime('%Y-%m-%d %H:%M', time.localtime(last_change(vault)))}  {vault}")
+        sys.exit(0)
+
+    cpus = max(1, min(args.vault_jobs, args.cpus))
+    queues = [vault_jobs(vault, args, cpus) for vault in vaults]
+    since = time.time()
+    start = time.perf_counter()
+    schedule(queues, args.cpus, args.timeout)
+    sys.exit(1 if print_summary(queues, since, time.perf_counter() - start) else 0)
@@ -0,0 +1,260 @@
+"""
+Conversion Benchmark
+====================
+
+Generates a synthetic vault and times the Markdown to LaTeX converter on it:
+- End to end, through convert_md_to_tex on every note
+- Per pipeline stage, as md2tex's profiling hooks record them over a
+  conversion of every note
+
+Results are written as JSON. Given a baseline file, the run fails when any
+timing regresses past the tolerance.
+
+    python3 bench.py --notes 50 --blocks 200 --output bench.json
+    python3 bench.py --baseline bench.json --tolerance 0.2
+"""
+
+# Standard Library Imports
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+import md2tex
+
+# =============================================================================
+# SYNTHETIC VAULT GENERATOR
+# =============================================================================
+
+CJK_WORDS = ['存储器', '随机存取', '顺序查找', '定理', '证明', '函数', '收敛', '矩阵', '特征值', '算法']
+LATIN_WORDS = ['cache', 'line', 'vector', 'kernel', 'bound', 'proof', 'limit', 'graph', 'node', 'weight']
+
+def prose(rng, words=30):
+    """A line of mixed CJK and Latin prose with some inline markup."""
+    out = []
+    for _ in range(words):
+        roll = rng.random()
+        if roll < 0.05:
+            out.append(f"**{rng.choice(CJK_WORDS)}**")
+        elif roll < 0.08:
+            out.append(f"*{rng.choice(LATIN_WORDS)}*")
+        elif roll < 0.12:
+            out.append(f"$x_{{{rng.randint(1, 9)}}} > {rng.randint(0, 99)}$")
+        elif roll < 0.14:
+            out.append(f"`{rng.choice(LATIN_WORDS)}_{rng.randint(0, 9)}`")
+        else:
+            out.append(rng.choice(CJK_WORDS + LATIN_WORDS))
+    return ' '.join(out)
+
+def gen_prose(rng):
+    """A paragraph of a few prose lines."""
+    return '\n'.join(prose(rng) for _ in range(rng.randint(1, 4)))
+
+def gen_list(rng):
+    """A nested bullet list."""
+    lines = []
+    depth = 0
+    for _ in range(rng.randint(3, 12)):
+        depth = max(0, min(3, depth + rng.choice([-1, 0, 0, 1])))
+        lines.append('    ' * depth + '- ' + prose(rng, 8))
+    return '\n'.join(lines)
+
+def gen_callout(rng):
+    """A callout of any supported type and form."""
+    kind = rng.choice(['note', 'example', 'iexample', 'lemma', 'cor', 'warning', 'summary', 'concept', 'algorithm'])
+    if kind in ('summary', 'concept', 'algorithm'):
+        body = '\n'.join('> ' + prose(rng, 10) for _ in range(rng.randint(2, 6)))
+        return f"> [!{kind}] {rng.choice(CJK_WORDS)}\n{body}"
+    if kind in ('note', 'example', 'iexample', 'lemma') and rng.random() < 0.5:
+        return f"> [!{kind}] {rng.choice(CJK_WORDS)} @ {prose(rng, 12)}"
+    return f"> [!{kind}] {prose(rng, 12)}"
+
+def gen_table(rng):
+    """A table with an alignment row."""
+    cols = rng.randint(2, 5)
+    rows = [' | '.join(rng.choice(LATIN_WORDS) for _ in range(cols))]
+    rows.append(' | '.join(':-:' for _ in range(cols)))
+    for _ in range(rng.randint(2, 20)):
+        rows.append(' | '.join(str(rng.randint(0, 10 ** 4)) for _ in range(cols)))
+    return '\n'.join(f"| {row} |" for row in rows)
+
+def gen_math(rng):
+    """A display math block."""
+    lines = [f"a_{{{i}}} - b_{{{i}}} > \\sum_{{k=1}}^{{{rng.randint(2, 9)}}} k^2 \\\\" for i in range(rng.randint(1, 4))]
+    return '$$\n' + '\n'.join(lines) + '\n$$'
+
+def gen_code(rng):
+    """A fenced Python code block."""
+    lines = [f"    x_{i} = [y * {i} for y in range({rng.randint(1, 99)})]  # -> list" for i in range(rng.randint(3, 15))]
+    return '```python\ndef f():\n' + '\n'.join(lines) + '\n```'
+
+def gen_embed(rng):
+    """An image or code embed."""
+    if rng.random() < 0.5:
+        return f"![[figure_{rng.randint(0, 99)}.png]]"
+    start = rng.randint(1, 50)
+    return f"[[algo_{rng.randint(0, 9)}.py|solver_{rng.randint(0, 9)}|{start}:{start + rng.randint(5, 40)}]]"
+
+def gen_heading(rng):
+    """A heading of level 1 to 4."""
+    return '#' * rng.randint(1, 4) + ' ' + rng.choice(CJK_WORDS)
+
+GENERATORS = {
+    'prose': gen_prose,
+    'list': gen_list,
+    'callout': gen_callout,
+    'table': gen_table,
+    'math': gen_math,
+    'code': gen_code,
+    'embed': gen_embed,
+    'heading': gen_heading,
+}
+
+DEFAULT_MIX = {'prose': 5, 'list': 2, 'callout': 2, 'table': 1, 'math': 1, 'code': 1, 'embed': 1, 'heading': 1}
+
+def generate_note(rng, blocks, mix):
+    """Generate one note of `blocks` blocks drawn according to the feature mix weights."""
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    return '\n\n'.join(GENERATORS[kind](rng) for kind in rng.choices(kinds, weights, k=blocks)) + '\n'
+
+def generate_vault(root, notes, blocks, mix, seed=0):
+    """Write a synthetic vault under root and return the paths of its notes."""
+    rng = random.Random(seed)
+    md_dir = os.path.join(root, 'MdFiles')
+    os.makedirs(md_dir, exist_ok=True)
+    paths = []
+    for i in range(notes):
+        path = os.path.join(md_dir, f"note_{i:04d}.md")
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(generate_note(rng, blocks, mix))
+        paths.append(path)
+    return paths
+
+def parse_mix(spec):
+    """Parse 'prose=5,table=2' into a mix dict layered over DEFAULT_MIX."""
+    mix = dict(DEFAULT_MIX)
+    for item in filter(None, spec.split(',')):
+        kind, _, weight = item.partition('=')
+        if kind not in GENERATORS:
+            raise argparse.ArgumentTypeError(f"unknown feature '{kind}', expected one of {', '.join(GENERATORS)}")
+        mix[kind] = float(weight)
+    return mix
+
+# =============================================================================
+# TIMING
+# =============================================================================
+
+# The stages convert_md_to_tex runs, by their run_stage names
+STAGES = ('lift_verbatim_spans', 'parse_blocks', 'emit_latex', 'render_table', 'convert_enumerate', 'restore_spans')
+
+def best_of(repeat, func, *args):
+    """Smallest wall time of `repeat` calls to func(*args)."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def stage_times(texts):
+    """Seconds spent in each of STAGES converting every text once, from the profiling hooks."""
+    md2tex.enable_profiling(count_patterns=False)
+    try:
+        for text in texts:
+            md2tex.convert_markdown(text)
+    finally:
+        profile = md2tex.disable_profiling()
+    stages = dict(md2tex.summarize_profile(profile)['stages'])
+    return {name: stages[name]['time'] if name in stages else 0.0 for name in STAGES}
+
+def run_benchmark(paths, out_dir, repeat=3):
+    """Time every stage and the end-to-end conversion over the given notes."""
+    texts = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+
+    timings = dict.fromkeys(STAGES, float('inf'))
+    for _ in range(repeat):
+        for name, seconds in stage_times(texts).items():
+            timings[name] = min(timings[name], seconds)
+
+    def convert_all():
+        for path in paths:
+            output = os.path.join(out_dir, os.path.basename(path)[:-3] + '.tex')
+            md2tex.convert_md_to_tex(path, output)
+
+    timings['end_to_end'] = best_of(repeat, convert_all)
+    return {
+        'timings': timings,
+        'notes': len(texts),
+        'bytes': sum(len(text.encode('utf-8')) for text in texts),
+    }
+
+def find_regressions(results, baseline, tolerance):
+    """List (name, baseline, current) for timings slower than baseline by more than tolerance."""
+    regressions = []
+    for name, before in baseline['timings'].items():
+        now = results['timings'].get(name)
+        if now is not None and now > before * (1 + tolerance):
+            regressions.append((name, before, now))
+    return regressions
+
+def print_report(results, baseline=None):
+    """Print the timings, with the change against the baseline when given."""
+    size = results['bytes'] / 1024
+    print(f"{results['notes']} notes, {size:.0f} KiB")
+    for name, seconds in sorted(results['timings'].items(), key=lambda item: -item[1]):
+        line = f"  {name:<20} {seconds * 1000:10.2f} ms  {size / 1024 / seconds if seconds else 0:8.2f} MiB/s"
+        if baseline and name in baseline['timings']:
+            line += f"  ({(seconds / baseline['timings'][name] - 1) * 100:+.1f}%)"
+        print(line)
+
+# =============================================================================
+# COMMAND LINE INTERFACE
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the Markdown to LaTeX converter on a synthetic vault.')
+    parser.add_argument('--notes', type=int, default=20, help='Number of notes in the vault')
+    parser.add_argument('--blocks', type=int, default=200, help='Blocks per note')
+    parser.add_argument('--mix', type=parse_mix, default=dict(DEFAULT_MIX),
+                        help=f"Feature weights, e.g. 'table=3,code=0' ({', '.join(GENERATORS)})")
+    parser.add_argument('--seed', type=int, default=0, help='Random seed for the generator')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the best is kept')
+    parser.add_argument('--output', help='Write results to this JSON file')
+    parser.add_argument('--baseline', help='Compare against this results JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown against the baseline (0.2 = 20%%)')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as root:
+        paths = generate_vault(root, args.notes, args.blocks, args.mix, args.seed)
+        results = run_benchmark(paths, root, args.repeat)
+
+    results['config'] = {'notes': args.notes, 'blocks': args.blocks, 'mix': args.mix, 'seed': args.seed}
+    results['python'] = platform.python_version()
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}.")
+
+    if baseline:
+        if baseline.get('config') != results['config']:
+            print("[Warning] Baseline was recorded with a different vault configuration.")
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for name, before, now in regressions:
+            print(f"[Regression] {name}: {before * 1000:.2f} ms -> {now * 1000:.2f} ms")
+        if regressions:
+            sys.exit(1)
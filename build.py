@@ -0,0 +1,633 @@
+"""
+Vault Build Driver
+==================
+
+Builds a vault from its root directory:
+- Converts MdFiles to TeXFiles, and with --cheat the cheat sheets
+- Compiles master.tex, and cheatsheet.tex alongside it, running another pass
+  only while the .aux, .toc and theorem list files still change
+- Loads each document's preamble from a cached precompiled format
+- Pre-highlights code into cached fragments instead of lexing it each pass
+- Regenerates Content.md
+
+Every phase is timed, and each build is appended with the vault's size to
+Logs/build_history.jsonl; the report command shows the trend of each phase
+and flags the ones slower than in recent builds. When a compile fails, its
+errors are listed at the note lines they came from; the triage command lists
+them with the overfull boxes of any compile log. The compiler is a command
+line, so a stand-in can be used in place of xelatex:
+
+    python3 build.py --cheat
+    python3 build.py --compiler "python3 fake_tex.py"
+    python3 build.py report --window 20
+    python3 build.py triage Logs/master_compile.log
+"""
+
+# Standard Library Imports
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import shlex
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import md2tex
+
+# =============================================================================
+# CONFIGURATION
+# =============================================================================
+
+DEFAULT_COMPILER = 'xelatex -interaction=nonstopmode'
+
+# Files a pass writes for the next one to read: labels, contents, hyperref
+# bookmarks and the \listthem lists of theorems
+RERUN_EXTENSIONS = ('.aux', '.toc', '.out', '.loe', '.lof', '.lot')
+
+MAX_PASSES = 4
+
+# A build converts the notes, then compiles the documents and the content
+# index; batch.py schedules the two as separate jobs
+PHASES = ('convert', 'compile')
+
+LOG_DIR = 'Logs'
+
+# =============================================================================
+# COMPILING
+# =============================================================================
+
+# Chapters pulled in with \include get their own .aux, listed in the main one
+AUX_INPUT_PATTERN = re.compile(rb'\\@input\{([^}]+)\}')
+
+def rerun_snapshot(document):
+    """Hash of each rerun file of a document and its chapters, None for the ones that do not exist."""
+    stem = os.path.splitext(document)[0]
+    paths = [stem + ext for ext in RERUN_EXTENSIONS]
+    snapshot = {}
+    while paths:
+        path = paths.pop()
+        if path in snapshot:
+            continue
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            snapshot[path] = None
+            continue
+        snapshot[path] = hashlib.sha256(data).hexdigest()
+        if path.endswith('.aux'):
+            paths.extend(name.decode('utf-8') for name in AUX_INPUT_PATTERN.findall(data))
+    return snapshot
+
+def compile_document(document, compiler=DEFAULT_COMPILER, max_passes=MAX_PASSES, fmt=None):
+    """
+    Compile a document until its rerun files stop changing, from format fmt if given.
+
+    The compiler output goes to Logs/<name>_compile.log. A pass that exits
+    with an error still writes the rerun files in nonstopmode, so passes go
+    on while they change. A compiler that cannot be started is reported in
+    the log. Returns a dict with the 'passes' run, their 'times', the 'log'
+    path and 'ok', which is False when any pass exited with an error or
+    could not start, or the files still changed after max_passes.
+    """
+    name = os.path.splitext(os.path.basename(document))[0]
+    log_path = os.path.join(LOG_DIR, f"{name}_compile.log")
+    command = shlex.split(compiler) + ([f'-fmt={fmt}'] if fmt else []) + [document]
+    env = format_environment() if fmt else None
+    result = {'passes': 0, 'times': [], 'ok': False, 'log': log_path}
+    failed = settled = False
+
+    with open(log_path, 'w', encoding='utf-8') as log:
+        before = rerun_snapshot(document)
+        while result['passes'] < max_passes and not settled:
+            start = time.perf_counter()
+            try:
+                process = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, env=env)
+            except OSError as e:
+                log.write(f"! Could not run {command[0]}: {type(e).__name__}: {e}\n")
+                failed = True
+                break
+            result['times'].append(time.perf_counter() - start)
+            result['passes'] += 1
+            failed = failed or process.returncode != 0
+            after = rerun_snapshot(document)
+            settled = after == before
+            before = after
+    result['ok'] = settled and not failed
+    return result
+
+# =============================================================================
+# PREAMBLE FORMAT CACHE
+# =============================================================================
+# Loading the preamble (tufte, listings, TikZ, the theorem setup) is most of
+# the startup of every pass. It is dumped once into a format with
+# mylatexformat, and passes load that instead. Formats live in a per-user
+# cache keyed on the engine, the document's preamble and every file it
+# \inputs, read through init.sh's symlinks, so vaults sharing the toolkit
+# preamble share one format. XeTeX will not dump fonts loaded through
+# fontspec, so the preambles skip them while a format is dumped and the
+# documents call \LoadPreambleFonts after \endofdump. A document from before
+# that split (an older master.tex copied into a vault) is compiled the normal
+# way, as is a preamble that still cannot be dumped. A failed dump is only
+# remembered for FAILED_FORMAT_TTL, so a killed run or a full disk does not
+# keep the format from being built for good.
+
+FORMAT_CACHE = os.path.join(os.environ.get('XDG_CACHE_HOME', os.path.expanduser('~/.cache')), 'e999', 'formats')
+FAILED_FORMAT_TTL = 24 * 3600  # Seconds before a failed dump is tried again
+
+INPUT_PATTERN = re.compile(r'\\input\{([^}]+)\}')
+
+DUMP_MARKER = '\\csname endofdump\\endcsname'
+FONTS_CALL = '\\csname LoadPreambleFonts\\endcsname'
+
+def loads_fonts_after_dump(document):
+    """Whether a document marks its dump point and loads the preamble fonts after it."""
+    with open(document, 'r', encoding='utf-8') as f:
+        text = f.read()
+    return DUMP_MARKER in text and FONTS_CALL in text[text.index(DUMP_MARKER):]
+
+def document_preamble(document):
+    """The part of a document before \\begin{document}, or before \\endofdump if it has one."""
+    with open(document, 'r', encoding='utf-8') as f:
+        text = f.read()
+    for marker in (DUMP_MARKER, '\\endofdump', '\\begin{document}'):
+        if marker in text:
+            return text[:text.index(marker)]
+    return text
+
+def preamble_files(document):
+    """Real paths of the files a document's preamble inputs, recursively."""
+    found = []
+    pending = [(os.path.dirname(os.path.abspath(document)), document_preamble(document))]
+    while pending:
+        folder, text = pending.pop()
+        for name in INPUT_PATTERN.findall(text):
+            path = os.path.join(folder, name if name.endswith('.tex') else name + '.tex')
+            real = os.path.realpath(path)
+            if real in found or not os.path.exists(real):
+                continue
+            found.append(real)
+            with open(real, 'r', encoding='utf-8') as f:
+                # Relative inputs are resolved from the document, as TeX does
+                pending.append((folder, f.read()))
+    return found
+
+def format_key(document, compiler):
+    """Hash of everything a dumped format depends on."""
+    engine = shutil.which(shlex.split(compiler)[0]) or compiler
+    digest = hashlib.sha256()
+    digest.update(compiler.encode('utf-8'))
+    if os.path.exists(engine):
+        digest.update(f"{os.path.realpath(engine)}:{os.stat(engine).st_mtime_ns}".encode('utf-8'))
+    digest.update(document_preamble(document).encode('utf-8'))
+    for path in preamble_files(document):
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+def ensure_format(document, compiler=DEFAULT_COMPILER):
+    """Name of a format holding the document's preamble, dumping it if needed, or None to compile without."""
+    if not loads_fonts_after_dump(document):
+        print(f"[Warning] {document} does not load its fonts after \\endofdump, compiling without a format.")
+        return None
+    stem = os.path.splitext(os.path.basename(document))[0]
+    name = f"{stem}-{format_key(document, compiler)[:16]}"
+    if os.path.exists(os.path.join(FORMAT_CACHE, name + '.fmt')):
+        return name
+    failed = os.path.join(FORMAT_CACHE, name + '.failed')
+    if os.path.exists(failed) and time.time() - os.path.getmtime(failed) < FAILED_FORMAT_TTL:
+        return None
+
+    os.makedirs(FORMAT_CACHE, exist_ok=True)
+    command = shlex.split(compiler)
+    # Dump under a temporary name so concurrent builds never load a partial format
+    temp_name = f"{name}.{os.getpid()}"
+    command += ['-ini', f'-jobname={temp_name}', f'-output-directory={FORMAT_CACHE}',
+                f'&{os.path.basename(command[0])}', 'mylatexformat.ltx', document]
+    with open(os.path.join(LOG_DIR, f"{stem}_format.log"), 'w', encoding='utf-8') as log:
+        try:
+            returncode = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT).returncode
+        except OSError as e:
+            returncode = f"{type(e).__name__}: {e}"
+    temp_fmt = os.path.join(FORMAT_CACHE, temp_name + '.fmt')
+    if returncode == 0 and os.path.exists(temp_fmt):
+        os.replace(temp_fmt, os.path.join(FORMAT_CACHE, name + '.fmt'))
+        return name
+
+    if os.path.exists(temp_fmt):
+        os.remove(temp_fmt)
+    with open(failed, 'w', encoding='utf-8') as f:
+        f.write(f"{returncode}\n")
+    print(f"[Warning] Could not dump a format for {document}, compiling without one (see {LOG_DIR}/{stem}_format.log).")
+    return None
+
+def format_environment():
+    """Environment in which the engine finds cached formats as well as its own."""
+    env = dict(os.environ)
+    env['TEXFORMATS'] = FORMAT_CACHE + os.pathsep + env.get('TEXFORMATS', '')
+    return env
+
+# =============================================================================
+# LOG TRIAGE
+# =============================================================================
+# Reads a compile log once, top to bottom, for every error and overfull box
+# of every pass, and points each at the note line it came from through the
+# source maps md2tex writes next to TeXFiles/*.tex. TeX wraps its output at
+# 79 columns and marks the file it is reading with '(' path ... ')'; error
+# context, help and box contents run to the next blank line and are skipped,
+# as their parentheses are not files.
+
+LOG_WRAP = 79
+
+TEX_ERROR_PATTERN = re.compile(r'^! (.*)')
+FILE_LINE_ERROR_PATTERN = re.compile(r'^(\S+\.\w+):(\d+): (.*)')
+ERROR_LINE_PATTERN = re.compile(r'^l\.(\d+)')
+OVERFULL_PATTERN = re.compile(r'^(Overfull \\[hv]box \([^)]*\)).*?lines? (\d+)(?:--(\d+))?')
+FILE_TOKEN_PATTERN = re.compile(r'\(([^()\s]*)|\)')
+FILE_NAME_PATTERN = re.compile(r'[\w./-]+\.\w+$')
+
+def log_lines(f):
+    """Lines of a TeX log with the lines TeX wrapped joined back."""
+    wrapped = ''
+    for line in f:
+        line = line.rstrip('\n')
+        if len(line) == LOG_WRAP:
+            wrapped += line
+            continue
+        yield wrapped + line
+        wrapped = ''
+    if wrapped:
+        yield wrapped
+
+def triage_log(log_path):
+    """
+    The errors and overfull boxes in a compile log, each once, in order.
+
+    Issues are dicts {'kind', 'message', 'file', 'line', 'end'}, with 'kind'
+    'error' or 'overfull' and 'line' None when the log gives none.
+    """
+    issues = []
+    seen = set()
+    stack = []  # Tokens after each open parenthesis, file names among them
+    pending = None  # Message of an error whose l.N line is still to come
+    skipping = False
+
+    def current_file():
+        return next((token for token in reversed(stack) if FILE_NAME_PATTERN.match(token)), None)
+
+    def add(kind, message, file, line, end=None):
+        file = file and os.path.normpath(file)
+        if (file, line, message) not in seen:
+            seen.add((file, line, message))
+            issues.append({'kind': kind, 'message': message, 'file': file, 'line': line, 'end': end})
+
+    with open(log_path, 'r', encoding='utf-8', errors='replace') as f:
+        for line in log_lines(f):
+            if pending is not None:
+                match = ERROR_LINE_PATTERN.match(line)
+                if match:
+                    add('error', pending, current_file(), int(match.group(1)))
+                    pending = None
+                    skipping = True
+                    continue
+                if line.strip() and not TEX_ERROR_PATTERN.match(line):
+                    continue
+                # No l.N before the next blank line or error, e.g. ! Emergency stop.
+                add('error', pending, current_file(), None)
+                pending = None
+                if not line.strip():
+                    continue
+            if skipping:
+                skipping = bool(line.strip())
+                continue
+            match = TEX_ERROR_PATTERN.match(line)
+            if match:
+                pending = match.group(1)
+                continue
+            match = FILE_LINE_ERROR_PATTERN.match(line)
+            if match:
+                add('error', match.group(3), match.group(1), int(match.group(2)))
+                skipping = True
+                continue
+            match = OVERFULL_PATTERN.match(line)
+            if match:
+                add('overfull', match.group(1), current_file(), int(match.group(2)),
+                    match.group(3) and int(match.group(3)))
+                skipping = True
+                continue
+            for token in FILE_TOKEN_PATTERN.finditer(line):
+                if token.group(0) == ')':
+                    if stack:
+                        stack.pop()
+                else:
+                    stack.append(token.group(1))
+    if pending is not None:
+        add('error', pending, current_file(), None)
+    return issues
+
+def locate_issues(issues):
+    """Add the 'source' note and 'source_line' of issues in generated files that have a source map."""
+    maps = {}
+    for issue in issues:
+        file = issue['file']
+        if issue['line'] is None or not file or not file.endswith('.tex'):
+            continue
+        if file not in maps:
+            maps[file] = md2tex.load_source_map(file)
+        if maps[file] is not None:
+            issue['source'] = maps[file]['source']
+            issue['source_line'] = md2tex.source_line(maps[file], issue['line'])
+    return issues
+
+def issue_text(issue):
+    """file:line: message, naming the note line and the .tex line behind it when known."""
+    tex = issue['file'] or '?'
+    if issue['line'] is not None:
+        tex += f":{issue['line']}" + (f"--{issue['end']}" if issue['end'] else '')
+    if 'source' in issue:
+        return f"{issue['source']}:{issue['source_line']}: {issue['message']} ({tex})"
+    return f"{tex}: {issue['message']}"
+
+def print_issues(issues, overfull=True):
+    """Print errors, then overfull boxes or only their number."""
+    errors = [issue for issue in issues if issue['kind'] == 'error']
+    boxes = [issue for issue in issues if issue['kind'] == 'overfull']
+    for issue in errors:
+        print(f"[Error] {issue_text(issue)}")
+    if overfull:
+        for issue in boxes:
+            print(f"[Warning] {issue_text(issue)}")
+    elif boxes:
+        print(f"[Warning] {len(boxes)} overfull boxes, see python3 build.py triage.")
+    return len(errors)
+
+# =============================================================================
+# PHASES
+# =============================================================================
+
+def timed(timings, name, func, *args):
+    """Call func(*args), adding its wall time to timings[name]."""
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        timings[name] = time.perf_counter() - start
+
+def convert_notes(n_jobs, images, dirty_only=False, snippets=True):
+    """Convert MdFiles to TeXFiles through the md2tex library API, returning its report."""
+    md2tex.load_callout_config(os.path.join('MdFiles', md2tex.CALLOUT_CONFIG))
+    md2tex.use_image_derivatives('.', md2tex.build_image_derivatives('.', n_jobs) if images else {})
+    md2tex.use_code_snippets('.', md2tex.SNIPPET_STYLE if snippets else None)
+    return md2tex.convert_all_md_in_directory(n_jobs=n_jobs, verbose=False, input_root='MdFiles',
+                                              output_root='TeXFiles', dirty_only=dirty_only)
+
+def convert_cheatsheets():
+    """Run md2ch.py in CheatSheets."""
+    return subprocess.run([sys.executable, 'md2ch.py'], cwd='CheatSheets').returncode == 0
+
+def generate_content():
+    """Run content_gen.py to regenerate Content.md."""
+    return subprocess.run([sys.executable, 'content_gen.py']).returncode == 0
+
+def report_compile(timings, name, result):
+    """Record each pass of a compile in timings and say whether it succeeded."""
+    timings[f"{name} Passes"] = result['passes']
+    for i, seconds in enumerate(result['times'], 1):
+        timings[f"{name} Pass {i}"] = seconds
+    if not result['ok']:
+        print(f"[Error] {name} failed after {result['passes']} passes, see {result['log']}.")
+        print_issues(locate_issues(triage_log(result['log'])), overfull=False)
+    return result['ok']
+
+def build(cheat=False, compiler=DEFAULT_COMPILER, n_jobs=1, images=True, max_passes=MAX_PASSES, formats=True,
+          dirty_only=False, snippets=True, phases=PHASES):
+    """
+    Build the vault in the current directory, returning (ok, timings, counts).
+
+    Notes are converted first. Master, the cheat sheet pipeline and the
+    content index then run concurrently, as they share no files. With
+    formats on, each document is compiled from a cached preamble format.
+    With snippets on, code is pre-highlighted instead of lexed by listings.
+    With dirty_only, master.tex typesets only the chapters just rebuilt.
+    Only the given PHASES are run.
+    counts holds the number of notes in each state of the conversion report
+    and the passes each document took.
+    """
+    os.makedirs(LOG_DIR, exist_ok=True)
+    timings = {}
+    start = time.perf_counter()
+    ok = True
+    counts = {}
+    if 'convert' in phases:
+        report = timed(timings, 'Markdown Convert to TeX', convert_notes, n_jobs, images, dirty_only, snippets)
+        ok = not report['failed']
+        counts = {state: len(files) for state, files in report.items()}
+
+    def compile_with_format(name, document):
+        fmt = timed(timings, f"{name} Format", ensure_format, document, compiler) if formats else None
+        return timed(timings, f"{name} Compiling", compile_document, document, compiler, max_passes, fmt)
+
+    def master():
+        result = compile_with_format('Main File', 'master.tex')
+        return report_compile(timings, 'Main File', result)
+
+    def cheatsheet():
+        if not os.path.isdir('CheatSheets'):
+            print("[Cheatsheets] No CheatSheets Dir found!")
+            return True
+        converted = timed(timings, 'CheatSheet Convert', convert_cheatsheets)
+        result = compile_with_format('CheatSheet', 'cheatsheet.tex')
+        return report_compile(timings, 'CheatSheet', result) and converted
+
+    if 'compile' in phases:
+        with ThreadPoolExecutor() as pool:
+            tasks = [pool.submit(master), pool.submit(timed, timings, 'Content Index', generate_content)]
+            if cheat:
+                tasks.append(pool.submit(cheatsheet))
+            ok = all([task.result() for task in tasks]) and ok
+
+    timings['All'] = time.perf_counter() - start
+    counts.update((name, timings.pop(name)) for name in list(timings) if name.endswith(' Passes'))
+    return ok, timings, counts
+
+def print_timings(timings):
+    """Print phase timings in the run.sh format."""
+    print("============================================================")
+    for name, seconds in timings.items():
+        print(f"[{name} Cost]: {seconds:.3f} seconds")
+    print("Q.E.D.")
+    print("============================================================")
+
+# =============================================================================
+# BUILD HISTORY
+# =============================================================================
+# One JSON object per line, appended after every build and never rewritten:
+#   {"time", "ok", "options": {...}, "vault": {...}, "counts": {...}, "phases": {name: seconds}}
+# Builds only compare with earlier builds run with the same options, since
+# a draft or a cheat sheet build does different work.
+
+HISTORY_FILE = os.path.join(LOG_DIR, 'build_history.jsonl')
+
+# A phase is a regression when it is this much slower than the median of
+# the previous builds, by both ratio and seconds
+REGRESSION_RATIO = 1.25
+REGRESSION_SECONDS = 0.5
+
+# Folders measured in each record: name -> folder
+VAULT_FOLDERS = {'notes': 'MdFiles', 'codes': 'Assets/Codes', 'images': 'Assets/Images', 'cheatsheets': 'CheatSheets'}
+
+SPARKS = '▁▂▃▄▅▆▇█'
+
+def vault_metrics():
+    """Number of files and bytes in each of VAULT_FOLDERS."""
+    metrics = {}
+    for name, folder in VAULT_FOLDERS.items():
+        count = size = 0
+        for root, _, files in os.walk(folder):
+            for file in files:
+                if name not in ('notes', 'cheatsheets') or file.endswith('.md'):
+                    count += 1
+                    size += os.path.getsize(os.path.join(root, file))
+        metrics[name] = count
+        metrics[f"{name}_bytes"] = size
+    return metrics
+
+def append_history(record, path=HISTORY_FILE):
+    """Append one build record to the history."""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+def load_history(path=HISTORY_FILE):
+    """Every build record in the history, oldest first, skipping lines that do not parse."""
+    records = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for number, line in enumerate(f, 1):
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    print(f"[Warning] {path}:{number} is not a build record, skipped.")
+    except FileNotFoundError:
+        pass
+    return records
+
+def percentile(values, q):
+    """The q-th percentile of values, interpolating between the nearest ranks."""
+    values = sorted(values)
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+def sparkline(values):
+    """A row of bars for values, scaled from their minimum to their maximum."""
+    low, high = min(values), max(values)
+    if high - low < 1e-9:
+        return SPARKS[0] * len(values)
+    return ''.join(SPARKS[round((value - low) / (high - low) * (len(SPARKS) - 1))] for value in values)
+
+def regressions(records, window=10):
+    """
+    (phase, seconds, baseline) for each phase of the last record slower than
+    the median of the window builds before it with the same options.
+    """
+    latest = records[-1]
+    previous = [record for record in records[:-1] if record['options'] == latest['options']][-window:]
+    found = []
+    for phase, seconds in latest['phases'].items():
+        history = [record['phases'][phase] for record in previous if phase in record['phases']]
+        if not history:
+            continue
+        baseline = percentile(history, 50)
+        if seconds > baseline * REGRESSION_RATIO and seconds - baseline > REGRESSION_SECONDS:
+            found.append((phase, seconds, baseline))
+    return found
+
+def print_report(records, window=10):
+    """Print each phase's trend and percentiles over the last window builds like the latest, and its regressions."""
+    if not records:
+        print(f"No builds recorded in {HISTORY_FILE} yet.")
+        return
+    latest = records[-1]
+    similar = [record for record in records if record['options'] == latest['options']][-window:]
+    options = ', '.join(f"{key}={value}" for key, value in sorted(latest['options'].items()))
+    print("============================================================")
+    print(f"Last {len(similar)} of {len(records)} builds with {options}")
+    print(f"{'Phase':<28} {'Trend':<{window}} {'Last':>8} {'p50':>8} {'p90':>8} {'Max':>8}")
+    phases = list(latest['phases'])
+    for phase in phases:
+        values = [record['phases'][phase] for record in similar if phase in record['phases']]
+        print(f"{phase:<28} {sparkline(values):<{window}} {values[-1]:8.3f} {percentile(values, 50):8.3f} "
+              f"{percentile(values, 90):8.3f} {max(values):8.3f}")
+
+    first = similar[0]['vault']
+    print(f"Vault: {latest['vault']['notes']} notes ({latest['vault']['notes_bytes'] / 1024:.0f} KiB), "
+          f"{latest['vault']['codes']} code files, {latest['vault']['images']} images; "
+          f"{latest['vault']['notes'] - first['notes']:+d} notes over these builds")
+    for phase, seconds, baseline in regressions(records, window):
+        print(f"[Regression] {phase}: {seconds:.3f} seconds, median of previous builds {baseline:.3f}")
+    print("============================================================")
+
+def record_build(ok, timings, counts, options):
+    """Append a finished build to the history and warn about phases that became slower."""
+    record = {
+        'time': datetime.datetime.now().isoformat(timespec='seconds'),
+        'ok': ok,
+        'options': options,
+        'vault': vault_metrics(),
+        'counts': counts,
+        'phases': {name: round(seconds, 4) for name, seconds in timings.items()},
+    }
+    append_history(record)
+    for phase, seconds, baseline in regressions(load_history()):
+        print(f"[Warning] {phase} took {seconds:.3f} seconds, the median of recent builds is {baseline:.3f}.")
+
+# =============================================================================
+# COMMAND LINE INTERFACE
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build the vault: convert notes and compile the LaTeX documents.')
+    parser.add_argument('--cheat', action='store_true', help='Also convert and compile the cheat sheets')
+    parser.add_argument('--compiler', default=DEFAULT_COMPILER, help=f"Compiler command line (default: {DEFAULT_COMPILER})")
+    parser.add_argument('--dirty', action='store_true', help='Draft build typesetting only the chapters that changed')
+    parser.add_argument('--max-passes', type=int, default=MAX_PASSES, help='Most compiler passes per document')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Processes for note and image conversion')
+    parser.add_argument('--no-format', action='store_true', help='Load the preamble on every pass instead of a cached format')
+    parser.add_argument('--no-images', action='store_true', help='Use images as they are instead of cached derivatives')
+    parser.add_argument('--no-snippets', action='store_true', help='Let listings highlight code on every pass')
+    parser.add_argument('--phase', choices=('all',) + PHASES, default='all',
+                        help='Only convert the notes, or only compile the documents (default: all)')
+    commands = parser.add_subparsers(dest='command')
+    report_parser = commands.add_parser('report', help='Show phase trends and regressions from the build history')
+    report_parser.add_argument('--window', type=int, default=10, help='Builds to compare (default: 10)')
+    triage_parser = commands.add_parser('triage', help='List the errors and overfull boxes of a compile log by note line')
+    triage_parser.add_argument('log', nargs='?', default=os.path.join(LOG_DIR, 'master_compile.log'),
+                               help='Compile log (default: Logs/master_compile.log)')
+    args = parser.parse_args()
+
+    if args.command == 'report':
+        print_report(load_history(), args.window)
+        sys.exit(0)
+    if args.command == 'triage':
+        if not os.path.exists(args.log):
+            print(f"[Error] {args.log} does not exist.")
+            sys.exit(1)
+        sys.exit(1 if print_issues(locate_issues(triage_log(args.log))) else 0)
+
+    phases = PHASES if args.phase == 'all' else (args.phase,)
+    ok, timings, counts = build(args.cheat, args.compiler, args.jobs, not args.no_images, args.max_passes,
+                                not args.no_format, args.dirty, not args.no_snippets, phases)
+    print_timings(timings)
+    options = {'cheat': args.cheat, 'dirty': args.dirty, 'formats': not args.no_format,
+               'images': not args.no_images, 'snippets': not args.no_snippets}
+    if args.phase != 'all':
+        # Phases run on their own only compare with each other
+        options['phase'] = args.phase
+    record_build(ok, timings, counts, options)
+    sys.exit(0 if ok else 1)
@@ -1,60 +1,140 @@
 #!/usr/bin/python3
 import os
-
-# Function to count 'ZN' occurrences in a file
-def count_zn_frequency(file_path):
-    try:
-        with open(file_path, 'r') as file:
-            content = file.read()
-            return content.count('ZN')  # Count case-sensitive occurrences
-    except FileNotFoundError:
-        return 0
+import re
+import json
+import mmap
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 
 # Define the folder paths
 code_folder = 'Assets/Codes'
 md_folder = 'MdFiles'
 images_folder = 'Assets/Images'
 
-# Initialize lists to store file paths
-code_files = []
-md_files = []
-images = []
-
-# Fetch code files from the code folder
-if os.path.exists(code_folder):
-    for file in sorted(os.listdir(code_folder)):
-        # Extendable list of code extensions
-        if file.endswith(('.py', '.cpp', '.wls')): 
-            code_files.append(file)
-
-# Fetch markdown files from the MdFiles folder
-if os.path.exists(md_folder):
-    for file in sorted(os.listdir(md_folder)):
-        if file.endswith('.md'):
-            md_files.append(file)
-
-# Fetch images from Images folder
-if os.path.exists(images_folder):
-    for file in sorted(os.listdir(images_folder)):
-        if file.endswith(('.png', '.svg')):
-            images.append(file)
+# Extendable lists of indexed extensions
+code_extensions = ('.py', '.cpp', '.wls')
+image_extensions = ('.png', '.svg')
+
+# Per-file facts from the last run, keyed by vault-relative path. Only files
+# whose size or mtime changed since then are read again.
+manifest_path = '.content-manifest.json'
+
+# [[target]], [[target|alias]], [[target#heading]] and ![[embeds]]
+link_pattern = re.compile(rb'\[\[([^\]|#\n]+)')
+
+def scan_file(file_path):
+    """Hash a file and, for notes, collect its ZN count and outgoing links, through one mmap."""
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return {'hash': hashlib.sha256().hexdigest(), 'zn': 0, 'links': []}
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            if not file_path.endswith('.md'):
+                return {'hash': hashlib.sha256(data).hexdigest(), 'zn': 0, 'links': []}
+            zn_count = 0
+            pos = data.find(b'ZN')
+            while pos != -1:  # Count case-sensitive occurrences
+                zn_count += 1
+                pos = data.find(b'ZN', pos + 2)
+            links = [m.group(1).decode('utf-8', 'replace').strip() for m in link_pattern.finditer(data)]
+            return {'hash': hashlib.sha256(data).hexdigest(), 'zn': zn_count, 'links': links}
+
+def list_folder(folder, extensions):
+    """Map each matching file in folder to its [mtime, size]."""
+    files = {}
+    if os.path.exists(folder):
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                if entry.name.endswith(extensions) and entry.is_file():
+                    stat = entry.stat()
+                    files[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    return files
+
+def load_manifest():
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+
+def update_manifest(previous, folders):
+    """Rebuild the manifest, rescanning new or changed files on a thread pool."""
+    manifest = {}
+    stale = []
+    for folder, extensions in folders:
+        for file, stat in list_folder(folder, extensions).items():
+            path = f"{folder}/{file}"
+            entry = previous.get(path)
+            if entry and entry['stat'] == stat:
+                manifest[path] = entry
+            else:
+                manifest[path] = {'stat': stat}
+                stale.append(path)
+
+    with ThreadPoolExecutor() as pool:
+        for path, facts in zip(stale, pool.map(scan_file, stale)):
+            manifest[path].update(facts)
+    return manifest, len(stale)
+
+def resolve_link(target, notes, codes, images):
+    """The vault path an Obsidian link points at, or None if nothing in the index matches."""
+    name = os.path.basename(target)
+    if name in codes:
+        return f"{code_folder}/{name}"
+    if name in images:
+        return f"{images_folder}/{name}"
+    stem = name[:-3] if name.endswith('.md') else name
+    if stem in notes:
+        return f"{md_folder}/{stem}.md"
+    return None
+
+def entry_link(path):
+    """Content.md list link for a vault path."""
+    return f"[[{path}|{os.path.splitext(os.path.basename(path))[0]}]]"
+
+manifest, rescanned = update_manifest(load_manifest(), [
+    (md_folder, '.md'),
+    (code_folder, code_extensions),
+    (images_folder, image_extensions),
+])
+with open(manifest_path, 'w', encoding='utf-8') as f:
+    json.dump(manifest, f, indent=2, sort_keys=True)
+
+md_files = sorted(path for path in manifest if path.startswith(f"{md_folder}/"))
+code_files = sorted(path for path in manifest if path.startswith(f"{code_folder}/"))
+images = sorted(path for path in manifest if path.startswith(f"{images_folder}/"))
+
+# Link index: who links to each note, code file and image
+notes = {os.path.basename(path)[:-3] for path in md_files}
+codes = {os.path.basename(path) for path in code_files}
+image_names = {os.path.basename(path) for path in images}
+backlinks = {path: [] for path in manifest}
+for path in md_files:
+    for target in dict.fromkeys(manifest[path]['links']):
+        resolved = resolve_link(target, notes, codes, image_names)
+        if resolved and resolved != path and path not in backlinks[resolved]:
+            backlinks[resolved].append(path)
 
 # Create the content for the Markdown file
 content = "# MdFiles\n\n"
-for file in md_files:
-    file_path = os.path.join(md_folder, file)
-    zn_count = count_zn_frequency(file_path)
-    content += f"- [[MdFiles/{file}|{file.replace('.md', '')}]] (ZN Count: {zn_count})\n"
+for path in md_files:
+    content += f"- {entry_link(path)} (ZN Count: {manifest[path]['zn']})\n"
 
 content += "\n\n# Codes\n\n"
-content += "\n".join([f"- [[Assets/Codes/{file}|{os.path.splitext(file)[0]}]]" for file in code_files])
+content += "\n".join([f"- {entry_link(path)}" for path in code_files])
 
 content += "\n\n# Images\n\n"
-content += "\n".join([f"- [[Assets/Images/{file}|{os.path.splitext(file)[0]}]]" for file in images])
+content += "\n".join([f"- {entry_link(path)}" for path in images])
+
+content += "\n\n# Orphans\n\n"
+content += "\n".join([f"- {entry_link(path)}" for path in md_files + code_files + images if not backlinks[path]])
+
+content += "\n\n# Backlinks\n\n"
+content += "\n".join([f"- {entry_link(path)} <- {', '.join(entry_link(source) for source in backlinks[path])}"
+                      for path in md_files + code_files + images if backlinks[path]])
 
 # Save the content to a new Markdown file
 output_path = 'Content.md'
 with open(output_path, 'w') as f:
     f.write(content)
 
-print(f"Content has been saved to {output_path}.")
+print(f"Content has been saved to {output_path} ({rescanned} of {len(manifest)} files rescanned).")
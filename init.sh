@@ -2,9 +2,12 @@ md2tex=$(realpath ../md2tex.py)
 md2ch=$(realpath ../md2ch.py)
 run=$(realpath ../run.sh)
 preamble=$(realpath ../preamble.tex)
+preamble_sheet=$(realpath ../preamble_sheet.tex)
 preamble_slide=$(realpath ../preamble_slide.tex)
 preamble_report=$(realpath ../preamble_report.tex)
 content_gen=$(realpath ../content_gen.py)
+build=$(realpath ../build.py)
+preview=$(realpath ../preview.py)
 Makefile=$(realpath ../Makefile)
 # report=$(realpath ../report.tex)
 
@@ -17,11 +20,15 @@ Makefile=$(realpath ../Makefile)
 # symbolic link to preamble.tex
 [ ! -f preamble.tex ] && ln -s "$preamble" ./preamble.tex
 [ ! -f preamble_report.tex ] && ln -s "$preamble_report" ./preamble_report.tex
+# cheatsheet.tex in CheatSheets inputs ../SheetPreamble.tex
+[ ! -f SheetPreamble.tex ] && ln -s "$preamble_sheet" ./SheetPreamble.tex
 
 # directories
 mkdir -p Logs
 mkdir -p MdFiles
 mkdir -p TeXFiles
+mkdir -p Slides
+mkdir -p Reports
 mkdir -p CheatSheets
 mkdir -p Assets/Codes
 mkdir -p Assets/Images
@@ -31,14 +38,20 @@ mkdir -p Assets/Books
 cp --update=none ../master.tex .
 cp --update=none ../.gitignore .
 cp --update=none ../report.tex .
+cp --update=none ../slides.tex .
 
 # content_gen.py
 [ ! -f content_gen.py ] && ln -s "$content_gen" ./content_gen.py
 
+# build.py
+[ ! -f build.py ] && ln -s "$build" ./build.py
+
 # MdFiles directory config
 cd MdFiles
 # symbolic link to md2tex.py
 [ ! -f md2tex.py ] && ln -s "$md2tex" ./md2tex.py
+# symbolic link to preview.py
+[ ! -f preview.py ] && ln -s "$preview" ./preview.py
 
 # CheatSheets directory config
 cd ../CheatSheets
@@ -1,33 +1,76 @@
 import os
 import re
+from concurrent.futures import ProcessPoolExecutor
 
-def convert_box(match):
-    """Convert Markdown box to LaTeX subbox."""
-    title = match.group(1).strip()
-    content = match.group(2).strip()
-    return f"\\begin{{subbox}}{{{title}}}\n{content}\n\\end{{subbox}}"
+# Headings and list items are only recognised at the start of a line
+heading_pattern = re.compile(r'(#{1,3})\s*(.*)')
+item_pattern = re.compile(r'\s*-\s+(.*)')
+
+HEADINGS = {1: 'section', 2: 'subsection', 3: 'subsubsection'}
+
+def convert_box(title, content):
+    """Convert a Markdown box to a LaTeX subbox."""
+    return f"\\begin{{subbox}}{{{title.strip()}}}\n{content.strip()}\n\\end{{subbox}}"
+
+def convert_heading(line):
+    """Convert a '#' to '###' heading line, leaving any other line as it is."""
+    heading = heading_pattern.match(line)
+    if heading:
+        return f"\\{HEADINGS[len(heading.group(1))]}{{{heading.group(2)}}}"
+    return line
 
 def md_to_tex(md_content):
-    """Convert Markdown content to LaTeX."""
+    """
+    Convert Markdown content to LaTeX in one pass over its lines.
 
-    # Convert headings (# to \section, ## to \subsection, ### to \subsubsection)
-    md_content = re.sub(r'###\s*(.*)', r'\\subsubsection{\1}', md_content)
-    md_content = re.sub(r'##\s*(.*)', r'\\subsection{\1}', md_content)
-    md_content = re.sub(r'#\s*(.*)', r'\\section{\1}', md_content)
+    Consecutive '- ' items, blank lines between them included, become one
+    itemize. A box is a '---' line, a title line and content up to the next
+    '---' line, and becomes a subbox.
+    """
+    out = []
+    box = None      # Lines of the open box, title first
+    items = []      # Items of the open list
+    blanks = []     # Blank lines after an item, dropped if another item follows
 
-    # Convert unordered lists (- to \item)
-    md_content = re.sub(r'(?m)^\s*-\s+(.*)', r'\\item \1', md_content)
+    def close_list():
+        target = out if box is None else box
+        if items:
+            target.append('\\begin{itemize}')
+            target.extend(f"\\item {item}" for item in items)
+            target.append('\\end{itemize}')
+            items.clear()
+        target.extend(blanks)
+        blanks.clear()
 
-    # Surround \item with itemize environment
-    md_content = re.sub(r'\\item (.*)(?=\n|$)', r'\\begin{itemize}\n\\item \1\n\\end{itemize}', md_content)
+    for line in md_content.split('\n'):
+        item = item_pattern.match(line)
+        if item:
+            blanks.clear()
+            items.append(item.group(1))
+            continue
+        if items and not line.strip():
+            blanks.append(line)
+            continue
+        close_list()
 
-    # Convert box sections surrounded by `---`
-    box_pattern = re.compile(r'---\n(.*?)\n(.*?)\n---', re.DOTALL)
-    tex_content = re.sub(box_pattern, convert_box, md_content)
+        if line.strip() == '---':
+            if box is None:
+                box = []
+            else:
+                out.append(convert_box(box[0] if box else '', '\n'.join(box[1:])))
+                box = None
+        else:
+            (out if box is None else box).append(convert_heading(line))
+
+    close_list()
+    # An unclosed box is left as it was written
+    if box is not None:
+        out.append('---')
+        out.extend(box)
 
     # Additional conversion rules can be added here
-    
-    return tex_content
+
+    return '\n'.join(out)
 
 def convert_md_to_tex(md_file, tex_file):
     """Read the markdown file, convert it to LaTeX, and save the result."""
@@ -38,13 +81,13 @@ def convert_md_to_tex(md_file, tex_file):
 
     with open(tex_file, 'w', encoding='utf-8') as f:
         f.write(tex_content)
+    return md_file, tex_file
 
-def convert_all_md_files():
-    """Convert all .md files in the current directory to .tex files."""
-    for file in os.listdir('.'):
-        if file.endswith('CheatSheet.md'):
-            tex_file = file.replace('.md', '.tex')
-            convert_md_to_tex(file, tex_file)
+def convert_all_md_files(n_jobs=None):
+    """Convert all *CheatSheet.md files in the current directory to .tex files, on n_jobs processes."""
+    jobs = [(file, file.replace('.md', '.tex')) for file in sorted(os.listdir('.')) if file.endswith('CheatSheet.md')]
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        for file, tex_file in pool.map(convert_md_to_tex, *zip(*jobs)) if jobs else []:
             print(f"Converted {file} to {tex_file}")
 
 if __name__ == "__main__":
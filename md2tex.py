@@ -8,6 +8,8 @@ This script converts Markdown files to LaTeX format with special handling for:
 - Images and code blocks
 - Tables and lists
 - Special formatting (bold, italics, etc.)
+
+It can also be imported and used as a library, see LIBRARY API.
 """
 
 # Standard Library Imports
@@ -15,44 +17,99 @@ import re
 import argparse
 import os
 import glob
+import json
+import hashlib
+import bisect
+import filecmp
+import shutil
+import subprocess
+import sys
+import time
+import itertools
+import cProfile
+from concurrent.futures import ProcessPoolExecutor
 
 # =============================================================================
 # REGEX PATTERNS DEFINITION
 # =============================================================================
 # Define regex patterns for various Markdown elements to be converted to LaTeX
+# Patterns that scan ahead for a closing delimiter keep their own opener out
+# of the text in between, so an unclosed opener gives up at the next opener
+# rather than at the end of the line, and a line full of them stays linear.
+# Nothing may make a pattern quadratic on half-typed input; stress.py checks.
 
 patterns = {
-    # Callouts without content (single line)
-    'cor_no_content': re.compile(r'>\s*\[!cor\]\s*(.+)', re.MULTILINE),
-    'example_no_content': re.compile(r'>\s*\[!example\]\s*(.+)', re.MULTILINE),
-    'warning_no_content': re.compile(r'>\s*\[!warning\]\s*(.+)', re.MULTILINE),
-    'bigexample_no_content': re.compile(r'>\s*\[!iexample\]\s*(.+)', re.MULTILINE),
-    'lemma_no_content': re.compile(r'>\s*\[!lemma\]\s*(.+)', re.MULTILINE),
-    'note_no_content': re.compile(r'>\s*\[!note\]\s*(.+)', re.MULTILINE),
-
-    # Callouts with titles
-    'example_with_title': re.compile(r'>\s*\[!example\]\s*(.+?)\s*\@\s*(.*)', re.MULTILINE),
-    'bigexample_with_title': re.compile(r'>\s*\[!iexample\]\s*(.+?)\s*\@\s*(.*)', re.MULTILINE),
-    'lemma_with_title': re.compile(r'>\s*\[!lemma\]\s*(.+?)\s*\@\s*(.*)', re.MULTILINE),
-    'note_with_title': re.compile(r'>\s*\[!note\]\s*(.+?)\s*\@\s*(.*)', re.MULTILINE),
-
-    # Callouts with content blocks
-    'summary_with_content': re.compile(r'>\s*\[!summary\]\s*(.+?)\n(>(?:[^\n]+\n?)+)', re.MULTILINE),
-    'algo_with_content': re.compile(r'>\s*\[!algorithm\]\s*(.+?)\n(>(?:[^\n]+\n?)+)', re.MULTILINE),
-    'target_with_content': re.compile(r'>\s*\[!target\]\s*(.+?)\n(>(?:[^\n]+\n?)+)', re.MULTILINE),
-    'concept_with_content': re.compile(r'>\s*\[!concept\]\s*(.+?)\n(>(?:[^\n]+\n?)+)', re.MULTILINE),
-
     # Special elements
-    'hint': re.compile(r'>\s*\[!hint\]\s*(.+)', re.MULTILINE),
-    'math': re.compile(r'\$\$(.*?)\$\$', re.MULTILINE | re.DOTALL),
-    'enumerate': re.compile(r'^(?:-\s.+\n?)+', re.MULTILINE),
     'fine': re.compile(r'\[fine\](.+?)\[fine\]', re.MULTILINE),
     'fine_with_percent': re.compile(r'%%(.+?)%%', re.MULTILINE),
-    'fine_with_num': re.compile(r'%%\s*\[(-?\d*\.?\d+)\]\s*(.+?)\s*%%', re.MULTILINE),
-    'href': re.compile(r'\[([^\]]+)\]\(([^)]+)\)'),
+    'fine_with_num': re.compile(r'%%\s*\[(-?(?:\d*\.)?\d+)\]\s*(.+?)(?<!\s)\s*%%', re.MULTILINE),
+    'href': re.compile(r'\[([^\[\]]+)\]\(((?:(?!\]\()[^)])+)\)'),
     'qed': re.compile(r'\b(Q\.?E\.?D\.?)(\.|!|\?|\s)*$', re.MULTILINE),
-    'quote': re.compile(r'^(>.*(?:\n|$))+', re.MULTILINE),
-    'fullwidth_block': re.compile(r'~~(?:u|\n)(.*?)~~(?:d|\n)', re.DOTALL)
+    'fullwidth_block': re.compile(r'~~(?:u|\n)((?:(?!~~u).)*?)~~(?:d|\n)', re.DOTALL),
+
+    # Block tokenizer and inline elements
+    # 'callout_head' is compiled from the callout registry
+    'callout_title': re.compile(r'(.+?)(?<!\s)\s*\@\s*(.*)'),
+    'heading': re.compile(r'^(#{1,4})\s*(.+)'),
+    'list_item': re.compile(r'^(\s*)-\s*(.*)$'),
+    'table_separator': re.compile(r'\|[-:| ]+\|'),
+    'image_embed': re.compile(r'!\[\[([^|\[\]]+)(?:\|([^\[\]]+))?\]\]'),
+    'code_embed': re.compile(r'\[\[([^|\[\]\n]+)\|([^\[\]\n]+?)(?:\|(\d+):(\d+))?\]\]'),
+    'note_link': re.compile(r'\[\[([^\[\]|#\n]+)(?:#[^\[\]|\n]*)?\]\]'),
+    'underline': re.compile(r'<u>((?:(?!<u>).)*?)</u>'),
+    'font_red': re.compile(r'<font color="#ff0000">((?:(?!<font ).)*?)</font>'),
+    'bold': re.compile(r'\*\*(.+?)\*\*'),
+    'italic': re.compile(r'\*(.+?)\*'),
+    'inline_span': re.compile(r'```.*?```|`[^`]+?`|\$\$.*?\$\$|\$.*?\$'),
+    'span': re.compile('(\n?)\x00(\\d+)\x00'),
+    'line_marker': re.compile('\x01(\\d+):(\\d+)\x01'),
+}
+
+# Callout registry: name -> the form the callout takes and its LaTeX environment
+#   title:  > [!note] Title @ content, or > [!note] content without a title
+#   single: > [!cor] content
+#   block:  > [!summary] Title, followed by '>' lines up to the next blank line
+#   hint:   > [!hint] content, set with \fine instead of an environment
+# A vault can add or override entries in CALLOUT_CONFIG next to its notes:
+#   {"callouts": {"proof": {"form": "block", "env": "proof"}}}
+DEFAULT_CALLOUTS = {
+    'note': {'form': 'title', 'env': 'theorem'},
+    'example': {'form': 'title', 'env': 'eg'},
+    'iexample': {'form': 'title', 'env': 'xeg'},
+    'lemma': {'form': 'title', 'env': 'lemma'},
+    'cor': {'form': 'single', 'env': 'corollary'},
+    'warning': {'form': 'single', 'env': 'warning'},
+    'summary': {'form': 'block', 'env': 'definition'},
+    'algorithm': {'form': 'block', 'env': 'algo'},
+    'target': {'form': 'block', 'env': 'target'},
+    'concept': {'form': 'block', 'env': 'concept'},
+    'hint': {'form': 'hint', 'env': None},
+}
+
+CALLOUT_CONFIG = 'callouts.json'
+
+CALLOUTS = dict(DEFAULT_CALLOUTS)
+
+HEADINGS = {1: 'section', 2: 'section', 3: 'subsection', 4: 'subsubsection'}
+
+# report.tex is an article, where ## and below can nest one level deeper
+REPORT_HEADINGS = {1: 'section', 2: 'subsection', 3: 'subsubsection', 4: 'paragraph'}
+
+# Tables with this many data rows are set as a longtable
+LONGTABLE_ROWS = 30
+
+# Every target is emitted from the same parse of a note (see emit_target).
+# Extra targets are written under their dir, next to the TeXFiles folder.
+# A longtable cannot sit inside a beamer frame, so slides only get tabulars.
+TARGETS = {
+    'handout': {'headings': HEADINGS, 'dir': None, 'longtable_rows': LONGTABLE_ROWS},             # master.tex chapters
+    'report': {'headings': REPORT_HEADINGS, 'dir': 'Reports', 'longtable_rows': LONGTABLE_ROWS},  # report.tex chapters
+    'slides': {'headings': HEADINGS, 'dir': 'Slides', 'longtable_rows': None},                    # slides.tex frame decks
+}
+
+RULES = {
+    '---': r'\noindent\rule{\textwidth}{1pt}',
+    '!---': r'\begin{fullwidth}\noindent\rule{0.75\linewidth}{1pt}\end{fullwidth}',
 }
 
 # =============================================================================
@@ -64,33 +121,20 @@ def convert_tags(text):
     text = re.sub(r'#Warning', r'!!', text)
     return text
 
-def protect_math_symbols(text):
-    """Protect special math symbols from being processed by other conversions."""
-    def replace_symbols(match):
-        content = match.group(2)
-        content = (
-            content.replace("*", "MATHSTAR")
-            .replace(">", "ANGLE")
-            .replace("[", "LEFTBRACKET")
-            .replace("]", "RIGHTBRACKET")
-            .replace("-", "MINUS")
-        )
-        return f"{match.group(1)}{content}{match.group(3)}"
+def escape_url(url):
+    """Escape the characters LaTeX treats specially inside \\href targets."""
+    return url.replace('#', r'\#').replace('%', r'\%')
 
-    text = re.sub(r'(\$)(.*?)(\$)', replace_symbols, text)
-    text = re.sub(r'(\$\$)(.*?)(\$\$)', replace_symbols, text, flags=re.DOTALL)
-    return text
+def image_path(raw_path):
+    """Vault path of the image an ![[embed]] refers to."""
+    return raw_path[3:] if raw_path.startswith("../Assets/") else f"Assets/Images/{raw_path}"
 
-def restore_math_symbols(text):
-    """Restore protected math symbols after processing."""
-    text = (
-        text.replace("MATHSTAR", "*")
-        .replace("ANGLE", ">")
-        .replace("LEFTBRACKET", "[")
-        .replace("RIGHTBRACKET", "]")
-        .replace("MINUS", "-")
-    )
-    return text
+def code_path(path):
+    """Vault path of the code file a [[file|label]] embed refers to."""
+    path = re.sub(r'^\.\.?/', '', path)
+    if not path.startswith('Assets/Codes/'):
+        path = f"Assets/Codes/{path}"
+    return path
 
 def clean_callout_content(content):
     """Clean callout content by removing Markdown formatting."""
@@ -132,57 +176,15 @@ def wrap_latex_environment(env_name, content, options=None, blank=True, space="5
 # CORE CONVERSION FUNCTIONS
 # =============================================================================
 
-def convert_callouts(text):
-    """Convert all callout types to their LaTeX equivalents."""
-    # Callouts with titles
-    text = patterns['note_with_title'].sub(lambda m: wrap_latex_environment('theorem', clean_callout_content(m.group(2)), m.group(1)), text)
-    text = patterns['example_with_title'].sub(lambda m: wrap_latex_environment('eg', clean_callout_content(m.group(2)), m.group(1)), text)
-    text = patterns['bigexample_with_title'].sub(lambda m: wrap_latex_environment('xeg', clean_callout_content(m.group(2)), m.group(1)), text)
-    text = patterns['lemma_with_title'].sub(lambda m: wrap_latex_environment('lemma', clean_callout_content(m.group(2)), m.group(1)), text)
-
-    # Callouts without content
-    text = patterns['note_no_content'].sub(lambda m: wrap_latex_environment('theorem', m.group(1)), text)
-    text = patterns['cor_no_content'].sub(lambda m: wrap_latex_environment('corollary', m.group(1)), text)
-    text = patterns['example_no_content'].sub(lambda m: wrap_latex_environment('eg', m.group(1)), text)
-    text = patterns['warning_no_content'].sub(lambda m: wrap_latex_environment('warning', m.group(1)), text)
-    text = patterns['bigexample_no_content'].sub(lambda m: wrap_latex_environment('xeg', m.group(1)), text)
-    text = patterns['lemma_no_content'].sub(lambda m: wrap_latex_environment('lemma', m.group(1)), text)
-
-    # Callouts with content blocks
-    text = patterns['summary_with_content'].sub(lambda m: wrap_latex_environment('definition', clean_callout_content(m.group(2)), m.group(1)), text)
-    text = patterns['algo_with_content'].sub(lambda m: wrap_latex_environment('algo', clean_callout_content(m.group(2)), m.group(1)), text)
-    text = patterns['target_with_content'].sub(lambda m: wrap_latex_environment('target', clean_callout_content(m.group(2)), m.group(1)), text)
-    text = patterns['concept_with_content'].sub(lambda m: wrap_latex_environment('concept', clean_callout_content(m.group(2)), m.group(1)), text)
-
-    # Special elements
-    text = patterns['hint'].sub(lambda m: f"\\fine{{{m.group(1)}}}", text)
-    text = patterns['fine'].sub(lambda m: f"\\fine{{{m.group(1)}}}", text)
-    text = patterns['fine_with_num'].sub(lambda m: f"\\fine[{m.group(1)}]{{{m.group(2)}}}", text)
-    text = patterns['fine_with_percent'].sub(lambda m: f"\\fine{{{m.group(1)}}}", text)
-    text = patterns['href'].sub(lambda m: f"\\href{{{m.group(2).replace('#', 'TheSharp').replace('%', 'ThePercent')}}}{{{m.group(1)}}}", text)
-    text = text.replace('TheSharp', '\\#').replace('ThePercent', '\\%')
-    text = patterns['qed'].sub(r'\\qedz\n', text)
-    text = patterns['quote'].sub(lambda m: wrap_latex_environment('zoe',
-        '\n'.join([line.strip('> ').strip() for line in m.group(0).splitlines()])), text)
-    text = patterns['fullwidth_block'].sub(lambda m: wrap_latex_environment('fullwidth', m.group(1).strip()), text)
-    
-    return text
-
-def convert_math(text):
-    """Convert math expressions to LaTeX format."""
-    text = re.sub(r'\n?\$\$(.*?)\$\$', r'\\begin{equation*}\1\\end{equation*}', text, flags=re.DOTALL)
-    return text
-
 def convert_images(text):
     """Convert image references to LaTeX figure environments with captions."""
     def replace_match(match):
         raw_path = match.group(1).strip()
         options = match.group(2)
 
-        if raw_path.startswith("../Assets/"):
-            path = raw_path[3:]
-        else:
-            path = f"Assets/Images/{raw_path}"
+        path = image_path(raw_path)
+        record_dependency('images', path)
+        path = resolve_image(path)
 
         # Extract filename without extension for caption
         filename = os.path.splitext(os.path.basename(raw_path))[0]
@@ -203,31 +205,31 @@ def convert_images(text):
                 f"\\end{{figure*}}\\par"
             )
 
-    pattern = r'!\[\[([^\|\]]+)(?:\|([^]]+))?\]\]'
-    return re.sub(pattern, replace_match, text)
+    return patterns['image_embed'].sub(replace_match, text)
 
 def convert_codes(text):
     """Convert code references to LaTeX code inclusion commands."""
-    code_pattern = re.compile(r'\[\[(.+?)\|(.+?)(?:\|(\d+):(\d+))?\]\]')
-
     def escape_underscores(string):
         return string.replace("_", r"\_")
 
-    def process_path(path):
-        path = re.sub(r'^\.\.?/', '', path)
-        if not path.startswith('Assets/Codes/'):
-            path = f"Assets/Codes/{path}"
-        return path
+    process_path = code_path
 
     def replacement(match):
         file_path = match.group(1)
         label = match.group(2)
         start_line = match.group(3) or "1"
         end_line = match.group(4) or "500"
+        record_dependency('codes', [process_path(file_path), int(start_line), int(end_line)])
         
         file_name = file_path.split('/')[-1]
         extension = os.path.splitext(file_name)[1][1:]
         
+        if SNIPPETS is not None:
+            fragment = snippet_name(process_path(file_path), int(start_line), int(end_line), SNIPPETS['style'])
+            return ("\\vspace{{10pt}}\n"
+                    f"\\includesnippet{{{escape_underscores(label)}}}{{{SNIPPET_DIR}/{fragment}}}"
+                    "\\vspace{{10pt}}\n"
+            )
         return ("\\vspace{{10pt}}\n"
                 f"\\includecode[{extension}]"
                 f"{{{escape_underscores(label)}}}"
@@ -237,7 +239,7 @@ def convert_codes(text):
                 "\\vspace{{10pt}}\n"
         )
 
-    return code_pattern.sub(replacement, text)
+    return patterns['code_embed'].sub(replacement, text)
 
 def escape_latex_special_chars(text):
     """Escape special LaTeX characters in regular text."""
@@ -259,6 +261,8 @@ def escape_latex_special_chars(text):
 
 def convert_code_pieces(text):
     """Convert inline and block code snippets to LaTeX format."""
+    if SNIPPETS is not None and text.startswith('```') and '\n' in text:
+        return f"\\input{{{SNIPPET_DIR}/{fence_snippet(text)}}}"
     text = re.sub(r'```(.*?)```', 
                  r'\\begin{lstlisting}[style=py,breaklines=true,breakatwhitespace=true,lineskip=-0.3ex,xleftmargin=2em,xrightmargin=2em]\1\\end{lstlisting}', 
                  text, flags=re.DOTALL)
@@ -267,64 +271,69 @@ def convert_code_pieces(text):
                  text)
     return text
 
-def convert_tables(text):
-    """Convert Markdown tables to LaTeX tabular environments."""
-    tables = extract_markdown_tables(text)
+def split_table_row(row):
+    """
+    Cells of a Markdown table row: the text after each '|', left-stripped.
 
-    for i, table in enumerate(tables):
-        placeholder = f"@@TABLE_{i}@@"
-        text = text.replace(table, placeholder)
+    Empty cells are dropped and blank ones kept as a single space, as the
+    row was always read.
+    """
+    return [part.lstrip() or part[-1] for part in row.split('|')[1:] if part]
 
-    latex_tables = []
-    for table in tables:
-        latex_table = markdown_to_latex_table(table)
-        latex_tables.append(latex_table)
+def column_alignment(separator, num_columns):
+    """Column letters from a separator row: ':-:' c, ':--' l, '--:' r, and c for plain or missing ones."""
+    letters = []
+    for cell in split_table_row(separator)[:num_columns]:
+        cell = cell.strip()
+        if cell.startswith(':') and not cell.endswith(':'):
+            letters.append('l')
+        elif cell.endswith(':') and not cell.startswith(':'):
+            letters.append('r')
+        else:
+            letters.append('c')
+    return letters + ['c'] * (num_columns - len(letters))
 
-    for i, latex_table in enumerate(latex_tables):
-        placeholder = f"@@TABLE_{i}@@"
-        text = text.replace(placeholder, latex_table)
+def table_lines(header, separator, rows, longtable_rows=LONGTABLE_ROWS):
+    """
+    Yield the LaTeX lines of a table one row at a time.
 
-    return text
+    Tables of at least longtable_rows rows become a longtable, which breaks
+    across pages and repeats the header on each. With longtable_rows None,
+    every table is a tabular.
+    """
+    header_cells = split_table_row(header)
+    spec = '|'.join(column_alignment(separator, max(1, len(header_cells))))
+    head = " & ".join(header_cells) + " \\\\"
+    long = longtable_rows is not None and len(rows) >= longtable_rows
 
-def extract_markdown_tables(text):
-    """Extract all Markdown tables from the text."""
-    table_pattern = re.compile(
-        r'(\|.*\|\n\|[-:| ]+\|[\s\S]*?)(?=\n\n|\Z)', re.MULTILINE
-    )
-    return table_pattern.findall(text)
+    if long:
+        yield f"\\begin{{longtable}}{{{spec}}}"
+        yield from (head, "\\hline", "\\endfirsthead", head, "\\hline", "\\endhead")
+    else:
+        yield "\\vspace{10pt}{\\centering"
+        yield f"\\begin{{tabular}}{{{spec}}}"
+        yield from (head, "\\hline")
+    for i, row in enumerate(rows):
+        yield " & ".join(split_table_row(row)) + " \\\\"
+        if i < len(rows) - 1:
+            yield "\\hline"
+    yield "\\end{longtable}" if long else "\\end{tabular}\\par}\\vspace{10pt}"
 
-def markdown_to_latex_table(markdown_table):
+def markdown_to_latex_table(markdown_table, longtable_rows=LONGTABLE_ROWS):
     """Convert a single Markdown table to LaTeX format."""
     lines = markdown_table.strip().split('\n')
-    header = lines[0]
-    separator = lines[1]
-    data_rows = lines[2:]
-    num_columns = len(re.findall(r'\|\s*([^|]+)\s*', header))
-    
-    latex_table = "\\vspace{10pt}{\\centering\n\\begin{tabular}{" + "c|" * (num_columns - 1) + "c}\n"
-    header_cells = re.findall(r'\|\s*([^|]+)\s*', header)
-    latex_table += " & ".join(header_cells) + " \\\\\n"
-    latex_table += "\\hline\n"
-    
-    for row in data_rows[:-1]:
-        row_cells = re.findall(r'\|\s*([^|]+)\s*', row)
-        latex_table += " & ".join(row_cells) + " \\\\\n"
-        latex_table += "\\hline\n"
-    
-    row_cells = re.findall(r'\|\s*([^|]+)\s*', data_rows[-1])
-    latex_table += " & ".join(row_cells) + " \\\\\n"
-    latex_table += "\\end{tabular}\\par}\\vspace{10pt}"
-    
-    return latex_table
+    return '\n'.join(table_lines(lines[0], lines[1], lines[2:], longtable_rows))
+
+ENUMERATE_BEGIN = r"\begin{enumerate}[leftmargin=3.0em]"
 
-def convert_enumerate(markdown):
+def convert_enumerate(markdown, strip=True):
     """Convert Markdown lists to LaTeX enumerate environments with proper nesting."""
-    lines = markdown.strip().split('\n')
+    lines = (markdown.strip() if strip else markdown).split('\n')
     output = []
     current_depth = -1
     
     for line in lines:
-        match = re.match(r'^(\s*)-\s*(.*)$', line)
+        match = patterns['list_item'].match(line) if '-' in line else None
         if match:
             leading_whitespace, content = match.groups()
             normalized_whitespace = leading_whitespace.replace('\t', '    ')
@@ -332,7 +341,7 @@ def convert_enumerate(markdown):
             
             if current_level > current_depth:
                 for _ in range(current_level - current_depth):
-                    output.append(r"\begin{enumerate}[leftmargin=3.0em]")
+                    output.append(ENUMERATE_BEGIN)
                 current_depth = current_level
             elif current_level < current_depth:
                 for _ in range(current_depth - current_level):
@@ -354,96 +363,1807 @@ def convert_enumerate(markdown):
     return '\n'.join(output)
 
 # =============================================================================
-# MAIN CONVERSION PIPELINE
+# CALLOUT REGISTRY
 # =============================================================================
+# All registered names are compiled into the one callout_head alternation, so
+# a '>' line is classified by a single match whatever the number of types.
 
-def convert_markdown(text):
-    """Main function to convert Markdown to LaTeX with proper processing order."""
-    # Step 1: Protect code blocks and inline code with placeholders
-    code_blocks = []
-    inline_codes = []
-    
-    def code_block_replacer(match):
-        code_blocks.append(match.group(0))
-        return f"@@CODE_BLOCK_{len(code_blocks)-1}@@"
-    
-    def inline_code_replacer(match):
-        inline_codes.append(match.group(0))
-        return f"@@INLINE_CODE_{len(inline_codes)-1}@@"
-    
-    text = re.sub(r'```.*?```', code_block_replacer, text, flags=re.DOTALL)
-    text = re.sub(r'`[^`]+?`', inline_code_replacer, text)
-
-    # Step 2: Convert various Markdown elements
-    text = convert_tags(text)
-    text = convert_images(text)
-    text = convert_codes(text)
-    text = convert_tables(text)
-    
-    # Text formatting and headers
-    text = re.sub(r'<u>(.*?)</u>', r'\\underline{\1}', text)
-    text = re.sub(r'<font color="#ff0000">(.*?)</font>', r'\\textcolor{red}{\1}', text)
-    text = re.sub(r'^####\s*(.+)', r'\\subsubsection{\1}', text, flags=re.MULTILINE)
-    text = re.sub(r'^###\s*(.+)', r'\\subsection{\1}', text, flags=re.MULTILINE)
-    text = re.sub(r'^##\s*(.+)', r'\\section{\1}', text, flags=re.MULTILINE)
-    text = re.sub(r'^#\s*(.+)', r'\\section{\1}', text, flags=re.MULTILINE)
-    text = re.sub(r'\*\*(.+?)\*\*', r'\\textbf{\1}', text)
-    text = re.sub(r'\*(.+?)\*', r'\\textit{\1}', text)
-    
-    # Horizontal rules
-    text = re.sub(r'^\s*---\s*$', r'\n\\noindent\\rule{\\textwidth}{1pt}\n', text, flags=re.MULTILINE)
-    text = re.sub(r'^\s*!---\s*$', r'\n\\begin{fullwidth}\\noindent\\rule{0.75\\linewidth}{1pt}\\end{fullwidth}\n', text, flags=re.MULTILINE)
-    
-    # Step 3: Convert callouts and lists
-    text = convert_callouts(text)
-    text = convert_enumerate(text)
-
-    # Step 4: Restore and convert code blocks
-    for i, code in enumerate(code_blocks):
-        text = text.replace(f'@@CODE_BLOCK_{i}@@', code)
-    for i, code in enumerate(inline_codes):
-        text = text.replace(f'@@INLINE_CODE_{i}@@', code)
-    
-    text = convert_code_pieces(text)
+CALLOUT_FORM_NAMES = ('title', 'single', 'block', 'hint')
+
+CALLOUT_HEADS = {}  # Sorted callout names -> compiled callout_head, reused across registries
+
+def compile_callouts(registry):
+    """Make registry the active callouts and build the callout_head pattern from it."""
+    global CALLOUTS
+    CALLOUTS = dict(registry)
+    key = tuple(sorted(CALLOUTS, key=lambda name: (-len(name), name)))
+    head = CALLOUT_HEADS.get(key)
+    if head is None:
+        names = '|'.join(re.escape(name) for name in key) or '(?!)'
+        head = CALLOUT_HEADS[key] = re.compile(rf'>\s*\[!({names})\]\s*(.*)')
+    current = patterns.get('callout_head')
+    if current is not None and isinstance(current, CountingPattern):
+        head = CountingPattern('callout_head', head)  # Keep counting while profiling
+    patterns['callout_head'] = head
+
+def load_callout_config(config_path=CALLOUT_CONFIG):
+    """Compile the default callouts merged with the vault's config file, if there is one."""
+    registry = dict(DEFAULT_CALLOUTS)
+    try:
+        with open(config_path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+    except FileNotFoundError:
+        config = {}
+    except ValueError as e:
+        print(f"[Warning] {config_path} is not valid JSON ({e}), using the default callouts.")
+        config = {}
+
+    for name, entry in config.get('callouts', {}).items():
+        form = entry.get('form') if isinstance(entry, dict) else None
+        if form not in CALLOUT_FORM_NAMES or (form != 'hint' and not entry.get('env')):
+            print(f"[Warning] {config_path}: callout '{name}' needs a form out of "
+                  f"{', '.join(CALLOUT_FORM_NAMES)} and an env, ignored.")
+            continue
+        registry[name] = {'form': form, 'env': entry.get('env')}
+
+    compile_callouts(registry)
+    return registry
+
+compile_callouts(DEFAULT_CALLOUTS)
+
+# =============================================================================
+# BLOCK TOKENIZER
+# =============================================================================
+# The source is read once: fenced code and display math are lifted into
+# verbatim spans, and the remaining lines are grouped into a flat block tree.
+# Block nodes are tuples whose first item is the kind:
+#   ('blank', line)                       whitespace-only source line
+#   ('line', line)                        paragraph or list line
+#   ('heading', level, text)
+#   ('rule', marker)                      '---' or '!---'
+#   ('table', lines)
+#   ('quote', lines)                      run of plain '>' lines
+#   ('callout', form, env, title, lines)  see CALLOUTS
+#   ('fullwidth', blocks, closed_by_d, markers)  markers: whether its opening and closing ~~ lines hold nothing else
+
+def link_end(lines, i):
+    """
+    Index of the line that closes a Markdown link left open at the end of
+    lines[i], or None. The link text may run over the paragraph's next lines
+    as long as they hold no other bracket, fence or $$.
+    """
+    for j in range(i + 1, len(lines)):
+        line = lines[j]
+        close = line.find(']')
+        opened = line.find('[', 0, close) if close >= 0 else line.find('[')
+        if opened >= 0 or line[:1] in '>|' or '```' in line or '$$' in line or line.isspace():
+            # '' is in every string, so an empty line ends the link as well
+            return None
+        if close >= 0:
+            return j if line.startswith('(', close + 1) and ')' in line[close + 2:] else None
+    return None
+
+def lift_verbatim_spans(text, spans):
+    """
+    Split text into lines, moving multi-line code fences and $$ blocks into
+    spans. A link whose text runs over several lines is kept on one logical
+    line.
+    """
+    lines = text.split('\n')
+    logical = []
+    unclosed = set()
+    i, n = 0, len(lines)
+    while i < n:
+        line = lines[i]
+        opener = None
+        if '`' in line or '$' in line:
+            if line.count('```') % 2 and '```' not in unclosed:
+                opener = '```'
+            elif line.count('$$') % 2 and '$$' not in unclosed:
+                opener = '$$'
+
+        if opener is None:
+            j = None
+            if '[' in line and line.rfind('[') > line.rfind(']') and line[:1] not in '>|':
+                j = link_end(lines, i)
+            if j is None:
+                logical.append(line)
+                i += 1
+            else:
+                logical.append('\n'.join(lines[i:j + 1]))
+                i = j + 1
+            continue
+
+        j = i + 1
+        while j < n and opener not in lines[j]:
+            j += 1
+        if j == n:
+            # No closing delimiter anywhere below, stop looking for one
+            unclosed.add(opener)
+            continue
+
+        start = line.rindex(opener)
+        end = lines[j].index(opener) + len(opener)
+        body = '\n'.join([line[start:]] + lines[i + 1:j] + [lines[j][:end]])
+        if opener == '```':
+            spans.append(('fence', body))
+        else:
+            spans.append(('display', body))
+        logical.append(f"{line[:start]}\x00{len(spans) - 1}\x00{lines[j][end:]}")
+        i = j + 1
+    return logical
+
+def match_callout(line):
+    """Classify a '>' line as (form, env, title, content), or None for a plain quote."""
+    head = patterns['callout_head'].match(line)
+    if not head or not head.group(2):
+        return None
+    name, rest = head.groups()
+    form, env = CALLOUTS[name]['form'], CALLOUTS[name]['env']
+    if form == 'title':
+        titled = patterns['callout_title'].match(rest)
+        if titled:
+            return ('title', env, titled.group(1), titled.group(2))
+        return ('single', env, None, rest)
+    if form == 'block':
+        return ('block', env, rest, None)
+    return (form, env, None, rest)
+
+def _is_line_callout(line):
+    callout = match_callout(line) if line.startswith('>') else None
+    return callout is not None and callout[0] in ('title', 'single')
+
+def _parse_quote(lines, i, blocks):
+    """Parse a run of '>' lines starting at i, returning the index after it."""
+    n = len(lines)
+    run = []
+    while i < n and lines[i].startswith('>'):
+        callout = match_callout(lines[i])
+        if callout and callout[0] == 'block':
+            if not (i + 1 < n and lines[i + 1].startswith('>') and not _is_line_callout(lines[i + 1])):
+                callout = None
+        if callout is None:
+            run.append(lines[i])
+            i += 1
+            continue
+
+        if run:
+            blocks.append(('quote', run))
+            run = []
+        form, env, title, content = callout
+        if form == 'block':
+            # Content runs up to the next empty line, '>' or not; a one-line
+            # callout inside it is expanded first and its blank line ends it
+            j = i + 1
+            while j < n and lines[j]:
+                j += 1
+                if _is_line_callout(lines[j - 1]):
+                    break
+            blocks.append(('callout', form, env, title, lines[i + 1:j]))
+            i = j
+        else:
+            blocks.append(('callout', form, env, title, [content]))
+            i += 1
+    if run:
+        blocks.append(('quote', run))
+    return i
+
+def ends_in_embed(line):
+    """Whether a table row ends in a code embed, whose expansion ends the table."""
+    return '[[' in line and convert_codes(line).endswith('\n')
+
+def is_table_start(lines, i):
+    """Whether lines[i] is a table header followed by its separator line."""
+    line = lines[i]
+    return (line.startswith('|') and line.endswith('|') and i + 1 < len(lines)
+            and patterns['table_separator'].match(lines[i + 1]) is not None)
+
+def is_fullwidth_open(stripped):
+    """Whether a stripped line opens a fullwidth block: a bare ~~ or ~~u, or ~~u before its first content line."""
+    return stripped in ('~~', '~~u') or (stripped.startswith('~~u') and '~~' not in stripped[3:])
+
+def is_fullwidth_close(stripped):
+    """Whether a stripped line closes a fullwidth block: it ends in ~~ or ~~d, after any last content."""
+    return stripped.endswith(('~~', '~~d')) and '~~u' not in stripped
+
+def parse_blocks(lines):
+    """Group logical lines into block nodes in a single forward scan."""
+    blocks = []
+    i, n = 0, len(lines)
+    unclosed = False  # No fullwidth closer is left after the current line
+    while i < n:
+        line = lines[i]
+        stripped = line.strip()
+
+        if not stripped:
+            blocks.append(('blank', line))
+            i += 1
+        elif line.startswith('>'):
+            i = _parse_quote(lines, i, blocks)
+        elif line.startswith('|') and is_table_start(lines, i):
+            # A table extends to the next empty line; a trailing code embed
+            # expands to end in a newline, which ends the table as well
+            j = i + 2
+            embed_break = False
+            while j < n and lines[j] and not embed_break:
+                j += 1
+                embed_break = ends_in_embed(lines[j - 1])
+            blocks.append(('table', lines[i:j]))
+            if embed_break:
+                blocks.append(('blank', ''))
+            i = j
+        elif stripped in RULES:
+            blocks.append(('rule', stripped))
+            i += 1
+        elif not unclosed and stripped.startswith('~~') and is_fullwidth_open(stripped):
+            j = i + 1
+            while j < n and not is_fullwidth_close(lines[j].strip()):
+                j += 1
+            if j < n:
+                # Content may share a line with ~~u or with the closing ~~d
+                closer = lines[j].strip()
+                closed_by_d = closer.endswith('~~d')
+                first = stripped[3:].lstrip()
+                last = closer[:-3 if closed_by_d else -2].rstrip()
+                inner = [first] * bool(first) + lines[i + 1:j] + [last] * bool(last)
+                blocks.append(('fullwidth', parse_blocks(inner), closed_by_d, (not first, not last)))
+                i = j + 1
+            else:
+                unclosed = True
+                blocks.append(('line', line))
+                i += 1
+        else:
+            heading = None
+            if line.startswith('#'):
+                heading = patterns['heading'].match(convert_tags(line))
+            if heading:
+                blocks.append(('heading', len(heading.group(1)), heading.group(2)))
+            else:
+                blocks.append(('line', line))
+            i += 1
+    return blocks
+
+# =============================================================================
+# LATEX EMITTER
+# =============================================================================
+
+# Spans are (kind, text) pairs kept out of the rule passes and put back by
+# restore_spans: 'code' holds finished LaTeX, 'fence' the source of a
+# multi-line code fence, 'math' and 'display' hold the math source, 'url' an
+# escaped \\href target. Source spans are typeset by each emitter, so other
+# front ends can read the same block tree (see preview.py).
+
+def add_span(spans, kind, text):
+    """Register a span and return the placeholder that stands in for it."""
+    spans.append((kind, text))
+    return f"\x00{len(spans) - 1}\x00"
+
+def lift_inline_spans(text, spans):
+    """
+    Move inline code, single-line fences and inline math into spans. Those
+    starting inside a link target are left to it, as lift_href keeps the
+    target verbatim.
+    """
+    targets = [match.span(2) for match in patterns['href'].finditer(text)] if '](' in text else []
+    starts = [start for start, _ in targets]
+
+    def lift(match):
+        span = match.group(0)
+        k = bisect.bisect_right(starts, match.start()) - 1
+        if k >= 0 and match.start() < targets[k][1]:
+            return span
+        if span.startswith('`'):
+            return add_span(spans, 'code', convert_code_pieces(span))
+        return add_span(spans, 'display' if span.startswith('$$') else 'math', span)
+
+    return patterns['inline_span'].sub(lift, text)
+
+def lift_href(match, spans):
+    """Convert a Markdown link, keeping its target out of later rules."""
+    return f"\\href{{{add_span(spans, 'url', escape_url(match.group(2)))}}}{{{match.group(1)}}}"
+
+def restore_spans(text, spans, breaks=None):
+    """
+    Put every lifted span back in one pass, typesetting display math and code fences.
+
+    breaks, if given, collects (offset, lines added, joined) for each span:
+    where it was in text, the line breaks it brought in, and whether it took
+    the line break before it.
+    """
+    def restore(match):
+        kind, span = spans[int(match.group(2))]
+        if kind == 'display':
+            # Display math also takes the line break before it
+            restored = f"\\begin{{equation*}}{span[2:-2]}\\end{{equation*}}"
+        elif kind == 'fence':
+            restored = match.group(1) + convert_code_pieces(span)
+        else:
+            restored = match.group(1) + span
+        if breaks is not None:
+            kept = len(match.group(1)) if restored.startswith(match.group(1)) else 0
+            breaks.append((match.start(2), restored.count('\n') - kept, kept < len(match.group(1))))
+        return restored
+
+    return patterns['span'].sub(restore, text)
+
+def convert_inline(text, spans):
+    """Apply the inline rules that run before callouts, skipping absent triggers."""
+    if '`' in text or '$' in text:
+        text = lift_inline_spans(text, spans)
+    if '#' in text:
+        text = convert_tags(text)
+    if '[[' in text:
+        text = convert_images(text)
+        text = convert_codes(text)
+        record_note_links(text)
+    if '](' in text:
+        text = patterns['href'].sub(lambda m: lift_href(m, spans), text)
+    if '<' in text:
+        text = patterns['underline'].sub(r'\\underline{\1}', text)
+        text = patterns['font_red'].sub(r'\\textcolor{red}{\1}', text)
+    if '*' in text:
+        text = patterns['bold'].sub(r'\\textbf{\1}', text)
+        text = patterns['italic'].sub(r'\\textit{\1}', text)
+    return text
+
+def convert_inline_post(text):
+    """Apply the inline rules that run after callouts, skipping absent triggers."""
+    if '[fine]' in text:
+        text = patterns['fine'].sub(lambda m: f"\\fine{{{m.group(1)}}}", text)
+    if '%%' in text:
+        text = patterns['fine_with_num'].sub(lambda m: f"\\fine[{m.group(1)}]{{{m.group(2)}}}", text)
+        text = patterns['fine_with_percent'].sub(lambda m: f"\\fine{{{m.group(1)}}}", text)
+    if 'Q' in text:
+        text = patterns['qed'].sub(r'\\qedz\n', text)
+    if '~~' in text:
+        text = patterns['fullwidth_block'].sub(lambda m: wrap_latex_environment('fullwidth', m.group(1).strip()), text)
     return text
 
+def convert_line(line, spans):
+    """Convert one paragraph line, including a heading at its start."""
+    text = convert_inline(line, spans)
+    if text.startswith('#'):
+        heading = patterns['heading'].match(text)
+        if heading:
+            text = f"\\{HEADINGS[len(heading.group(1))]}{{{heading.group(2)}}}"
+    return text
+
+def _emit_quote(lines, out, spans):
+    """Emit plain '>' lines as zoe environments, returning True if one ended in a QED."""
+    run = []
+    for line in lines:
+        text = convert_inline_post(convert_inline(line, spans))
+        run.append(text.strip('> ').strip())
+        if text.endswith('\\qedz\n'):
+            out.extend(wrap_latex_environment('zoe', '\n'.join(run))[:-1].split('\n'))
+            out.append('')
+            run = []
+    if run:
+        out.extend(wrap_latex_environment('zoe', '\n'.join(run))[:-1].split('\n'))
+        return False
+    return True
+
+def render_table(rows, spans, longtable_rows=LONGTABLE_ROWS):
+    """Render table rows to LaTeX, before the post-callout inline rules."""
+    converted = []
+    for row in rows:
+        record_note_links(row)
+        row = lift_inline_spans(row, spans) if '`' in row or '$' in row else row
+        converted.append(convert_codes(convert_images(convert_tags(row))))
+    latex = markdown_to_latex_table('\n'.join(converted), longtable_rows)
+    return '\n'.join(convert_line(line, spans) for line in latex.split('\n'))
+
+def render_callout(form, env, title, lines, spans):
+    """
+    Render a callout node to LaTeX, before the post-callout inline rules.
+    Its tables are always tabulars, as a longtable cannot break inside the
+    framed environments.
+    """
+    if form == 'hint':
+        return f"\\fine{{{convert_inline(lines[0], spans)}}}"
+    if form == 'single':
+        return wrap_latex_environment(env, convert_inline(lines[0], spans))
+
+    content = []
+    for k, line in enumerate(lines):
+        nested = match_callout(line) if _is_line_callout(line) else None
+        if nested:
+            content.append(render_callout(nested[0], nested[1], nested[2], [nested[3]], spans))
+        elif is_table_start(lines, k):
+            rows = lines[k:-1] if _is_line_callout(lines[-1]) else lines[k:]
+            content.append(run_stage('render_table', render_table, rows, spans, None))
+            content.extend(convert_line(line, spans) for line in lines[k + len(rows):])
+            break
+        else:
+            content.append(convert_line(line, spans))
+    content = clean_callout_content('\n'.join(content))
+    return wrap_latex_environment(env, content, convert_inline(title, spans))
+
+def emit_latex(blocks, spans, headings=HEADINGS, anchors=None, longtable_rows=LONGTABLE_ROWS, sources=None):
+    """
+    Walk the block tree and return the LaTeX output lines, headings mapping
+    # levels to commands. With an anchors list, the (output index, block
+    index) where each block's output starts is appended to it. Given the
+    block_sources of blocks too, the content of a fullwidth block is marked
+    with source lines of its own (see SOURCE MAPS). Top-level tables of at
+    least longtable_rows rows are set as a longtable (see table_lines);
+    inside callouts and fullwidth blocks they cannot break.
+    """
+    out = []
+    pending = []    # Blank source lines, dropped when a rule follows
+    swallow = None  # 'rule' or 'qed': both swallow the blank lines after them
+
+    for index, block in enumerate(blocks):
+        kind = block[0]
+        if kind == 'blank':
+            if not swallow:
+                pending.append(block[1])
+            continue
+        if kind == 'rule':
+            pending = []
+            if block[1] == '!---' and out[-2:] == [RULES['---'], '']:
+                out.pop()  # '!---' used to run after '---' and ate its trailing blank too
+            if anchors is not None:
+                anchors.append((len(out), index))
+            # A QED right before the rule already ends in the blank line
+            out.extend(([] if swallow == 'qed' else ['']) + [RULES[block[1]], ''])
+            swallow = 'rule'
+            continue
+
+        out.extend(pending)
+        pending = []
+        swallow = None
+        if anchors is not None:
+            anchors.append((len(out), index))
+
+        if kind == 'line' or kind == 'heading':
+            if kind == 'line':
+                text = convert_line(block[1], spans)
+            else:
+                text = f"\\{headings[block[1]]}{{{convert_inline(block[2], spans)}}}"
+            text = convert_inline_post(text)
+            out.extend(text.split('\n'))
+            if text.endswith('\\qedz\n'):
+                swallow = 'qed'
+        elif kind == 'table':
+            latex = run_stage('render_table', render_table, block[1], spans, longtable_rows)
+            out.extend(convert_inline_post(latex).split('\n'))
+        elif kind == 'quote':
+            if _emit_quote(block[1], out, spans):
+                swallow = 'qed'
+        elif kind == 'callout':
+            latex = convert_inline_post(render_callout(*block[1:], spans))
+            if block[1] == 'block':
+                latex = latex[:-1]
+                if _is_line_callout(block[4][-1]):
+                    latex += '\n'
+            out.extend(latex.split('\n'))
+        elif kind == 'fullwidth':
+            inner_anchors = inner_sources = None
+            if anchors is not None and sources is not None:
+                # The content starts on the opening line unless it holds nothing else
+                inner_anchors = []
+                inner_sources = block_sources(block[1], spans, sources[index][0] + block[3][0])
+            inner = emit_latex(block[1], spans, headings, inner_anchors, None, inner_sources)
+            if inner_anchors:
+                mark_lines(inner, inner_anchors, inner_sources)
+            content = '\n'.join(inner).strip()
+            latex = wrap_latex_environment('fullwidth', content)
+            out.extend((latex if block[2] else latex[:-1]).split('\n'))
+
+    out.extend(pending)
+    return out
+
+def _emit_frame(title, blocks, spans, out):
+    """Emit blocks as one fragile beamer frame, unless they hold nothing but blank lines."""
+    body = '\n'.join(emit_latex(blocks, spans, longtable_rows=TARGETS['slides']['longtable_rows'])).strip()
+    if body:
+        out.extend([f"\\begin{{frame}}[fragile]{{{title}}}", body, "\\end{frame}", ''])
+
+def emit_frames(blocks, spans):
+    """
+    Walk the block tree as a beamer deck: every heading starts a frame
+    titled by it, and every --- rule starts another under the same title.
+    A # heading also starts a section.
+    """
+    out = []
+    title = ''
+    group = []
+    for block in blocks:
+        if block[0] not in ('heading', 'rule'):
+            group.append(block)
+            continue
+        _emit_frame(title, group, spans, out)
+        group = []
+        if block[0] == 'heading':
+            title = convert_inline_post(convert_inline(block[2], spans))
+            if block[1] == 1:
+                out.extend([f"\\section{{{title}}}", ''])
+    _emit_frame(title, group, spans, out)
+    return out
+
+# =============================================================================
+# PROFILING
+# =============================================================================
+# Off by default: PROFILE is None and stages are called directly. While on,
+# each stage records its wall time and the size of what it took and returned,
+# and every entry of `patterns` is swapped for a wrapper counting its matches,
+# all keyed by the file being converted. Stages in NESTED_STAGES run inside
+# another stage, so they are left out of the total the shares are taken of.
+
+PROFILE = None
+
+NESTED_STAGES = {'render_table'}  # Inside emit_latex
+
+class CountingPattern:
+    """Stand-in for a compiled pattern that counts its matches into PROFILE."""
+
+    def __init__(self, name, pattern):
+        self.name = name
+        self.pattern = pattern
+
+    def __getattr__(self, attr):
+        return getattr(self.pattern, attr)
+
+    def _count(self, n):
+        counts = profile_record()['patterns']
+        counts[self.name] = counts.get(self.name, 0) + n
+
+    def sub(self, repl, string, count=0):
+        text, n = self.pattern.subn(repl, string, count)
+        self._count(n)
+        return text
+
+    def match(self, *args):
+        found = self.pattern.match(*args)
+        self._count(found is not None)
+        return found
+
+    def search(self, *args):
+        found = self.pattern.search(*args)
+        self._count(found is not None)
+        return found
+
+    def findall(self, *args):
+        found = self.pattern.findall(*args)
+        self._count(len(found))
+        return found
+
+def enable_profiling(count_patterns=True):
+    """Start collecting a profile, replacing any profile collected so far, with pattern matches if count_patterns."""
+    global PROFILE
+    PROFILE = {'file': None, 'files': {}}
+    for name, pattern in patterns.items() if count_patterns else ():
+        if not isinstance(pattern, CountingPattern):
+            patterns[name] = CountingPattern(name, pattern)
+
+def disable_profiling():
+    """Stop collecting and return the profile: {'files': {file: {'stages', 'patterns'}}}."""
+    global PROFILE
+    for name, pattern in patterns.items():
+        if isinstance(pattern, CountingPattern):
+            patterns[name] = pattern.pattern
+    profile, PROFILE = PROFILE, None
+    return {'files': profile['files']} if profile else {'files': {}}
+
+def profile_record():
+    """The stage and pattern record of the file currently being converted."""
+    return PROFILE['files'].setdefault(PROFILE['file'] or '<text>', {'stages': {}, 'patterns': {}})
+
+def payload_size(value):
+    """UTF-8 size of a string, or of all strings inside nested lists and tuples."""
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    return 0
+
+def run_stage(name, func, *args):
+    """Call func(*args), recording it as stage `name` when profiling is on."""
+    if PROFILE is None:
+        return func(*args)
+    start = time.perf_counter()
+    result = func(*args)
+    elapsed = time.perf_counter() - start
+    stage = profile_record()['stages'].setdefault(name, {'calls': 0, 'time': 0.0, 'bytes_in': 0, 'bytes_out': 0})
+    stage['calls'] += 1
+    stage['time'] += elapsed
+    stage['bytes_in'] += payload_size(args)
+    stage['bytes_out'] += payload_size(result)
+    return result
+
+def summarize_profile(profile):
+    """
+    Totals over all files: stages ranked by time, patterns by matches, files
+    by time. A file's time leaves out NESTED_STAGES, already counted in the
+    stage they run inside.
+    """
+    stages = {}
+    matches = {}
+    files = []
+    for file_name, record in profile['files'].items():
+        for name, stage in record['stages'].items():
+            total = stages.setdefault(name, {'calls': 0, 'time': 0.0, 'bytes_in': 0, 'bytes_out': 0})
+            for key in total:
+                total[key] += stage[key]
+        for name, n in record['patterns'].items():
+            matches[name] = matches.get(name, 0) + n
+        files.append((file_name, sum(stage['time'] for name, stage in record['stages'].items()
+                                     if name not in NESTED_STAGES)))
+    return {
+        'stages': sorted(stages.items(), key=lambda item: -item[1]['time']),
+        'patterns': sorted(matches.items(), key=lambda item: -item[1]),
+        'files': sorted(files, key=lambda item: -item[1]),
+    }
+
+def print_profile(profile, top=10):
+    """Print the ranked stage table, pattern match counts and slowest files."""
+    summary = summarize_profile(profile)
+    total = sum(stage['time'] for name, stage in summary['stages'] if name not in NESTED_STAGES) or 1
+    print(f"{'stage':<20} {'calls':>6} {'ms':>10} {'share':>6} {'KiB in':>10} {'KiB out':>10}")
+    for name, stage in summary['stages']:
+        print(f"{name:<20} {stage['calls']:>6} {stage['time'] * 1000:>10.2f} {stage['time'] / total:>6.1%} "
+              f"{stage['bytes_in'] / 1024:>10.1f} {stage['bytes_out'] / 1024:>10.1f}")
+    print(f"\n{'pattern':<24} {'matches':>8}")
+    for name, n in summary['patterns']:
+        if n:
+            print(f"{name:<24} {n:>8}")
+    print(f"\n{'slowest files':<40} {'ms':>10}")
+    for file_name, seconds in summary['files'][:top]:
+        print(f"{file_name:<40} {seconds * 1000:>10.2f}")
+
+# =============================================================================
+# MAIN CONVERSION PIPELINE
+# =============================================================================
+
+def convert_markdown(text, first=True, last=True):
+    """
+    Main function to convert Markdown to LaTeX in one tokenize/emit pass.
+
+    first/last say whether text starts/ends the document; only the document
+    edges are stripped, so chunks of a document can be converted separately.
+    """
+    blocks, spans = parse_markdown(text)
+    return emit_target(blocks, spans, 'handout', first, last)
+
+def parse_markdown(text):
+    """Tokenize a note once into its block tree and span registry, which every target is emitted from."""
+    spans = []
+    lines = run_stage('lift_verbatim_spans', lift_verbatim_spans, text, spans)
+    return run_stage('parse_blocks', parse_blocks, lines), spans
+
+def emit_target(blocks, spans, target='handout', first=True, last=True, source_map=None):
+    """
+    Emit a parsed note as LaTeX for one of TARGETS. The block tree is only
+    read, so it can be emitted for several targets in turn. Unless the
+    target is slides, a source_map list is extended with the runs giving the
+    Markdown line of each output line (see SOURCE MAPS).
+    """
+    anchors = [] if source_map is not None and target != 'slides' else None
+    sources = block_sources(blocks, spans) if anchors is not None else None
+    if target == 'slides':
+        lines = run_stage('emit_latex', emit_frames, blocks, spans)
+    else:
+        lines = run_stage('emit_latex', emit_latex, blocks, spans, TARGETS[target]['headings'], anchors,
+                          TARGETS[target]['longtable_rows'], sources)
+    if anchors:
+        mark_lines(lines, anchors, sources)
+    text = '\n'.join(lines)
+    if first:
+        text = text.lstrip()
+    if last:
+        text = text.rstrip()
+    text = run_stage('convert_enumerate', convert_enumerate, text, False)
+    if anchors is None:
+        return run_stage('restore_spans', restore_spans, text, spans)
+    text, marks = strip_line_markers(text)
+    breaks = []
+    restored = run_stage('restore_spans', restore_spans, text, spans, breaks)
+    map_lines(text, marks, breaks, source_map, first)
+    return restored
+
+# =============================================================================
+# SOURCE MAPS
+# =============================================================================
+# xelatex reports errors at lines of the generated .tex. Next to each
+# handout and report output, NAME.tex.map records the Markdown line each of
+# its lines came from, so a log can point back at the note (see build.py).
+#
+# The first non-empty line each top-level block writes gets a \x01start:end\x01
+# marker with the block's source lines, put before the line's trailing
+# whitespace so stripping and list conversion see the line as before; the
+# markers are taken out before the spans are restored, which then tell how
+# many lines each code fence or $$ block grew into. A line without a marker
+# continues from the one above it, within that block's source lines, so the
+# lines of a block are written as at most two runs [tex line, md line, step]:
+# each later line of a run adds step, 0 or 1, to the md line, and a run lasts
+# until the next one starts.
+
+SOURCE_MAP_SUFFIX = '.map'
+
+def source_size(texts, spans):
+    """Source lines behind logical lines, counting the lines of the code fences, $$ blocks and links in them."""
+    size = len(texts)
+    for text in texts:
+        if '\n' in text:
+            size += text.count('\n')
+        if '\x00' in text:
+            size += sum(spans[int(match.group(2))][1].count('\n') for match in patterns['span'].finditer(text))
+    return size
+
+def block_size(block, spans, previous=None):
+    """Number of source lines a block was parsed from; previous is the block before it."""
+    kind = block[0]
+    if kind == 'blank':
+        # parse_blocks adds a blank of its own after a table ending in a code embed
+        embed_break = (previous is not None and previous[0] == 'table' and len(previous[1]) > 2
+                       and ends_in_embed(previous[1][-1]))
+        return 0 if embed_break else 1
+    if kind == 'rule':
+        return 1
+    if kind == 'line':
+        return source_size([block[1]], spans)
+    if kind == 'heading':
+        return source_size([block[2]], spans)
+    if kind in ('table', 'quote'):
+        return source_size(block[1], spans)
+    if kind == 'callout':
+        form, _, title, lines = block[1:]
+        if form == 'block':
+            return source_size([title] + lines, spans)
+        return source_size([(title or '') + lines[0]], spans)
+    # fullwidth: its content, and the ~~ lines holding nothing else
+    size = sum(block[3])
+    previous = None
+    for inner in block[1]:
+        size += block_size(inner, spans, previous)
+        previous = inner
+    return size
+
+def block_sources(blocks, spans, line=1):
+    """The (first, last) source line of each block, the first of them starting at line."""
+    sources = []
+    previous = None
+    for block in blocks:
+        size = block_size(block, spans, previous)
+        sources.append((line, line + max(size, 1) - 1))
+        line += size
+        previous = block
+    return sources
+
+def mark_lines(lines, anchors, sources):
+    """Put the source lines of each block on the first non-empty output line it wrote."""
+    for k, (start, index) in enumerate(anchors):
+        end = anchors[k + 1][0] if k + 1 < len(anchors) else len(lines)
+        for i in range(start, end):
+            text = lines[i].rstrip()
+            if text:
+                lines[i] = f"{text}\x01{sources[index][0]}:{sources[index][1]}\x01{lines[i][len(text):]}"
+                break
+
+def strip_line_markers(text):
+    """Remove the block markers from text, returning it and {line: (first, last) source line} of the marked lines."""
+    # Split yields text, first, last, text, ...
+    parts = patterns['line_marker'].split(text)
+    marks = {}
+    line = 0
+    for k in range(0, len(parts) - 1, 3):
+        line += parts[k].count('\n')
+        # The enumerate openers convert_enumerate put before a list item belong to its block
+        opened, end = 0, parts[k].rfind('\n')
+        while end >= 0:
+            start = parts[k].rfind('\n', 0, end) + 1
+            if parts[k][start:end] != ENUMERATE_BEGIN:
+                break
+            opened, end = opened + 1, start - 1
+        marks[line - opened] = (int(parts[k + 1]), int(parts[k + 2]))
+    return ''.join(parts[::3]), marks
+
+def add_run(runs, tex_line, md_line, step):
+    """Append a run to a source map, or extend the last run when it already gives these lines."""
+    if runs and runs[-1][0] >= tex_line:
+        runs.pop()
+    if runs:
+        run = runs[-1]
+        if run[2] == step and run[1] + run[2] * (tex_line - run[0]) == md_line:
+            return
+        if step == 1 and run[2] == 0 and tex_line == run[0] + 1 and md_line == run[1] + 1:
+            run[2] = 1
+            return
+    runs.append([tex_line, md_line, step])
+
+def map_lines(text, marks, breaks, source_map, first=True):
+    """
+    Append to source_map the runs of the lines text becomes once its spans
+    are restored. Unless text is the first part of its output, lines before
+    the first marker continue the last run of the part before.
+    """
+    grown = {}  # line -> [lines its spans add, whether display math took the line break before it]
+    line, position = 0, 0
+    for offset, count, joined in breaks:
+        line += text.count('\n', position, offset)
+        position = offset
+        grown.setdefault(line, [0, False])
+        grown[line][0] += count
+        grown[line][1] |= joined
+
+    runs = []
+    tex_line = 1
+    md_line, last = None, None
+
+    def write(count):
+        # count lines continuing the block, none past its last source line
+        nonlocal tex_line, md_line
+        if md_line is not None and count > 0:
+            # Lines counting up, as a run of their own only if more than one
+            rising = min(count, last - md_line + 1)
+            rising = rising if rising > 1 else 0
+            if rising:
+                add_run(runs, tex_line, md_line, 1)
+            if count > rising:
+                add_run(runs, tex_line + rising, min(md_line + rising, last), 0)
+            md_line += count
+        tex_line += count
+
+    starts = sorted(set(marks) | set(grown)) + [text.count('\n') + 1]
+    write(starts[0])
+    for i, start in enumerate(starts[:-1]):
+        if start in marks:
+            md_line, last = marks[start]
+        count = starts[i + 1] - start
+        if start in grown:
+            if grown[start][1] and tex_line > 1:
+                # Display math taken onto the line before: that line now opens it
+                tex_line -= 1
+            count += grown[start][0]
+        write(count)
+    # Lines before the first marker of an output go with the block after them
+    if first and not runs:
+        runs.append([1, 1, 0])
+    elif first and runs[0][0] > 1:
+        runs.insert(0, [1, runs[0][1], 0])
+    source_map.extend(runs)
+
+def extend_source_map(runs, more, tex_offset=0, md_offset=0):
+    """Append the runs of a later part of an output, offset by the lines before it."""
+    for tex_line, md_line, step in more:
+        add_run(runs, tex_offset + tex_line, md_offset + md_line, step)
+    return runs
+
+def write_source_map(output_file, input_file, runs):
+    """Write the source map of an output, naming its note relative to the output."""
+    source = os.path.relpath(input_file, os.path.dirname(os.path.abspath(output_file)))
+    write_if_changed(output_file + SOURCE_MAP_SUFFIX, json.dumps({'source': source, 'runs': runs}, separators=(',', ':')))
+
+def load_source_map(output_file):
+    """The {'source', 'runs'} of an output, with source a path from the working directory, or None."""
+    try:
+        with open(output_file + SOURCE_MAP_SUFFIX, 'r', encoding='utf-8') as f:
+            source_map = json.load(f)
+    except (OSError, ValueError):
+        return None
+    source_map['source'] = os.path.normpath(os.path.join(os.path.dirname(output_file), source_map['source']))
+    return source_map
+
+def source_line(source_map, tex_line):
+    """The Markdown line an output line came from."""
+    runs = source_map['runs']
+    k = max(bisect.bisect_right(runs, [tex_line, float('inf')]) - 1, 0)
+    return runs[k][1] + runs[k][2] * (tex_line - runs[k][0])
+
 # =============================================================================
 # FILE HANDLING FUNCTIONS
 # =============================================================================
 
-def ensure_texfiles_subfolder():
+# Default roots, as laid out by init.sh with the script run from MdFiles
+MD_ROOT = '.'
+TEX_ROOT = '../TeXFiles'
+
+def ensure_texfiles_subfolder(output_root=TEX_ROOT):
     """Ensure the output directory for LaTeX files exists."""
-    if not os.path.exists('../TeXFiles'):
-        os.makedirs('../TeXFiles')
+    if not os.path.exists(output_root):
+        os.makedirs(output_root)
 
-def get_output_file_path(md_file):
+def get_output_file_path(md_file, output_root=TEX_ROOT):
     """Generate output path for converted LaTeX file."""
-    return os.path.join('../TeXFiles', md_file.replace('.md', '.tex'))
+    return os.path.join(output_root, md_file.replace('.md', '.tex'))
 
-def convert_md_to_tex(input_file, output_file):
-    """Convert a single Markdown file to LaTeX format."""
-    with open(input_file, 'r', encoding='utf-8') as f:
-        content = f.read()
+def write_if_changed(output_file, content):
+    """Write content to output_file only if its bytes differ, keeping the mtime stable."""
+    data = content.encode('utf-8')
+    if os.path.exists(output_file):
+        with open(output_file, 'rb') as f:
+            if f.read() == data:
+                return False
+    with open(output_file, 'wb') as f:
+        f.write(data)
+    return True
 
-    content = protect_math_symbols(content)
-    content = convert_markdown(content)
-    content = convert_math(content)
-    content = restore_math_symbols(content)
+def target_output_path(md_file, target, output_root=TEX_ROOT):
+    """Output path of a note for one of TARGETS; extra targets go next to output_root."""
+    if TARGETS[target]['dir'] is None:
+        return get_output_file_path(md_file, output_root)
+    return os.path.join(output_root, '..', TARGETS[target]['dir'], os.path.splitext(md_file)[0] + '.tex')
 
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(content)
+def convert_md_to_tex(input_file, output_file, stream=None, extra_outputs=None, source_maps=False):
+    """
+    Convert a single Markdown file to LaTeX format.
 
-def convert_all_md_in_directory():
-    """Convert all Markdown files in the current directory to LaTeX."""
-    ensure_texfiles_subfolder()
-    md_files = glob.glob("*.md")
-    
+    Files larger than STREAM_THRESHOLD are converted chunk by chunk unless
+    stream is given explicitly. extra_outputs maps other TARGETS to the
+    files they are written to, emitted from the same parse. With
+    source_maps, each output but the slides gets its source map. Returns
+    True if the output was rewritten.
+    """
+    if PROFILE is not None:
+        PROFILE['file'] = input_file
+    if stream is None:
+        stream = os.path.getsize(input_file) > STREAM_THRESHOLD
+    outputs = {'handout': output_file, **(extra_outputs or {})}
+    for path in (extra_outputs or {}).values():
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    if stream:
+        rewritten = stream_md_to_tex(input_file, output_file, extra_outputs=extra_outputs, source_maps=source_maps)
+    else:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            content = run_stage('read', f.read)
+        blocks, spans = parse_markdown(content)
+        written = {}
+        for target, path in outputs.items():
+            source_map = [] if source_maps and target != 'slides' else None
+            written[target] = run_stage('write', write_if_changed, path,
+                                        emit_target(blocks, spans, target, source_map=source_map))
+            if source_map is not None:
+                write_source_map(path, input_file, source_map)
+        rewritten = written['handout']
+
+    if ASSETS is not None and ASSETS['missing']:
+        print(f"[Warning] {input_file}: missing images {', '.join(dict.fromkeys(ASSETS['missing']))}")
+        ASSETS['missing'] = []
+    return rewritten
+
+# =============================================================================
+# STREAMING CONVERSION
+# =============================================================================
+# A document can be cut at an empty line as long as no multi-line construct
+# is open there and the next line does not reach back over the blank lines:
+# rules swallow the blank lines before them and display math takes the
+# newline before a line starting with $$. Converting the pieces and joining them with
+# '\n' then gives exactly the output of converting the whole file.
+
+STREAM_THRESHOLD = 8 * 1024 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+
+def iter_safe_chunks(lines, chunk_size=STREAM_CHUNK_SIZE, headings_only=False):
+    """
+    Group an iterable of lines (without newlines) into chunks cut at safe
+    blank lines, with headings_only only at those followed by a heading.
+    """
+    chunk = []
+    size = 0
+    in_fence = in_math = in_fullwidth = False
+    boundary = False  # The previous line was an empty line outside any block
+    started = False   # Leading blank lines stay with the first real content
+
+    for line in lines:
+        stripped = line.strip()
+        if (boundary and started and size >= chunk_size and stripped
+                and stripped not in RULES and not line.startswith('$$')
+                and (not headings_only or (line.startswith('#') and patterns['heading'].match(convert_tags(line))))):
+            yield chunk
+            chunk = []
+            size = 0
+        chunk.append(line)
+        size += len(line) + 1
+        started = started or bool(stripped)
+
+        if line.count('```') % 2:
+            in_fence = not in_fence
+        elif not in_fence and line.count('$$') % 2:
+            in_math = not in_math
+        elif not (in_fence or in_math):
+            if not in_fullwidth and is_fullwidth_open(stripped):
+                in_fullwidth = True
+            elif in_fullwidth and is_fullwidth_close(stripped):
+                in_fullwidth = False
+        boundary = not line and not (in_fence or in_math or in_fullwidth)
+
+    if chunk:
+        yield chunk
+
+def stream_md_to_tex(input_file, output_file, chunk_size=STREAM_CHUNK_SIZE, extra_outputs=None, source_maps=False):
+    """
+    Convert a Markdown file chunk by chunk, writing output as it goes.
+
+    Peak memory is bounded by the largest chunk rather than the file. Each
+    chunk is parsed once and emitted for every target in extra_outputs too.
+    A slide frame runs up to the next heading or rule, so with slides among
+    them chunks are only cut before a heading, where every frame ends, and
+    peak memory is bounded by the longest section instead.
+    Each result is written to a temporary file that only replaces its
+    output if the bytes differ. With source_maps, the map of each output
+    but the slides is built up chunk by chunk. Returns True if output_file
+    was rewritten.
+    """
+    outputs = {'handout': output_file, **(extra_outputs or {})}
+    files = {target: open(path + '.part', 'w', encoding='utf-8') for target, path in outputs.items()}
+    # Runs of each map, and the Markdown and output lines before the chunk
+    maps = {target: [] for target in outputs if source_maps and target != 'slides'}
+    md_lines = 0
+    tex_lines = dict.fromkeys(outputs, 0)
+    try:
+        with open(input_file, 'r', encoding='utf-8') as src:
+            lines = (line.rstrip('\n') for line in src)
+            chunks = iter_safe_chunks(lines, chunk_size, headings_only='slides' in outputs)
+            chunk = next(chunks, [])
+            first = True
+            while True:
+                following = next(chunks, None)
+                blocks, spans = parse_markdown('\n'.join(chunk))
+                for target, out in files.items():
+                    if not first:
+                        out.write('\n')
+                    source_map = [] if target in maps else None
+                    latex = emit_target(blocks, spans, target, first, following is None, source_map)
+                    out.write(latex)
+                    if source_map is not None:
+                        extend_source_map(maps[target], source_map, tex_lines[target], md_lines)
+                    tex_lines[target] += latex.count('\n') + 1
+                if following is None:
+                    break
+                md_lines += len(chunk)
+                chunk = following
+                first = False
+    finally:
+        for out in files.values():
+            out.close()
+
+    rewritten = {}
+    for target, path in outputs.items():
+        temp_file = path + '.part'
+        if os.path.exists(path) and filecmp.cmp(temp_file, path, shallow=False):
+            os.remove(temp_file)
+            rewritten[target] = False
+        else:
+            os.replace(temp_file, path)
+            rewritten[target] = True
+    for target, runs in maps.items():
+        write_source_map(outputs[target], input_file, runs)
+    return rewritten['handout']
+
+# =============================================================================
+# INCREMENTAL BUILD CACHE
+# =============================================================================
+# The manifest lives next to the generated files and maps each Markdown file
+# to the hash of its content. An entry is only trusted when the converter
+# version matches too, and when the images the note embeds still resolve to
+# the same derivatives.
+
+CACHE_MANIFEST = '.md2tex-cache.json'
+
+def converter_version():
+    """Hash of this converter's source, callouts and snippet style, so changing any invalidates the cache."""
+    digest = hashlib.sha256()
+    with open(os.path.realpath(__file__), 'rb') as f:
+        digest.update(f.read())
+    digest.update(json.dumps(CALLOUTS, sort_keys=True).encode('utf-8'))
+    digest.update(json.dumps(SNIPPETS and SNIPPETS['style']).encode('utf-8'))
+    return digest.hexdigest()
+
+def image_derivatives(entry):
+    """The derivative each image of a cache entry resolves to, or None where the image is used as it is."""
+    mapping = ASSETS['map'] if ASSETS else {}
+    return {path: mapping.get(path) for path in entry.get('deps', {}).get('images', [])}
+
+def file_hash(path, block_size=STREAM_CHUNK_SIZE):
+    """SHA-256 of a file's content, read block by block so large notes are never held whole."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def load_cache_manifest(manifest_path):
+    """Load the cache manifest, or an empty one if it is missing or unreadable."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {'version': None, 'files': {}}
+
+def save_cache_manifest(version, entries, manifest_path, assets=None):
+    """Persist cache entries for the given converter version, with the embedded asset fingerprints."""
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': version, 'files': entries, 'assets': assets or {}}, f, indent=2, sort_keys=True)
+
+def convert_job(job):
+    """
+    Convert one (md_file, input_file, output_file, stream, extra_outputs) job,
+    returning (md_file, error or None, the note's dependencies or None).
+    """
+    global DEPENDENCIES
+    md_file, input_file, output_file, stream, extra_outputs = job
+    DEPENDENCIES = {'codes': [], 'images': [], 'notes': [], 'snippets': []}
+    try:
+        convert_md_to_tex(input_file, output_file, stream, extra_outputs, source_maps=True)
+    except Exception as e:
+        return md_file, f"{type(e).__name__}: {e}", None
+    finally:
+        deps, DEPENDENCIES = DEPENDENCIES, None
+    return md_file, None, deps
+
+def init_conversion_worker(callouts, assets, snippets):
+    """Give a pool worker the parent's callouts, image derivatives and snippet settings, in case it was not forked."""
+    global ASSETS, SNIPPETS
+    compile_callouts(callouts)
+    ASSETS = assets
+    SNIPPETS = snippets
+
+def run_conversion_jobs(jobs, n_jobs=1):
+    """Run conversion jobs serially or on a process pool, results in job order."""
+    if n_jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=init_conversion_worker,
+                                 initargs=(CALLOUTS, ASSETS, SNIPPETS)) as pool:
+            return list(pool.map(convert_job, jobs))
+    return [convert_job(job) for job in jobs]
+
+def convert_all_md_in_directory(force=False, n_jobs=1, verbose=True, stream=None,
+                                input_root=MD_ROOT, output_root=TEX_ROOT, dirty_only=False, targets=('handout',)):
+    """
+    Convert all Markdown files in input_root to LaTeX files in output_root.
+
+    Files whose content hash is unchanged since the last run are skipped
+    unless force is set; the rest are converted on n_jobs processes. A
+    failing file does not stop the batch. Returns a report dict with the
+    'hit', 'rebuilt' and 'removed' file lists, the skipped notes 'affected'
+    by an edited code file or image or linking to a rebuilt note, and
+    'failed' (file, error) pairs.
+    With verbose off, skipped files are not listed. The chapter list is
+    rewritten, set to typeset only the rebuilt and affected notes if
+    dirty_only is set. Each note is parsed once and emitted for every one of
+    the TARGETS listed in targets.
+    """
+    ensure_texfiles_subfolder(output_root)
+    md_files = sorted(os.path.basename(path) for path in glob.glob(os.path.join(glob.escape(input_root), '*.md')))
+    version = converter_version()
+    manifest_path = os.path.join(output_root, CACHE_MANIFEST)
+    previous = load_cache_manifest(manifest_path)
+    cached = previous['files'] if previous['version'] == version and not force else {}
+    entries = {}
+    jobs = []
+    report = {'hit': [], 'rebuilt': [], 'affected': [], 'removed': [], 'failed': []}
+
+    extra_targets = [target for target in targets if target != 'handout']
     for md_file in md_files:
-        output_file = get_output_file_path(md_file)
-        print(f"Converting {md_file} to {output_file}...")
-        convert_md_to_tex(md_file, output_file)
-    
-    print("Conversion completed for all markdown files in the current directory.")
+        input_file = os.path.join(input_root, md_file)
+        output_file = get_output_file_path(md_file, output_root)
+        extra_outputs = {target: target_output_path(md_file, target, output_root) for target in extra_targets}
+        digest = file_hash(input_file)
+        entry = cached.get(md_file)
+        maps = [path + SOURCE_MAP_SUFFIX for target, path in [('handout', output_file), *extra_outputs.items()]
+                if target != 'slides']
+        if (entry and entry['hash'] == digest and entry.get('derived', {}) == image_derivatives(entry)
+                and os.path.exists(output_file)
+                and all(os.path.exists(path) for path in [*extra_outputs.values(), *maps])):
+            if verbose:
+                print(f"Skipping {md_file} (unchanged)")
+            report['hit'].append(md_file)
+            entries[md_file] = entry
+        else:
+            print(f"Converting {md_file} to {output_file}...")
+            jobs.append((md_file, input_file, output_file, stream, extra_outputs))
+            entries[md_file] = {'hash': digest}
+
+    for md_file, error, deps in run_conversion_jobs(jobs, n_jobs):
+        if error:
+            # Leave failed files out of the manifest so the next run retries them
+            del entries[md_file]
+            report['failed'].append((md_file, error))
+        else:
+            entries[md_file]['deps'] = deps
+            entries[md_file]['derived'] = image_derivatives(entries[md_file])
+            report['rebuilt'].append(md_file)
+
+    previous_assets = previous.get('assets', {})
+    assets = fingerprint_assets(entries, os.path.join(input_root, '..'), previous_assets)
+    changed = [key for key, fingerprint in assets.items()
+               if key in previous_assets and previous_assets[key]['hash'] != fingerprint['hash']]
+    if ASSETS is not None:
+        # Converted notes reported theirs already; a missing image has no fingerprint
+        for md_file in report['hit']:
+            images = entries[md_file].get('deps', {}).get('images', [])
+            missing = [path for path in images if assets[path]['hash'] is None]
+            if missing:
+                print(f"[Warning] {os.path.join(input_root, md_file)}: missing images {', '.join(missing)}")
+    report['affected'] = [md_file for md_file in report['hit']
+                          if embeds_any(entries[md_file], changed) or links_any(entries[md_file], report['rebuilt'])]
+    if SNIPPETS is not None:
+        build_code_snippets(SNIPPETS['root'], entries, n_jobs, force, SNIPPETS['style'])
+
+    # Notes that were deleted since the last run leave stale outputs behind
+    for md_file in previous['files']:
+        if md_file in md_files:
+            continue
+        outputs = [target_output_path(md_file, target, output_root) for target in TARGETS]
+        outputs += [path + SOURCE_MAP_SUFFIX for path in outputs]
+        outputs = [output_file for output_file in outputs if os.path.exists(output_file)]
+        for output_file in outputs:
+            os.remove(output_file)
+        if outputs:
+            report['removed'].append(md_file)
+
+    save_cache_manifest(version, entries, manifest_path, assets)
+    write_chapter_list(md_files, input_root, output_root,
+                       report['rebuilt'] + report['affected'] if dirty_only else None)
+    for md_file in report['affected']:
+        print(f"{md_file} embeds an edited code file or image, or links to an edited note")
+    for md_file, error in report['failed']:
+        print(f"[Error] {md_file}: {error}")
+    print(f"Conversion completed: {len(report['rebuilt'])} rebuilt, "
+          f"{len(report['hit'])} unchanged ({len(report['affected'])} with edited assets or links), "
+          f"{len(report['removed'])} removed, "
+          f"{len(report['failed'])} failed.")
+    return report
+
+# =============================================================================
+# DEPENDENCY GRAPH
+# =============================================================================
+# Code listings and figures are read by LaTeX, not by the converter, so an
+# edited asset leaves every .tex file as it was. While the directory is
+# converted, each note's cache entry records under 'deps' the code files it
+# embeds with their line ranges, its images and the notes it links to, all
+# as vault paths. The manifest also keeps a fingerprint of every embedded
+# asset, so the next run can tell which unchanged notes need typesetting
+# again, as do the unchanged notes linking to a rebuilt one. A code embed is
+# fingerprinted on its lines only. Links are recorded by record_note_links,
+# for table cells as for any other line.
+
+DEPENDENCIES = None  # While a note is converted for the graph: {'codes', 'images', 'notes', 'snippets'}
+
+def record_dependency(kind, item):
+    """Add an embed to the dependencies of the note being converted, if they are being recorded."""
+    if DEPENDENCIES is not None and item not in DEPENDENCIES[kind]:
+        DEPENDENCIES[kind].append(item)
+
+def record_note_links(text):
+    """Add the notes text links to with [[note]] to the dependencies, if they are being recorded."""
+    if DEPENDENCIES is not None and '[[' in text:
+        for match in patterns['note_link'].finditer(text):
+            record_dependency('notes', note_file_name(match.group(1)))
+
+def note_file_name(target):
+    """The Markdown file name an Obsidian [[link]] target refers to."""
+    name = os.path.basename(target.strip())
+    return name if name.endswith('.md') else name + '.md'
+
+def asset_key(kind, item):
+    """Manifest key of an embedded asset: the image path, or path:start:end for a code range."""
+    return item if kind == 'images' else f"{item[0]}:{item[1]}:{item[2]}"
+
+def asset_fingerprint(vault_root, kind, item, previous=None):
+    """
+    The {'stat', 'hash'} of an image, or of the embedded lines of a code file.
+
+    The previous fingerprint is reused while the file's mtime and size are
+    unchanged. A missing file has stat and hash None.
+    """
+    path = os.path.join(vault_root, item if kind == 'images' else item[0])
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {'stat': None, 'hash': None}
+    stat = [stat.st_mtime_ns, stat.st_size]
+    if previous and previous['stat'] == stat:
+        return previous
+    with open(path, 'rb') as f:
+        data = f.read() if kind == 'images' else b''.join(itertools.islice(f, item[1] - 1, item[2]))
+    return {'stat': stat, 'hash': hashlib.sha256(data).hexdigest()}
+
+def fingerprint_assets(entries, vault_root, previous):
+    """Fingerprint every code range and image the cache entries embed."""
+    assets = {}
+    for entry in entries.values():
+        for kind in ('codes', 'images'):
+            for item in entry.get('deps', {}).get(kind, []):
+                key = asset_key(kind, item)
+                if key not in assets:
+                    assets[key] = asset_fingerprint(vault_root, kind, item, previous.get(key))
+    return assets
+
+def embeds_any(entry, keys):
+    """Whether a cache entry embeds any of the given asset keys."""
+    deps = entry.get('deps', {})
+    return any(asset_key(kind, item) in keys for kind in ('codes', 'images') for item in deps.get(kind, []))
+
+def links_any(entry, md_files):
+    """Whether a cache entry links to any of the given note file names."""
+    return not set(md_files).isdisjoint(entry.get('deps', {}).get('notes', []))
+
+def dependents(manifest, targets):
+    """
+    Notes of a cache manifest that embed or link to any of the targets: code
+    files or images as vault paths, or note file names.
+    """
+    targets = set(targets)
+    found = []
+    for md_file, entry in sorted(manifest['files'].items()):
+        deps = entry.get('deps', {})
+        paths = [item[0] for item in deps.get('codes', [])] + deps.get('images', []) + deps.get('notes', [])
+        if targets.intersection(paths):
+            found.append(md_file)
+    return found
+
+# =============================================================================
+# IMAGE DERIVATIVES
+# =============================================================================
+# Before LaTeX runs, each image under Assets/Images can get a derivative in
+# Assets/Derived that is cheap for xelatex to decode: oversized rasters are
+# scaled down to the printed width and recompressed, SVGs become PDFs. The
+# index in Assets/Derived records the source hash and settings each one was
+# built from, so only new or changed images are rebuilt. Derivatives keep the
+# source's name, so generated figures stay valid when an image is rebuilt.
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+IMAGE_SOURCE_DIR = 'Assets/Images'
+IMAGE_DERIVED_DIR = 'Assets/Derived'
+IMAGE_INDEX = '.index.json'
+RASTER_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+# Figures are set at 0.5\textwidth, about 50mm on the B5 layout in preamble.tex
+IMAGE_SETTINGS = {'print_width_mm': 55, 'dpi': 300, 'jpeg_quality': 85}
+
+ASSETS = None  # While figures use derivatives: {'root', 'map': {source: derivative}, 'missing'}
+
+def svg_converter():
+    """Name of the first available SVG to PDF converter, or None."""
+    for tool in ('rsvg-convert', 'inkscape'):
+        if shutil.which(tool):
+            return tool
+    try:
+        import cairosvg  # noqa: F401
+    except ImportError:
+        return None
+    return 'cairosvg'
+
+def derivative_path(source):
+    """Vault-relative derivative path for a vault-relative source image path."""
+    relative = os.path.relpath(source, IMAGE_SOURCE_DIR)
+    stem, ext = os.path.splitext(relative)
+    return f"{IMAGE_DERIVED_DIR}/{stem}{'.pdf' if ext.lower() == '.svg' else ext}".replace(os.sep, '/')
+
+def build_raster(src, dst, settings):
+    """Downscale a raster to the printed width and recompress it, keeping the source if that is smaller."""
+    max_width = round(settings['print_width_mm'] / 25.4 * settings['dpi'])
+    with Image.open(src) as image:
+        if image.width > max_width:
+            image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+        if dst.lower().endswith('.png'):
+            image.save(dst, optimize=True)
+        else:
+            image.convert('RGB').save(dst, quality=settings['jpeg_quality'], optimize=True)
+    if os.path.getsize(dst) >= os.path.getsize(src):
+        shutil.copyfile(src, dst)
+
+def build_svg(src, dst, tool):
+    """Convert an SVG to PDF with the given converter."""
+    if tool == 'cairosvg':
+        import cairosvg
+        cairosvg.svg2pdf(url=src, write_to=dst)
+    elif tool == 'inkscape':
+        subprocess.run([tool, '--export-type=pdf', f'--export-filename={dst}', src], check=True, capture_output=True)
+    else:
+        subprocess.run([tool, '-f', 'pdf', '-o', dst, src], check=True, capture_output=True)
+
+def build_derivative(job):
+    """Build one (source, src, dst, settings, svg_tool) job, returning (source, error or None)."""
+    source, src, dst, settings, tool = job
+    try:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if src.lower().endswith('.svg'):
+            build_svg(src, dst, tool)
+        else:
+            build_raster(src, dst, settings)
+    except Exception as e:
+        return source, f"{type(e).__name__}: {e}"
+    return source, None
+
+def build_image_derivatives(vault_root, n_jobs=1, force=False, settings=IMAGE_SETTINGS):
+    """
+    Bring the derivatives of every image in the vault up to date.
+
+    Returns the map from each source path, as written in the LaTeX output,
+    to its derivative. Images that could not be built, including rasters
+    without Pillow and SVGs without a converter, are left out of the map so
+    figures keep pointing at the source.
+    """
+    source_root = os.path.join(vault_root, IMAGE_SOURCE_DIR)
+    index_path = os.path.join(vault_root, IMAGE_DERIVED_DIR, IMAGE_INDEX)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    tool = svg_converter()
+    settings_key = json.dumps(settings, sort_keys=True)
+    skipped = set()
+    mapping = {}
+    entries = {}
+    jobs = []
+    for folder, _, files in os.walk(source_root):
+        for name in sorted(files):
+            ext = os.path.splitext(name)[1].lower()
+            if ext not in RASTER_EXTENSIONS and ext != '.svg':
+                continue
+            if (Image is None and ext != '.svg') or (tool is None and ext == '.svg'):
+                skipped.add(ext)
+                continue
+            src = os.path.join(folder, name)
+            source = os.path.relpath(src, vault_root).replace(os.sep, '/')
+            derived = derivative_path(source)
+            entry = index.get(source)
+            stat = os.stat(src)
+            stat = [stat.st_mtime_ns, stat.st_size]
+            # Only hash sources whose mtime or size moved since the last run
+            digest = entry['hash'] if entry and entry['stat'] == stat else file_hash(src)
+            key = hashlib.sha256((digest + settings_key).encode('utf-8')).hexdigest()
+            mapping[source] = derived
+            entries[source] = {'key': key, 'hash': digest, 'stat': stat}
+            if force or not entry or entry['key'] != key or not os.path.exists(os.path.join(vault_root, derived)):
+                jobs.append((source, src, os.path.join(vault_root, derived), settings, tool))
+
+    if n_jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(build_derivative, jobs))
+    else:
+        results = [build_derivative(job) for job in jobs]
+    failed = [(source, error) for source, error in results if error]
+    for source, error in failed:
+        print(f"[Error] {source}: {error}")
+        del mapping[source]
+        del entries[source]
+
+    # Derivatives of deleted images go too
+    for source in index:
+        if source not in entries:
+            derived = os.path.join(vault_root, derivative_path(source))
+            if os.path.exists(derived):
+                os.remove(derived)
+
+    os.makedirs(os.path.dirname(index_path), exist_ok=True)
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    if skipped - {'.svg'}:
+        print("[Warning] Pillow is not installed, raster images are used as they are.")
+    if '.svg' in skipped:
+        print("[Warning] No SVG converter found (rsvg-convert, inkscape or cairosvg), SVG images are used as they are.")
+    print(f"Images: {len(results) - len(failed)} built, {len(mapping) - len(results) + len(failed)} unchanged, "
+          f"{len(failed)} failed.")
+    return mapping
+
+def use_image_derivatives(vault_root, mapping):
+    """Point generated figures at derivatives and report missing images, or stop with mapping None."""
+    global ASSETS
+    ASSETS = None if mapping is None else {'root': vault_root, 'map': mapping, 'missing': []}
+
+def resolve_image(path):
+    """The path a figure should include for a vault-relative image path."""
+    if ASSETS is None:
+        return path
+    derived = ASSETS['map'].get(path)
+    if derived:
+        return derived
+    if not os.path.exists(os.path.join(ASSETS['root'], path)):
+        ASSETS['missing'].append(path)
+    return path
+
+# =============================================================================
+# CODE SNIPPETS
+# =============================================================================
+# listings lexes every code block again on each xelatex pass. With snippets
+# on, code is highlighted once by Pygments into LaTeX fragments under
+# Assets/Snippets that the output \inputs instead:
+# - A code embed's fragment is named after its file, line range and style,
+#   so the output stays the same when the file is edited. After conversion,
+#   the embeds recorded in the dependency graph are rendered on a process
+#   pool; the index records the file hash each fragment was built from, so
+#   only edited files or new ranges are rendered again.
+# - A fenced block's fragment is named after its text and style, and is
+#   written by the process converting the note the first time it is seen.
+# Fragments no note refers to any more are removed. The \PY macros they use
+# are defined in style.tex, which master.tex reads after the cached format.
+
+try:
+    from pygments import highlight
+    from pygments.formatters import LatexFormatter
+    from pygments.lexers import get_lexer_by_name, get_lexer_for_filename
+    from pygments.util import ClassNotFound
+except ImportError:
+    highlight = None
+
+SNIPPET_DIR = 'Assets/Snippets'
+SNIPPET_INDEX = '.index.json'
+SNIPPET_STYLE_FILE = 'style.tex'
+
+# Closest to the listings commonstyle: bold keywords, no colours
+SNIPPET_STYLE = 'bw'
+
+# fvextra Verbatim options matching \includecode
+SNIPPET_VERBATIM = 'breaklines,xleftmargin=2em,xrightmargin=2em'
+
+# Extensions Pygments does not know by file name
+SNIPPET_LEXERS = {'wls': 'mathematica'}
+
+SNIPPETS = None  # While code is pre-highlighted: {'root', 'style'}
+
+def snippet_name(path, start, end, style):
+    """Fragment file name for lines start to end of a vault-relative code file."""
+    return hashlib.sha256(f"{path}:{start}:{end}:{style}".encode('utf-8')).hexdigest()[:16] + '.tex'
+
+def snippet_lexer(name=None, language=None):
+    """Pygments lexer for a file name or a fence language, plain text if neither is known."""
+    try:
+        if language is not None:
+            # Anything but a lexer alias is text, without a search of the plugins
+            return get_lexer_by_name((language or 'python') if re.fullmatch(r'[\w+#.-]*', language) else 'text')
+        return get_lexer_for_filename(name)
+    except ClassNotFound:
+        ext = os.path.splitext(name or '')[1][1:]
+        return get_lexer_by_name(SNIPPET_LEXERS.get(ext, 'text'))
+
+def render_snippet(code, lexer, style):
+    """Highlighted LaTeX for code, as an fvextra Verbatim environment."""
+    return highlight(code, lexer, LatexFormatter(style=style, verboptions=SNIPPET_VERBATIM))
+
+def write_snippet(path, text):
+    """Write a fragment through a temporary file, so a concurrent reader never sees half of it."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+def fence_code(fence):
+    """The (language, code) of a multi-line ```lang fenced block."""
+    first, _, rest = fence.partition('\n')
+    lines = rest[:rest.rindex('```')].split('\n')
+    if all(line.startswith('>') for line in lines if line):
+        # A fence inside a quote or callout keeps its '>' markers in the span
+        lines = [re.sub(r'^> ?', '', line) for line in lines]
+    return first[3:].strip(), '\n'.join(lines).rstrip() + '\n'
+
+def fence_snippet(fence):
+    """Name of the fragment for a ```lang fenced block, rendering it if it does not exist yet."""
+    name = 'fence-' + hashlib.sha256(f"{SNIPPETS['style']}\n{fence}".encode('utf-8')).hexdigest()[:16] + '.tex'
+    path = os.path.join(SNIPPETS['root'], SNIPPET_DIR, name)
+    if not os.path.exists(path):
+        language, code = fence_code(fence)
+        write_snippet(path, render_snippet(code, snippet_lexer(language=language), SNIPPETS['style']))
+    record_dependency('snippets', name)
+    return name
+
+def build_snippet(job):
+    """Render one (name, src, start, end, style, dst) job, returning (name, error or None)."""
+    name, src, start, end, style, dst = job
+    try:
+        with open(src, 'r', encoding='utf-8') as f:
+            code = ''.join(itertools.islice(f, start - 1, end))
+        write_snippet(dst, render_snippet(code, snippet_lexer(name=src), style))
+    except Exception as e:
+        return name, f"{type(e).__name__}: {e}"
+    return name, None
+
+def build_code_snippets(vault_root, entries, n_jobs=1, force=False, style=SNIPPET_STYLE):
+    """
+    Bring the fragments of every code embed in the cache entries up to date,
+    and remove the ones no entry uses.
+    """
+    snippet_root = os.path.join(vault_root, SNIPPET_DIR)
+    index_path = os.path.join(snippet_root, SNIPPET_INDEX)
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        index = {}
+
+    index_entries = {}
+    fences = set()
+    jobs = []
+    for entry in entries.values():
+        deps = entry.get('deps', {})
+        fences.update(deps.get('snippets', []))
+        for path, start, end in deps.get('codes', []):
+            name = snippet_name(path, start, end, style)
+            src = os.path.join(vault_root, path)
+            if name in index_entries or not os.path.exists(src):
+                continue
+            previous = index.get(name)
+            stat = os.stat(src)
+            stat = [stat.st_mtime_ns, stat.st_size]
+            # Only hash files whose mtime or size moved since the last run
+            digest = previous['hash'] if previous and previous['stat'] == stat else file_hash(src)
+            key = hashlib.sha256(f"{digest}:{start}:{end}:{style}".encode('utf-8')).hexdigest()
+            index_entries[name] = {'key': key, 'hash': digest, 'stat': stat, 'path': path}
+            dst = os.path.join(snippet_root, name)
+            if force or not previous or previous['key'] != key or not os.path.exists(dst):
+                jobs.append((name, src, start, end, style, dst))
+
+    if n_jobs > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+            results = list(pool.map(build_snippet, jobs))
+    else:
+        results = [build_snippet(job) for job in jobs]
+    failed = [(name, error) for name, error in results if error]
+    for name, error in failed:
+        print(f"[Error] {index_entries[name]['path']}: {error}")
+        del index_entries[name]
+
+    os.makedirs(snippet_root, exist_ok=True)
+    write_if_changed(os.path.join(snippet_root, SNIPPET_STYLE_FILE), LatexFormatter(style=style).get_style_defs())
+    for name in os.listdir(snippet_root):
+        if name.endswith('.tex') and name != SNIPPET_STYLE_FILE and name not in index_entries and name not in fences:
+            os.remove(os.path.join(snippet_root, name))
+    with open(index_path, 'w', encoding='utf-8') as f:
+        json.dump(index_entries, f, indent=2, sort_keys=True)
+    print(f"Code snippets: {len(results) - len(failed)} rendered, "
+          f"{len(index_entries) - len(results) + len(failed)} unchanged, {len(failed)} failed.")
+
+def use_code_snippets(vault_root, style=SNIPPET_STYLE):
+    """Pre-highlight code into fragments in the given style, or typeset it with listings with style None."""
+    global SNIPPETS
+    if style is not None and highlight is None:
+        print("[Warning] Pygments is not installed, code is typeset by listings on every pass.")
+        style = None
+    SNIPPETS = None if style is None else {'root': vault_root, 'style': style}
+
+# =============================================================================
+# CHAPTER LIST
+# =============================================================================
+# master.tex inputs CHAPTER_LIST, one \include per converted note, and reads
+# INCLUDE_ONLY in its preamble. Each chapter keeps its own .aux, so a draft
+# build can typeset only the chapters that were rebuilt while the numbering
+# and references of the others stay those of the last full build.
+
+CHAPTER_LIST = 'chapters.tex'
+INCLUDE_ONLY = 'includeonly.tex'
+
+def write_chapter_list(md_files, input_root=MD_ROOT, output_root=TEX_ROOT, only=None):
+    """
+    Write the chapter list for md_files and the \\includeonly for the chapters in `only`.
+
+    With only None every chapter is typeset. Paths are written relative to
+    the vault root, the parent of input_root, where master.tex is compiled.
+    """
+    vault_root = os.path.join(input_root, '..')
+    def chapter(md_file):
+        path = os.path.relpath(get_output_file_path(md_file, output_root), vault_root)
+        return os.path.splitext(path)[0].replace(os.sep, '/')
+
+    chapters = [chapter(md_file) for md_file in md_files if os.path.exists(get_output_file_path(md_file, output_root))]
+    write_if_changed(os.path.join(output_root, CHAPTER_LIST), ''.join(f"\\include{{{name}}}\n" for name in chapters))
+    include_only = '' if only is None else f"\\includeonly{{{','.join(chapter(md_file) for md_file in only)}}}\n"
+    write_if_changed(os.path.join(output_root, INCLUDE_ONLY), include_only)
+
+# =============================================================================
+# WATCH MODE
+# =============================================================================
+
+def snapshot_md_files(input_root=MD_ROOT):
+    """Map each Markdown file in input_root to its (mtime, size)."""
+    snapshot = {}
+    with os.scandir(input_root) as entries:
+        for entry in entries:
+            if entry.name.endswith('.md') and entry.is_file():
+                stat = entry.stat()
+                snapshot[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+def watch_directory(interval=0.1, debounce=0.3, hook=None, n_jobs=1, input_root=MD_ROOT, output_root=TEX_ROOT,
+                    targets=('handout',)):
+    """
+    Poll input_root and reconvert notes into output_root as they change.
+
+    Bursts of saves are debounced: conversion starts once no file has changed
+    for `debounce` seconds. `hook` is an optional shell command run after each
+    conversion that rebuilt something, e.g. the LaTeX step.
+    """
+    convert_all_md_in_directory(n_jobs=n_jobs, verbose=False, input_root=input_root, output_root=output_root,
+                                targets=targets)
+    snapshot = snapshot_md_files(input_root)
+    last_change = None
+    print(f"Watching {os.path.abspath(input_root)} for changes (Ctrl-C to stop)...")
+
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot_md_files(input_root)
+            if current != snapshot:
+                snapshot = current
+                last_change = time.monotonic()
+            if last_change is None or time.monotonic() - last_change < debounce:
+                continue
+
+            last_change = None
+            start = time.perf_counter()
+            report = convert_all_md_in_directory(n_jobs=n_jobs, verbose=False, input_root=input_root,
+                                                 output_root=output_root, targets=targets)
+            print(f"[Watch] Converted in {(time.perf_counter() - start) * 1000:.1f} ms")
+            if hook and (report['rebuilt'] or report['removed']):
+                subprocess.run(hook, shell=True)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+# =============================================================================
+# LIBRARY API
+# =============================================================================
+# For converting from another Python process without touching the working
+# directory. Patterns are compiled once at import and the callout_head built
+# for each callout registry is kept, so switching registries between calls is
+# cheap.
+#
+#     import md2tex
+#     latex = md2tex.convert(text)
+#     outputs = md2tex.convert_targets(text, ['handout', 'slides'])
+#     for name, latex in md2tex.convert_many(['a.md', 'b.md'], 'vault/MdFiles', 'vault/TeXFiles'):
+#         ...
+
+DEFAULT_OPTIONS = {
+    'callouts': None,  # Callout registry to use, None for the active one (see CALLOUTS)
+}
+
+def convert(text, options=None):
+    """Convert a Markdown string to LaTeX with the given options (see DEFAULT_OPTIONS)."""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    if options['callouts'] is None:
+        return convert_markdown(text)
+
+    active = CALLOUTS
+    compile_callouts(options['callouts'])
+    try:
+        return convert_markdown(text)
+    finally:
+        compile_callouts(active)
+
+def convert_targets(text, targets=tuple(TARGETS), options=None):
+    """Parse a Markdown string once and return {target: LaTeX} for each of the given TARGETS."""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    active = CALLOUTS
+    if options['callouts'] is not None:
+        compile_callouts(options['callouts'])
+    try:
+        blocks, spans = parse_markdown(text)
+        return {target: emit_target(blocks, spans, target) for target in targets}
+    finally:
+        compile_callouts(active)
+
+def convert_many(items, input_root=None, output_root=None, options=None):
+    """
+    Lazily convert many notes, yielding (name, latex) pairs in input order.
+
+    Each item is either a path to a Markdown file, relative to input_root
+    when one is given, or a (name, text) pair for a note already in memory.
+    With output_root set, each result is also written to output_root as
+    name.tex, leaving files whose content is unchanged untouched.
+    """
+    if output_root is not None:
+        ensure_texfiles_subfolder(output_root)
+    for item in items:
+        if isinstance(item, tuple):
+            name, text = item
+        else:
+            name = os.fspath(item)
+            with open(os.path.join(input_root, name) if input_root else name, 'r', encoding='utf-8') as f:
+                text = f.read()
+        latex = convert(text, options)
+        if output_root is not None:
+            md_file = os.path.basename(name)
+            md_file = md_file if md_file.endswith('.md') else md_file + '.md'
+            write_if_changed(get_output_file_path(md_file, output_root), latex)
+        yield name, latex
 
 # =============================================================================
 # COMMAND LINE INTERFACE
@@ -453,11 +2173,81 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Convert Markdown to LaTeX.')
     parser.add_argument('input', nargs='?', help='Input Markdown file (optional)')
     parser.add_argument('output', nargs='?', help='Output LaTeX file (optional)')
+    parser.add_argument('--input-root', default=MD_ROOT, help='Directory holding the Markdown notes (default: .)')
+    parser.add_argument('--output-root', default=TEX_ROOT, help='Directory for the LaTeX files (default: ../TeXFiles)')
+    parser.add_argument('--force', action='store_true', help='Ignore the build cache and reconvert every file')
+    parser.add_argument('--dirty-only', action='store_true',
+                        help='Make the next LaTeX build typeset only the chapters rebuilt by this run')
+    parser.add_argument('--targets', default='handout',
+                        help=f"Comma-separated outputs emitted from one parse of each note: {', '.join(TARGETS)} "
+                             "(default: handout; the handout is always written)")
+    parser.add_argument('--stream', action='store_true', help='Convert input files chunk by chunk with bounded memory')
+    parser.add_argument('--watch', action='store_true', help='Keep running and reconvert notes when they change')
+    parser.add_argument('--on-change', metavar='CMD', help='Shell command to run after each watch-mode rebuild')
+    parser.add_argument('-j', '--jobs', type=int, default=1, help='Number of processes converting files in parallel')
+    parser.add_argument('--dependents', nargs='+', metavar='TARGET',
+                        help='List the notes that embed these code files or images (vault paths) or link to these notes')
+    parser.add_argument('--images', action='store_true',
+                        help='Build cached, downscaled image derivatives first and point figures at them')
+    parser.add_argument('--snippets', action='store_true',
+                        help='Pre-highlight code with Pygments into cached fragments, for the directory and watch modes')
+    parser.add_argument('--snippet-style', default=SNIPPET_STYLE, help=f"Pygments style for --snippets (default: {SNIPPET_STYLE})")
+    parser.add_argument('--profile', action='store_true',
+                        help='Report per-stage timings, sizes and pattern match counts (implies --force and one job)')
+    parser.add_argument('--profile-json', metavar='PATH', help='With --profile, also write the per-file profile as JSON')
+    parser.add_argument('--profile-cprofile', metavar='PATH', help='With --profile, also dump cProfile stats of the run')
     args = parser.parse_args()
+    targets = [target.strip() for target in args.targets.split(',') if target.strip()]
+    for target in targets:
+        if target not in TARGETS:
+            parser.error(f"unknown target '{target}', expected one of {', '.join(TARGETS)}")
+
+    if args.dependents:
+        manifest = load_cache_manifest(os.path.join(args.output_root, CACHE_MANIFEST))
+        for md_file in dependents(manifest, args.dependents):
+            print(md_file)
+        sys.exit(0)
+
+    load_callout_config(os.path.join(args.input_root, CALLOUT_CONFIG))
+    cprofiler = None
+    if args.profile:
+        # Cached files would not be converted and worker processes would not report back
+        args.force = True
+        args.jobs = 1
+        enable_profiling()
+        if args.profile_cprofile:
+            cprofiler = cProfile.Profile()
+            cprofiler.enable()
+
+    # Figures are checked for missing images either way, derivatives are opt-in
+    vault_root = os.path.join(args.input_root, '..')
+    use_image_derivatives(vault_root, build_image_derivatives(vault_root, args.jobs, args.force) if args.images else {})
+    # Fragments are rendered from the dependency graph the directory converter records
+    use_code_snippets(vault_root, args.snippet_style if args.snippets and not args.input else None)
 
     if args.input and args.output:
-        ensure_texfiles_subfolder()
-        output_file = get_output_file_path(args.output)
-        convert_md_to_tex(args.input, output_file)
+        ensure_texfiles_subfolder(args.output_root)
+        output_file = get_output_file_path(args.output, args.output_root)
+        extra_outputs = {target: target_output_path(args.output, target, args.output_root)
+                         for target in targets if target != 'handout'}
+        convert_md_to_tex(args.input, output_file, stream=args.stream or None, extra_outputs=extra_outputs,
+                          source_maps=True)
+    elif args.watch:
+        watch_directory(hook=args.on_change, n_jobs=args.jobs, input_root=args.input_root, output_root=args.output_root,
+                        targets=targets)
     else:
-        convert_all_md_in_directory()
+        convert_all_md_in_directory(force=args.force, n_jobs=args.jobs, stream=args.stream or None,
+                                    input_root=args.input_root, output_root=args.output_root,
+                                    dirty_only=args.dirty_only, targets=targets)
+
+    if args.profile:
+        if cprofiler:
+            cprofiler.disable()
+            cprofiler.dump_stats(args.profile_cprofile)
+            print(f"cProfile stats saved to {args.profile_cprofile}.")
+        profile = disable_profiling()
+        print_profile(profile)
+        if args.profile_json:
+            with open(args.profile_json, 'w', encoding='utf-8') as f:
+                json.dump(profile, f, indent=2)
+            print(f"Profile saved to {args.profile_json}.")
@@ -0,0 +1,569 @@
+"""
+Live Preview Server
+===================
+
+Serves the notes of a vault as HTML on a local port, without LaTeX:
+- Notes are read by md2tex's block tokenizer and emitted as HTML, with the
+  same callouts, fine notes, fullwidth blocks, tables and code embeds
+- Math is left as source and typeset in the browser by MathJax
+- Each page holds a websocket; when its note or anything it embeds changes,
+  the new HTML is pushed and swapped in without a reload
+- Rendered notes are cached per file and all of them are rendered once at
+  start-up, so switching notes does not wait on the converter
+
+Run it where md2tex.py runs, in MdFiles, and open the printed address:
+
+    python3 preview.py
+    python3 preview.py --port 8080 --input-root vault/MdFiles
+"""
+
+# Standard Library Imports
+import argparse
+import asyncio
+import base64
+import functools
+import hashlib
+import html
+import mimetypes
+import os
+import re
+import struct
+import time
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import md2tex
+
+try:
+    from pygments import highlight
+    from pygments.formatters import HtmlFormatter
+except ImportError:
+    highlight = None
+
+# =============================================================================
+# SETTINGS
+# =============================================================================
+
+# Seconds between checks of the open notes; with rendering in a few ms this
+# keeps a save within 100 ms of the browser
+POLL_INTERVAL = 0.05
+
+# Names the preamble gives the callout environments
+CALLOUT_NAMES = {
+    'theorem': 'Th', 'lemma': 'Lemma', 'corollary': 'Cor', 'definition': 'Def', 'algo': 'Algo',
+    'eg': 'Eg', 'xeg': 'XEg', 'remark': 'Remark', 'target': 'Target', 'warning': 'Warning',
+    'concept': 'Concept',
+}
+
+MATHJAX_URL = 'https://cdn.jsdelivr.net/npm/mathjax@3/es5/tex-chtml.js'
+
+# =============================================================================
+# HTML EMITTER
+# =============================================================================
+# Walks the block tree of md2tex.parse_markdown. Inline rules follow
+# convert_inline and convert_inline_post; the markup each rule produces is
+# lifted into an 'html' span so later rules and the final escaping leave it
+# alone, and every span is put back at the end.
+
+LIST_ITEM = re.compile(r'^(\s*)[-*]\s+(.*)')
+ORDERED_ITEM = re.compile(r'^(\s*)\d+\.\s+(.*)')
+
+def inline_html(text, spans, context):
+    """Render one line of Markdown to HTML with its inline elements as span placeholders."""
+    def lift(markup):
+        return md2tex.add_span(spans, 'html', markup)
+
+    if '`' in text or '$' in text:
+        def lift_inline(match):
+            span = match.group(0)
+            if span.startswith('`'):
+                return md2tex.add_span(spans, 'fence', span) if span.startswith('```') else \
+                    lift(f"<code>{html.escape(span.strip('`'))}</code>")
+            return md2tex.add_span(spans, 'display' if span.startswith('$$') else 'math', span)
+        text = md2tex.patterns['inline_span'].sub(lift_inline, text)
+    if '#' in text:
+        text = md2tex.convert_tags(text)
+    if '[[' in text:
+        text = md2tex.patterns['image_embed'].sub(lambda m: lift(image_html(m, context)), text)
+        text = md2tex.patterns['code_embed'].sub(lambda m: lift(code_html(m, context)), text)
+        text = md2tex.patterns['note_link'].sub(lambda m: lift(
+            f"<a href=\"/note/{quote(md2tex.note_file_name(m.group(1)))}\">"
+            f"{html.escape(m.group(1).strip())}</a>"), text)
+    if '](' in text:
+        text = md2tex.patterns['href'].sub(lambda m: lift(
+            f"<a href=\"{html.escape(m.group(2))}\">{inline_html(m.group(1), spans, context)}</a>"), text)
+    if '<' in text:
+        text = md2tex.patterns['underline'].sub(lambda m: lift(f"<u>{inline_html(m.group(1), spans, context)}</u>"), text)
+        text = md2tex.patterns['font_red'].sub(lambda m: lift(
+            f"<span class=\"red\">{inline_html(m.group(1), spans, context)}</span>"), text)
+    if '*' in text:
+        text = md2tex.patterns['bold'].sub(lambda m: lift(f"<b>{inline_html(m.group(1), spans, context)}</b>"), text)
+        text = md2tex.patterns['italic'].sub(lambda m: lift(f"<i>{inline_html(m.group(1), spans, context)}</i>"), text)
+
+    def fine(content):
+        return lift(f"<span class=\"fine\">{inline_html(content, spans, context)}</span>")
+    if '[fine]' in text:
+        text = md2tex.patterns['fine'].sub(lambda m: fine(m.group(1)), text)
+    if '%%' in text:
+        text = md2tex.patterns['fine_with_num'].sub(lambda m: fine(m.group(2)), text)
+        text = md2tex.patterns['fine_with_percent'].sub(lambda m: fine(m.group(1)), text)
+    if 'Q' in text:
+        text = md2tex.patterns['qed'].sub(lambda m: lift("<span class=\"qed\">&#8718;</span>"), text)
+    if '~~' in text:
+        text = md2tex.patterns['fullwidth_block'].sub(lambda m: lift(
+            f"<div class=\"fullwidth\">{inline_html(m.group(1).strip(), spans, context)}</div>"), text)
+    return html.escape(text, quote=False)
+
+def image_html(match, context):
+    """A figure for an ![[image]] embed, served from the vault."""
+    raw_path = match.group(1).strip()
+    path = md2tex.image_path(raw_path)
+    context['deps'].add(path)
+    caption = html.escape(os.path.splitext(os.path.basename(raw_path))[0])
+    return f"<figure><img src=\"/{quote(path)}\" alt=\"{caption}\"><figcaption>{caption}</figcaption></figure>"
+
+def code_html(match, context):
+    """A listing of the embedded lines of a [[file|label|start:end]] code embed."""
+    path = md2tex.code_path(match.group(1))
+    start, end = int(match.group(3) or 1), int(match.group(4) or 500)
+    context['deps'].add(path)
+    try:
+        with open(os.path.join(context['root'], path), 'r', encoding='utf-8') as f:
+            code = ''.join(f.readlines()[start - 1:end])
+    except (OSError, ValueError) as e:
+        return f"<span class=\"missing\">[Error] {html.escape(path)}: {html.escape(getattr(e, 'strerror', None) or str(e))}</span>"
+    return f"<figure class=\"code\"><figcaption>{html.escape(match.group(2))}</figcaption>" \
+           f"{code_block(code, name=path)}</figure>"
+
+# Looking a lexer up by a name Pygments does not know scans every plugin,
+# and a formatter builds its whole stylesheet, so both are made once. Every
+# save renders the whole note again, so highlighted code is kept as well.
+lexer_for = functools.lru_cache(maxsize=None)(md2tex.snippet_lexer)
+formatter = HtmlFormatter() if highlight is not None else None
+
+@functools.lru_cache(maxsize=1024)
+def code_block(code, name=None, language=None):
+    """Highlighted HTML for code from a file name or fence language, or a plain pre block without Pygments."""
+    if highlight is not None:
+        return highlight(code, lexer_for(name, language), formatter)
+    return f"<pre><code>{html.escape(code)}</code></pre>"
+
+def restore_html(text, spans):
+    """Put back every span, including spans lifted inside others."""
+    def restore(match):
+        kind, span = spans[int(match.group(2))]
+        if kind == 'html':
+            return match.group(1) + restore_html(span, spans)
+        if kind == 'fence':
+            if '\n' not in span:
+                return match.group(1) + f"<code>{html.escape(span.strip('`'))}</code>"
+            language, code = md2tex.fence_code(span)
+            return match.group(1) + code_block(code, language=language)
+        if kind == 'display':
+            return f"<div class=\"math\">{html.escape(span)}</div>"
+        return match.group(1) + html.escape(span)
+
+    return md2tex.patterns['span'].sub(restore, text)
+
+def list_html(items, spans, context):
+    """Nest (indent, ordered, text) list items into ul/ol elements."""
+    out = []
+    stack = []
+    for indent, ordered, text in items:
+        while stack and stack[-1][0] > indent:
+            out.append(f"</li></{stack.pop()[1]}>")
+        if stack and stack[-1][0] == indent:
+            out.append('</li>')
+        else:
+            tag = 'ol' if ordered else 'ul'
+            stack.append((indent, tag))
+            out.append(f"<{tag}>")
+        out.append(f"<li>{inline_html(text, spans, context)}")
+    while stack:
+        out.append(f"</li></{stack.pop()[1]}>")
+    return ''.join(out)
+
+def table_html(lines, spans, context):
+    """A table from its header, separator and data row lines."""
+    header = md2tex.split_table_row(lines[0])
+    align = md2tex.column_alignment(lines[1], len(header))
+    styles = [f" style=\"text-align:{ {'l': 'left', 'c': 'center', 'r': 'right'}[a] }\"" for a in align]
+    out = ['<table><thead><tr>']
+    out.extend(f"<th{style}>{inline_html(cell.strip(), spans, context)}</th>" for style, cell in zip(styles, header))
+    out.append('</tr></thead><tbody>')
+    for row in lines[2:]:
+        out.append('<tr>')
+        out.extend(f"<td{style}>{inline_html(cell.strip(), spans, context)}</td>"
+                   for style, cell in zip(styles, md2tex.split_table_row(row)))
+        out.append('</tr>')
+    out.append('</tbody></table>')
+    return ''.join(out)
+
+def callout_html(form, env, title, lines, spans, context):
+    """A callout box, with block callout content emitted as blocks of its own."""
+    if form == 'hint':
+        return f"<div class=\"para\"><span class=\"fine\">{inline_html(lines[0], spans, context)}</span></div>"
+    heading = CALLOUT_NAMES.get(env, env.capitalize())
+    if title:
+        heading = f"{heading} ({inline_html(title, spans, context)})"
+    if form != 'block':
+        body = f"<div class=\"para\">{inline_html(lines[0], spans, context)}</div>"
+    else:
+        parts = []
+        run = []
+        for line in lines:
+            nested = md2tex.match_callout(line) if md2tex._is_line_callout(line) else None
+            if nested:
+                parts.append(emit_html(md2tex.parse_blocks(run), spans, context))
+                parts.append(callout_html(nested[0], nested[1], nested[2], [nested[3]], spans, context))
+                run = []
+            else:
+                run.append(re.sub(r'^> ?', '', line))
+        parts.append(emit_html(md2tex.parse_blocks(run), spans, context))
+        body = ''.join(parts)
+    return f"<div class=\"callout {env}\"><div class=\"callout-title\">{heading}</div>{body}</div>"
+
+def emit_html(blocks, spans, context):
+    """Walk the block tree and return the note's HTML."""
+    out = []
+    paragraph = []
+    items = []
+
+    def flush():
+        if paragraph:
+            out.append(f"<div class=\"para\">{' '.join(inline_html(line, spans, context) for line in paragraph)}</div>")
+            paragraph.clear()
+        if items:
+            out.append(list_html(items, spans, context))
+            items.clear()
+
+    for block in blocks:
+        kind = block[0]
+        if kind == 'line':
+            item = LIST_ITEM.match(block[1]) or ORDERED_ITEM.match(block[1])
+            if item:
+                if paragraph:
+                    flush()
+                items.append((len(item.group(1).expandtabs(4)), item.re is ORDERED_ITEM, item.group(2)))
+            elif items and block[1].startswith((' ', '\t')):
+                # A continuation line of the last item
+                indent, ordered, text = items[-1]
+                items[-1] = (indent, ordered, f"{text} {block[1].strip()}")
+            else:
+                if items:
+                    flush()
+                paragraph.append(block[1])
+            continue
+
+        flush()
+        if kind == 'heading':
+            level = min(block[1] + 1, 6)
+            out.append(f"<h{level}>{inline_html(block[2], spans, context)}</h{level}>")
+        elif kind == 'rule':
+            out.append('<hr>' if block[1] == '---' else '<hr class="short">')
+        elif kind == 'table':
+            out.append(table_html(block[1], spans, context))
+        elif kind == 'quote':
+            lines = [inline_html(re.sub(r'^>+ ?', '', line), spans, context) for line in block[1]]
+            out.append(f"<blockquote>{'<br>'.join(lines)}</blockquote>")
+        elif kind == 'callout':
+            out.append(callout_html(*block[1:], spans, context))
+        elif kind == 'fullwidth':
+            out.append(f"<div class=\"fullwidth\">{emit_html(block[1], spans, context)}</div>")
+    flush()
+    return '\n'.join(out)
+
+def render_note(text, vault_root):
+    """Render a note to HTML, returning it with the vault paths it embeds."""
+    context = {'root': vault_root, 'deps': set()}
+    blocks, spans = md2tex.parse_markdown(text)
+    return restore_html(emit_html(blocks, spans, context), spans), context['deps']
+
+# =============================================================================
+# NOTE CACHE
+# =============================================================================
+# Each note's HTML is kept with the (mtime, size) of the note and of every
+# file it embeds, and rendered again only when one of them moved.
+
+def file_stat(path):
+    """(mtime, size) of a file, or None if it does not exist."""
+    try:
+        stat = os.stat(path)
+    except (OSError, ValueError):
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def is_fresh(entry):
+    """Whether a cache entry still matches its note and embeds on disk."""
+    return all(file_stat(path) == stat for path, stat in entry['stats'].items())
+
+def cached_note(md_file, state):
+    """The cache entry of a note, rendering it first if it is missing or stale."""
+    entry = state['cache'].get(md_file)
+    if entry is not None and is_fresh(entry):
+        return entry
+
+    path = os.path.join(state['input_root'], md_file)
+    start = time.perf_counter()
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    body, deps = render_note(text, state['vault_root'])
+    stats = {path: file_stat(path)}
+    stats.update((os.path.join(state['vault_root'], dep), file_stat(os.path.join(state['vault_root'], dep)))
+                 for dep in deps)
+    entry = {'html': body, 'stats': stats, 'ms': (time.perf_counter() - start) * 1000}
+    state['cache'][md_file] = entry
+    return entry
+
+def note_files(state):
+    """Markdown files in the input root, sorted by name."""
+    return sorted(name for name in os.listdir(state['input_root']) if name.endswith('.md'))
+
+# =============================================================================
+# WEBSOCKET
+# =============================================================================
+# Only what the preview needs: the opening handshake, unfragmented text
+# frames to the browser, and close and ping frames from it.
+
+WEBSOCKET_GUID = '258EAFA5-E914-47DA-95CA-C5AB0DC85B11'
+
+def websocket_accept(key):
+    """Sec-WebSocket-Accept value for a client's Sec-WebSocket-Key."""
+    return base64.b64encode(hashlib.sha1((key + WEBSOCKET_GUID).encode('ascii')).digest()).decode('ascii')
+
+def websocket_frame(payload, opcode=0x1):
+    """An unmasked server frame carrying payload."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack('!BB', 0x80 | opcode, length)
+    elif length < 1 << 16:
+        header = struct.pack('!BBH', 0x80 | opcode, 126, length)
+    else:
+        header = struct.pack('!BBQ', 0x80 | opcode, 127, length)
+    return header + payload
+
+async def read_websocket_frame(reader):
+    """Read one client frame, returning (opcode, unmasked payload)."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        length = struct.unpack('!H', await reader.readexactly(2))[0]
+    elif length == 127:
+        length = struct.unpack('!Q', await reader.readexactly(8))[0]
+    mask = await reader.readexactly(4) if second & 0x80 else b'\x00\x00\x00\x00'
+    payload = await reader.readexactly(length)
+    return first & 0x0F, bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+
+async def serve_websocket(reader, writer, headers, md_file, state):
+    """Hold a page's socket open, pushing its note each time it is rendered again."""
+    writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  f"Sec-WebSocket-Accept: {websocket_accept(headers['sec-websocket-key'])}\r\n\r\n").encode('ascii'))
+    await writer.drain()
+    clients = state['clients'].setdefault(md_file, set())
+    clients.add(writer)
+    try:
+        while True:
+            opcode, payload = await read_websocket_frame(reader)
+            if opcode == 0x8:
+                writer.write(websocket_frame(payload[:2], 0x8))
+                break
+            if opcode == 0x9:
+                writer.write(websocket_frame(payload, 0xA))
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        clients.discard(writer)
+
+async def push_note(md_file, body, state):
+    """Send a note's HTML to every page showing it."""
+    frame = websocket_frame(body.encode('utf-8'))
+    for writer in list(state['clients'].get(md_file, ())):
+        try:
+            writer.write(frame)
+            await writer.drain()
+        except ConnectionError:
+            state['clients'][md_file].discard(writer)
+
+# =============================================================================
+# HTTP SERVER
+# =============================================================================
+
+PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ max-width: 46em; margin: 2em auto; padding: 0 1em; font: 16px/1.6 serif; }}
+nav {{ font-size: 0.9em; margin-bottom: 1em; }}
+.callout {{ border-left: 4px solid #c33; background: #fbf5f5; padding: 0.4em 1em; margin: 1em 0; }}
+.callout.definition {{ border-color: #393; background: #f4faf4; }}
+.callout.eg {{ border-color: #36c; background: #f4f7fc; }}
+.callout.xeg {{ border-color: #839; background: #f8f4fb; }}
+.callout.concept {{ border-color: #e80; background: #fdf8f0; }}
+.callout.remark {{ border-color: #36c; background: none; }}
+.callout-title {{ font-weight: bold; }}
+.fine {{ font-size: 0.85em; color: #555; }}
+.fine::before {{ content: "\\2020 "; }}
+.fullwidth {{ margin-right: -8em; }}
+.red {{ color: #c00; }}
+.qed {{ float: right; }}
+.missing {{ color: #c00; }}
+.para {{ margin: 0.8em 0; }}
+blockquote {{ border-left: 3px solid #aaa; margin-left: 0; padding-left: 1em; }}
+hr.short {{ width: 75%; }}
+table {{ border-collapse: collapse; margin: 1em auto; }}
+th, td {{ border-top: 1px solid #999; border-bottom: 1px solid #999; padding: 0.2em 0.8em; }}
+figure {{ text-align: center; }}
+figure img {{ max-width: 50%; }}
+figure.code {{ text-align: left; }}
+pre {{ background: #f6f6f6; padding: 0.6em; overflow-x: auto; }}
+{highlight_css}
+</style>
+<script>
+MathJax = {{ tex: {{ inlineMath: [['$', '$']], displayMath: [['$$', '$$']] }} }};
+</script>
+<script async src="{mathjax}"></script>
+</head><body>
+<nav><a href="/">All notes</a></nav>
+<main id="note">{body}</main>
+{script}
+</body></html>
+"""
+
+LIVE_SCRIPT = """<script>
+(function connect() {{
+  const socket = new WebSocket(`ws://${{location.host}}/ws?note={note}`);
+  socket.onmessage = (event) => {{
+    const main = document.getElementById('note');
+    main.innerHTML = event.data;
+    if (window.MathJax && MathJax.typesetPromise) MathJax.typesetPromise([main]);
+  }};
+  socket.onclose = () => setTimeout(connect, 1000);
+}})();
+</script>"""
+
+def page(title, body, note=None):
+    """A full HTML page around a body, live-updating if it shows a note."""
+    css = formatter.get_style_defs('.highlight') if highlight is not None else ''
+    script = LIVE_SCRIPT.format(note=quote(note)) if note else ''
+    return PAGE.format(title=html.escape(title), body=body, highlight_css=css, mathjax=MATHJAX_URL, script=script)
+
+def respond(writer, status, content_type, body):
+    """Write a complete HTTP response."""
+    writer.write((f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+                  "Cache-Control: no-cache\r\nConnection: close\r\n\r\n").encode('ascii') + body)
+
+def static_file(url_path, state):
+    """Path of a vault file for a URL path, or None if it lies outside the vault."""
+    root = os.path.realpath(state['vault_root'])
+    path = os.path.realpath(os.path.join(root, unquote(url_path).lstrip('/')))
+    if not path.startswith(root + os.sep) or not os.path.isfile(path):
+        return None
+    return path
+
+async def handle_request(reader, writer, state):
+    """Serve one connection: the note index, a note page, a note's socket or a vault file."""
+    try:
+        request = (await reader.readline()).decode('latin-1').split()
+        headers = {}
+        while True:
+            line = (await reader.readline()).decode('latin-1')
+            if line in ('\r\n', '\n', ''):
+                break
+            name, _, value = line.partition(':')
+            headers[name.strip().lower()] = value.strip()
+        if len(request) < 2 or request[0] != 'GET':
+            respond(writer, '405 Method Not Allowed', 'text/plain', b'')
+            return
+
+        url = urlsplit(request[1])
+        loop = asyncio.get_running_loop()
+        if url.path == '/ws':
+            md_file = os.path.basename(parse_qs(url.query).get('note', [''])[0])
+            await serve_websocket(reader, writer, headers, md_file, state)
+        elif url.path == '/':
+            links = ''.join(f"<li><a href=\"/note/{quote(name)}\">{html.escape(name[:-3])}</a></li>"
+                            for name in note_files(state))
+            respond(writer, '200 OK', 'text/html; charset=utf-8', page('Notes', f"<ul>{links}</ul>").encode('utf-8'))
+        elif url.path.startswith('/note/'):
+            md_file = os.path.basename(unquote(url.path[len('/note/'):]))
+            if not os.path.isfile(os.path.join(state['input_root'], md_file)):
+                respond(writer, '404 Not Found', 'text/plain', b'No such note')
+                return
+            entry = await loop.run_in_executor(None, cached_note, md_file, state)
+            respond(writer, '200 OK', 'text/html; charset=utf-8',
+                    page(md_file[:-3], entry['html'], md_file).encode('utf-8'))
+        else:
+            path = static_file(url.path, state)
+            if path is None:
+                respond(writer, '404 Not Found', 'text/plain', b'Not found')
+                return
+            with open(path, 'rb') as f:
+                data = f.read()
+            respond(writer, '200 OK', mimetypes.guess_type(path)[0] or 'application/octet-stream', data)
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    except Exception as e:
+        print(f"[Error] {type(e).__name__}: {e}")
+        respond(writer, '500 Internal Server Error', 'text/plain', str(e).encode('utf-8'))
+    finally:
+        try:
+            await writer.drain()
+            writer.close()
+        except ConnectionError:
+            pass
+
+# =============================================================================
+# WATCHER
+# =============================================================================
+
+async def warm_cache(state):
+    """Render every note once in the background, so the first visit to each is instant."""
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    for md_file in note_files(state):
+        try:
+            await loop.run_in_executor(None, cached_note, md_file, state)
+        except Exception as e:
+            print(f"[Error] {md_file}: {type(e).__name__}: {e}")
+    print(f"Rendered {len(state['cache'])} notes in {(time.perf_counter() - start) * 1000:.1f} ms.")
+
+async def watch_open_notes(state, interval=POLL_INTERVAL):
+    """Poll the notes that have a page open, rendering and pushing them as soon as they change."""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(interval)
+        for md_file in [name for name, clients in state['clients'].items() if clients]:
+            entry = state['cache'].get(md_file)
+            if entry is not None and is_fresh(entry):
+                continue
+            try:
+                entry = await loop.run_in_executor(None, cached_note, md_file, state)
+            except Exception as e:
+                print(f"[Error] {md_file}: {type(e).__name__}: {e}")
+                continue
+            await push_note(md_file, entry['html'], state)
+            print(f"[Preview] {md_file} rendered in {entry['ms']:.1f} ms")
+
+async def serve(host, port, input_root):
+    """Run the preview server until interrupted."""
+    state = {'input_root': input_root, 'vault_root': os.path.join(input_root, '..'), 'cache': {}, 'clients': {}}
+    server = await asyncio.start_server(lambda r, w: handle_request(r, w, state), host, port)
+    print(f"Previewing {os.path.abspath(input_root)} at http://{host}:{port}/ (Ctrl-C to stop)")
+    async with server:
+        await asyncio.gather(server.serve_forever(), warm_cache(state), watch_open_notes(state))
+
+# =============================================================================
+# COMMAND LINE INTERFACE
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Preview notes as live-updating HTML, without LaTeX.')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to listen on (default: 127.0.0.1)')
+    parser.add_argument('--port', type=int, default=8000, help='Port to listen on (default: 8000)')
+    parser.add_argument('--input-root', default=md2tex.MD_ROOT, help='Directory containing the Markdown notes')
+    args = parser.parse_args()
+
+    md2tex.load_callout_config(os.path.join(args.input_root, md2tex.CALLOUT_CONFIG))
+    try:
+        asyncio.run(serve(args.host, args.port, args.input_root))
+    except KeyboardInterrupt:
+        print("Stopped previewing.")
@@ -2,17 +2,17 @@
 
 THE_WORK_DIR="../../Archive/Works/"
 
-# time duration
-get_time() {
-    echo $(date +%s%3N)
-}
-calc_duration() {
-    start=$1
-    end=$2
-    name=$3
-    duration=$(echo "scale=3; ($end - $start) / 1000" | bc)
-    echo "[$3 Cost]: $duration seconds"
-}
+# Phase trends of past builds
+if [ "$1" == "report" ]; then
+    python3 build.py report
+    exit
+fi
+
+# Errors and overfull boxes of the last compile, at their note lines
+if [ "$1" == "triage" ]; then
+    python3 build.py triage
+    exit
+fi
 
 # Check for -m option
 skip_compile=false
@@ -22,49 +22,14 @@ if [ "$1" == "-m" ]; then
 fi
 
 if [ "$skip_compile" = false ]; then
-    start_time=$(get_time)
-
-    # Converting markdown to latex
-    mdconv_start=$(get_time)
-    rm TeXFiles/*
-    cd MdFiles
-    python3 md2tex.py
-    cd ..
-    mdconv_end=$(get_time)
-
-    if [ "$1" == "cheat" ]; then
-        if [ -d "CheatSheets" ]; then
-            mdtoch_start=$(get_time)
-            cd CheatSheets
-            python3 md2ch.py
-            cd ..
-            xelatex -interaction=nonstopmode cheatsheet.tex > Logs/cheatsheet_compile.log 2>&1
-            mdtoch_end=$(get_time)
-        else
-            echo "[Cheatsheets] No CheatSheets Dir found!"
-        fi
-    fi
-
-    final_start=$(get_time)
-    xelatex -interaction=nonstopmode master.tex > Logs/master_compile.log 2>&1
-    zathura master.pdf & return
-    xelatex -interaction=nonstopmode master.tex >> Logs/master_compile.log 2>&1
-    final_end=$(get_time)
-
-    # generating a markdown content
-    python3 content_gen.py
-
-    end_time=$(get_time)
-
-    echo "============================================================"
-    calc_duration $mdconv_start $mdconv_end "Markdown Convert to TeX"
+    # build.py converts the notes, compiles only as many passes as needed,
+    # regenerates Content.md and reports the time of each phase
     if [ "$1" == "cheat" ]; then
-        calc_duration $mdtoch_start $mdtoch_end "CheatSheet Convert & Compiling"
+        python3 build.py --cheat
+    else
+        python3 build.py
     fi
-    calc_duration $final_start $final_end "Main File Compiling"
-    calc_duration $start_time $end_time "All"
-    echo "Q.E.D."
-    echo "============================================================"
+    zathura master.pdf &
 fi
 
 # Sync option, work with nutstore.
@@ -76,6 +41,6 @@ if [ "$move_choice" == "y" ]; then
 fi
 
 if [ "$skip_compile" = false ]; then
-    latexmk -c > Logs/latexmk_clean.log 2>&1
+    # Auxiliary files are kept: build.py compares them to skip needless passes
     echo "M O V E   F O R W A R D"
 fi
@@ -0,0 +1,184 @@
+"""
+Pathological Input Check
+========================
+
+Runs every converter stage on adversarial documents and fails when a stage
+raises or takes longer than its time budget, so a half-typed note can never
+stall the watch or build loop:
+- Unterminated constructs: $, $$, ```, ~~u, [fine], %%, **, <u>, [ and [[
+- Long runs: blockquotes, block callouts, tables, deep lists, pipes, spaces
+- Random fuzz built from the syntax the converter reacts to
+
+Each stage runs in its own process so a runaway one can be stopped.
+
+    python3 stress.py --size 8000000
+    python3 stress.py --case quote_run --stage convert_markdown
+"""
+
+# Standard Library Imports
+import argparse
+import multiprocessing
+import random
+import sys
+import time
+
+import md2tex
+import preview
+
+# =============================================================================
+# ADVERSARIAL DOCUMENTS
+# =============================================================================
+
+def repeat(unit, size):
+    """unit repeated to about size characters."""
+    return unit * max(1, size // len(unit))
+
+CASES = {
+    # Single very long lines
+    'open_dollars': lambda size: repeat('$a ', size),
+    'open_display_math': lambda size: repeat('$$a ', size),
+    'open_backticks': lambda size: repeat('`a ', size),
+    'open_fullwidth': lambda size: repeat('~~u a ', size),
+    'open_fine': lambda size: repeat('[fine] a ', size),
+    'open_percent': lambda size: repeat('%%[1] a ', size),
+    'open_bold': lambda size: repeat('**a ', size),
+    'open_brackets': lambda size: repeat('[', size),
+    'open_links': lambda size: repeat('[a](', size),
+    'open_embeds': lambda size: repeat('![[a', size),
+    'open_code_embeds': lambda size: repeat('[[a|b', size),
+    'open_underline': lambda size: repeat('<u>a ', size),
+    'open_red': lambda size: repeat('<font color="#ff0000">a ', size),
+    'percent_digits': lambda size: '%%[' + repeat('1', size),
+    'title_spaces': lambda size: '> [!note] a' + repeat(' ', size),
+    'percent_spaces': lambda size: '%%[1] a' + repeat(' ', size),
+    'pipes': lambda size: repeat('|', size),
+    'hashes': lambda size: repeat('#', size),
+    'qed_words': lambda size: repeat('QED ', size),
+    # Many short lines
+    'open_fence_lines': lambda size: repeat('```\na\n```py\n', size) + '```\n',
+    'open_math_lines': lambda size: '$$\n' + repeat('a $ b\n', size),
+    'fullwidth_lines': lambda size: repeat('~~\na\n', size),
+    'unclosed_fullwidth_lines': lambda size: repeat('~~u\na\n', size),
+    'open_link_lines': lambda size: repeat('[a\nb\n', size),
+    'quote_run': lambda size: repeat('> a\n', size),
+    'nested_quote': lambda size: repeat('>' * 50 + ' a\n', size),
+    'callout_run': lambda size: '> [!summary] t\n' + repeat('> a\n', size),
+    'callout_heads': lambda size: repeat('> [!note] a @ b\n', size),
+    'table_run': lambda size: '| a | b |\n|---|---|\n' + repeat('| 1 | 2 |\n', size),
+    'table_heads': lambda size: repeat('| a |\n|---|\n', size),
+    'table_no_blank': lambda size: repeat('| a |\n|-|\n```\n', size),
+    'deep_list': lambda size: ''.join('    ' * (i % 200) + '- a\n' for i in range(size // 400)),
+    'blank_lines': lambda size: repeat('\n', size),
+}
+
+FUZZ_TOKENS = ['$', '$$', '`', '```', '~~u', '~~d', '~~', '**', '*', '[', ']', '(', ')', '[[', ']]', '|',
+               '|---|', '> ', '> [!note] ', '> [!summary] ', '@', '%%', '[fine]', '#', '- ', '    ', '\n',
+               '\n\n', '---', '!---', 'QED', '<u>', '</u>', 'a', '中文', ' ']
+
+def fuzz(size, seed=0):
+    """Random text made of the tokens the converter reacts to."""
+    rng = random.Random(seed)
+    out = []
+    length = 0
+    while length < size:
+        token = rng.choice(FUZZ_TOKENS)
+        out.append(token)
+        length += len(token)
+    return ''.join(out)
+
+for seed in range(3):
+    CASES[f"fuzz_{seed}"] = lambda size, seed=seed: fuzz(size, seed)
+
+# =============================================================================
+# STAGES
+# =============================================================================
+
+def pipeline_stages(text):
+    """Each stage of convert_markdown, fed the output of the previous one."""
+    spans = []
+    lines = md2tex.lift_verbatim_spans(text, spans)
+    blocks = md2tex.parse_blocks(lines)
+    latex = '\n'.join(md2tex.emit_latex(blocks, spans))
+    latex = md2tex.convert_enumerate(latex, False)
+    md2tex.restore_spans(latex, spans)
+
+def slide_stages(text):
+    """The slides target, emitted from one parse."""
+    blocks, spans = md2tex.parse_markdown(text)
+    md2tex.emit_target(blocks, spans, 'slides')
+
+STAGES = {
+    'convert_markdown': md2tex.convert_markdown,
+    'pipeline_stages': pipeline_stages,
+    'slide_stages': slide_stages,
+    'render_note': lambda text: preview.render_note(text, '.'),
+    'convert_images': md2tex.convert_images,
+    'convert_codes': md2tex.convert_codes,
+    'match_callout': lambda text: [md2tex.match_callout(line) for line in text.split('\n') if line.startswith('>')],
+    'convert_enumerate': md2tex.convert_enumerate,
+}
+
+# Every stage is linear, at up to about 1.3 s/MB on the many-short-lines
+# cases; a quadratic one takes minutes at the default size
+BUDGET_PER_MB = 3.0
+
+def run_stage(case, stage, size, queue):
+    """Child process: build the document and report how long the stage took on it, or its error."""
+    text = CASES[case](size)
+    start = time.perf_counter()
+    try:
+        STAGES[stage](text)
+    except Exception as e:
+        queue.put(f"{type(e).__name__}: {e}")
+    else:
+        queue.put(time.perf_counter() - start)
+
+def stage_budget(size, per_mb=BUDGET_PER_MB):
+    """Seconds a stage may take on a document of size characters, at least a second for process start-up."""
+    return max(1.0, per_mb * size / 1_000_000)
+
+def time_stage(case, stage, size, budget):
+    """
+    Seconds the stage took on the case, an error message if it raised, or
+    None if it ran past the budget and was stopped.
+    """
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=run_stage, args=(case, stage, size, queue))
+    process.start()
+    process.join(budget)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+        return None
+    return queue.get()
+
+# =============================================================================
+# COMMAND LINE INTERFACE
+# =============================================================================
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check that no converter stage stalls on adversarial input.')
+    parser.add_argument('--size', type=int, default=4_000_000, help='Characters per adversarial document')
+    parser.add_argument('--budget', type=float, default=BUDGET_PER_MB, help='Seconds allowed per stage and MB of input')
+    parser.add_argument('--case', action='append', choices=sorted(CASES), help='Only run this case (repeatable)')
+    parser.add_argument('--stage', action='append', choices=sorted(STAGES), help='Only run this stage (repeatable)')
+    args = parser.parse_args()
+
+    budget = stage_budget(args.size, args.budget)
+    failures = []
+    for case in args.case or CASES:
+        for stage in args.stage or STAGES:
+            seconds = time_stage(case, stage, args.size, budget)
+            if seconds is None:
+                failures.append((case, stage))
+                print(f"  {case:<20} {stage:<18} [Stalled] stopped after {budget:.1f} s")
+            elif isinstance(seconds, str):
+                failures.append((case, stage))
+                print(f"  {case:<20} {stage:<18} [Error] {seconds}")
+            else:
+                print(f"  {case:<20} {stage:<18} {seconds * 1000:10.1f} ms")
+
+    for case, stage in failures:
+        print(f"[Failed] {stage} on {case}")
+    print(f"{len(failures)} of {len(args.case or CASES) * len(args.stage or STAGES)} runs failed or over budget.")
+    sys.exit(1 if failures else 0)
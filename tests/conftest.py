@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The toolkit is a set of scripts at the repository root, not a package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
@@ -0,0 +1,57 @@
+"""
+Build driver tests, with a stand-in compiler in place of xelatex.
+"""
+
+# Standard Library Imports
+import os
+import shlex
+import sys
+
+import pytest
+
+import build
+
+# Writes the same .aux on every pass, so only a first pass without one changes
+# it, and counts its passes in passes.txt
+FAKE_COMPILER = """
+import sys
+document = sys.argv[-1]
+with open(document[:-4] + '.aux', 'w') as f:
+    f.write('\\\\relax\\n')
+with open('passes.txt', 'a') as f:
+    f.write('pass\\n')
+"""
+
+@pytest.fixture
+def compiler(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs(build.LOG_DIR)
+    with open('fake_tex.py', 'w', encoding='utf-8') as f:
+        f.write(FAKE_COMPILER)
+    with open('master.tex', 'w', encoding='utf-8') as f:
+        f.write('\\documentclass{article}\n')
+    return f"{shlex.quote(sys.executable)} fake_tex.py"
+
+def passes_run():
+    with open('passes.txt', 'r', encoding='utf-8') as f:
+        return len(f.readlines())
+
+def test_rerun_stops_once_the_aux_settles(compiler):
+    result = build.compile_document('master.tex', compiler)
+    assert result['ok']
+    assert result['passes'] == passes_run() == 2
+
+def test_single_pass_when_nothing_changes(compiler):
+    with open('master.aux', 'w', encoding='utf-8') as f:
+        f.write('\\relax\n')
+    result = build.compile_document('master.tex', compiler)
+    assert result['ok']
+    assert result['passes'] == passes_run() == 1
+
+def test_missing_compiler_fails_the_build_entry(compiler):
+    result = build.compile_document('master.tex', 'no-such-tex-engine -interaction=nonstopmode')
+    assert not result['ok']
+    assert result['passes'] == 0
+    [issue] = build.triage_log(result['log'])
+    assert issue['kind'] == 'error'
+    assert issue['message'].startswith('Could not run no-such-tex-engine: FileNotFoundError')
@@ -0,0 +1,426 @@
+"""
+Converter regression tests. Each tests/fixtures/<name>.md is converted and
+compared with <name>.tex. Where the block-tree converter deliberately
+differs from the regex pipeline it replaced, that pipeline's output is kept
+next to it as <name>.baseline.tex and the reason is listed in INTENTIONAL.
+"""
+
+# Standard Library Imports
+import glob
+import json
+import os
+import shutil
+import time
+
+import pytest
+
+import md2tex
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+INTENTIONAL = {
+    'headers_only_table': "the old pipeline raised IndexError on a table without data rows",
+    'callout_code_title': "titled callouts split the old inline-code placeholders at their '@'",
+    'stray_math_in_table': "a $$ block swallowed by a table became three empty rows instead of one",
+    'table_alignment': "columns follow the separator row's alignment instead of always c",
+    'mixed_note': "columns follow the separator row's alignment instead of always c",
+}
+
+def read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+def fixture_names():
+    return sorted(os.path.basename(path)[:-3] for path in glob.glob(os.path.join(FIXTURES, '*.md')))
+
+def make_vault(root, names=None):
+    """A vault under root with the named fixtures, or all of them, as its notes; returns (MdFiles, TeXFiles)."""
+    input_root = os.path.join(root, 'MdFiles')
+    os.makedirs(input_root)
+    for name in fixture_names() if names is None else names:
+        shutil.copyfile(os.path.join(FIXTURES, name + '.md'), os.path.join(input_root, name + '.md'))
+    return input_root, os.path.join(root, 'TeXFiles')
+
+def output_files(output_root):
+    """{relative path: bytes} of every file under output_root."""
+    files = {}
+    for folder, _, names in os.walk(output_root):
+        for name in names:
+            path = os.path.join(folder, name)
+            with open(path, 'rb') as f:
+                files[os.path.relpath(path, output_root)] = f.read()
+    return files
+
+# =============================================================================
+# GOLDEN FIXTURES
+# =============================================================================
+
+@pytest.mark.parametrize('name', fixture_names())
+def test_fixture(name):
+    expected = read(os.path.join(FIXTURES, name + '.tex'))
+    assert md2tex.convert_markdown(read(os.path.join(FIXTURES, name + '.md'))) + '\n' == expected
+
+@pytest.mark.parametrize('name', fixture_names())
+def test_baseline_differences_are_listed(name):
+    baseline = os.path.join(FIXTURES, name + '.baseline.tex')
+    if os.path.exists(baseline):
+        assert name in INTENTIONAL
+        assert read(baseline) != read(os.path.join(FIXTURES, name + '.tex'))
+
+# =============================================================================
+# CALLOUTS
+# =============================================================================
+
+@pytest.fixture
+def restore_callouts():
+    yield
+    md2tex.compile_callouts(md2tex.DEFAULT_CALLOUTS)
+
+def test_vault_callout_config(tmp_path, restore_callouts, capsys):
+    config = tmp_path / md2tex.CALLOUT_CONFIG
+    config.write_text(json.dumps({'callouts': {
+        'proof': {'form': 'block', 'env': 'proof'},
+        'note': {'form': 'single', 'env': 'remark'},
+        'broken': {'form': 'box'},
+    }}), encoding='utf-8')
+    registry = md2tex.load_callout_config(str(config))
+    assert "callout 'broken' needs a form" in capsys.readouterr().out
+    assert 'broken' not in registry
+
+    out = md2tex.convert_markdown('> [!proof] Why\n> because\n\n> [!note] plain')
+    assert '\\begin{proof}[Why]\nbecause\n\\end{proof}' in out
+    assert '\\begin{remark}\nplain\n\\end{remark}' in out
+    assert md2tex.patterns['callout_head'].match('> [!cor] x').group(1) == 'cor'
+
+    # Switching registries reuses the dispatch pattern compiled for each
+    head = md2tex.patterns['callout_head']
+    md2tex.compile_callouts(md2tex.DEFAULT_CALLOUTS)
+    md2tex.compile_callouts(registry)
+    assert md2tex.patterns['callout_head'] is head
+
+# =============================================================================
+# LINKS
+# =============================================================================
+
+@pytest.mark.parametrize('text, expected', [
+    ('[x](http://a.com/$a$b)', '\\href{http://a.com/$a$b}{x}'),
+    ('[x](http://a/`b`)', '\\href{http://a/`b`}{x}'),
+    ('[`y`](z) and $c$', '\\href{z}{\\texttt{y}} and $c$'),
+])
+def test_link_targets_keep_math_and_code_verbatim(text, expected):
+    assert md2tex.convert_markdown(text) == expected
+    assert '\x00' not in md2tex.convert_markdown(f"| a |\n|---|\n| {text} |")
+
+# =============================================================================
+# TABLES
+# =============================================================================
+
+def long_table(prefix=''):
+    rows = ''.join(f"| {i} | x |\n" for i in range(md2tex.LONGTABLE_ROWS + 10))
+    return f"{prefix}| a | b |\n|---|---|\n{rows}"
+
+def test_long_table_is_a_longtable():
+    assert '\\begin{longtable}' in md2tex.convert_markdown(long_table())
+
+@pytest.mark.parametrize('text', [
+    '> [!summary] S\n> intro\n' + long_table(),
+    '~~u\n' + long_table() + '~~d\n',
+])
+def test_no_longtable_inside_callouts_or_fullwidth(text):
+    out = md2tex.convert_markdown(text)
+    assert '\\begin{tabular}' in out
+    assert 'longtable' not in out
+
+def test_no_longtable_in_slides():
+    out = md2tex.convert_targets('# T\n\n' + long_table(), targets=('slides',))['slides']
+    assert '\\begin{frame}' in out
+    assert 'longtable' not in out
+
+# =============================================================================
+# PROFILING
+# =============================================================================
+
+def test_file_totals_leave_out_nested_stages():
+    md2tex.enable_profiling()
+    try:
+        md2tex.convert_markdown('# T\n\n' + long_table())
+    finally:
+        profile = md2tex.disable_profiling()
+    stages = profile['files']['<text>']['stages']
+    assert stages['render_table']['time'] > 0
+    [(name, seconds)] = md2tex.summarize_profile(profile)['files']
+    assert name == '<text>'
+    assert seconds == pytest.approx(sum(stage['time'] for name, stage in stages.items() if name != 'render_table'))
+
+# =============================================================================
+# DIRECTORY CONVERSION
+# =============================================================================
+
+def write_note(input_root, name, text):
+    with open(os.path.join(input_root, name), 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_unchanged_notes_are_cache_hits(tmp_path):
+    input_root, output_root = make_vault(str(tmp_path), ['short_note', 'titled_callouts'])
+    report = md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    assert report['rebuilt'] == ['short_note.md', 'titled_callouts.md']
+    before = output_files(output_root)
+    mtime = os.stat(os.path.join(output_root, 'short_note.tex')).st_mtime_ns
+
+    report = md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    assert (report['hit'], report['rebuilt']) == (['short_note.md', 'titled_callouts.md'], [])
+    assert os.stat(os.path.join(output_root, 'short_note.tex')).st_mtime_ns == mtime
+
+    write_note(input_root, 'titled_callouts.md', '> [!note] edited\n')
+    report = md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    assert (report['hit'], report['rebuilt']) == (['short_note.md'], ['titled_callouts.md'])
+    assert read(os.path.join(output_root, 'titled_callouts.tex')) != before['titled_callouts.tex'].decode('utf-8')
+
+    report = md2tex.convert_all_md_in_directory(force=True, input_root=input_root, output_root=output_root)
+    assert report['rebuilt'] == ['short_note.md', 'titled_callouts.md']
+
+def test_watch_rebuilds_saved_notes(tmp_path, monkeypatch):
+    input_root, output_root = make_vault(str(tmp_path), ['short_note'])
+    monkeypatch.chdir(tmp_path)
+    polls = []
+
+    def sleep(seconds):
+        # The note is saved before the first poll, and the watch stopped before the second
+        polls.append(seconds)
+        if len(polls) > 1:
+            raise KeyboardInterrupt
+        write_note(input_root, 'short_note.md', '# Saved\n')
+
+    monkeypatch.setattr(time, 'sleep', sleep)
+    md2tex.watch_directory(debounce=0, hook='echo > hooked', input_root=input_root, output_root=output_root)
+    assert read(os.path.join(output_root, 'short_note.tex')) == '\\section{Saved}'
+    assert os.path.exists('hooked')
+
+def test_chapter_list_and_dirty_only(tmp_path):
+    input_root, output_root = make_vault(str(tmp_path), ['short_note', 'titled_callouts'])
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    chapters = '\\include{TeXFiles/short_note}\n\\include{TeXFiles/titled_callouts}\n'
+    assert read(os.path.join(output_root, md2tex.CHAPTER_LIST)) == chapters
+    assert read(os.path.join(output_root, md2tex.INCLUDE_ONLY)) == ''
+
+    write_note(input_root, 'short_note.md', '# Edited\n')
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root, dirty_only=True)
+    assert read(os.path.join(output_root, md2tex.CHAPTER_LIST)) == chapters
+    assert read(os.path.join(output_root, md2tex.INCLUDE_ONLY)) == '\\includeonly{TeXFiles/short_note}\n'
+
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    assert read(os.path.join(output_root, md2tex.INCLUDE_ONLY)) == ''
+
+def test_code_is_pre_highlighted_into_snippets(tmp_path, monkeypatch):
+    pytest.importorskip('pygments')
+    input_root, output_root = make_vault(str(tmp_path), ['short_note'])
+    os.makedirs(tmp_path / 'Assets' / 'Codes')
+    (tmp_path / 'Assets' / 'Codes' / 'algo.py').write_text('a = 1\nb = 2\nc = 3\n', encoding='utf-8')
+    write_note(input_root, 'a.md', '[[algo.py|Algo|2:3]]\n\n```python\nprint(1)\n```\n')
+    monkeypatch.setattr(md2tex, 'SNIPPETS', None)
+    md2tex.use_code_snippets(str(tmp_path))
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+
+    embed = md2tex.snippet_name('Assets/Codes/algo.py', 2, 3, md2tex.SNIPPET_STYLE)
+    latex = read(os.path.join(output_root, 'a.tex'))
+    assert f"\\includesnippet{{Algo}}{{{md2tex.SNIPPET_DIR}/{embed}}}" in latex
+    assert f"\\input{{{md2tex.SNIPPET_DIR}/fence-" in latex
+    snippets = os.path.join(str(tmp_path), md2tex.SNIPPET_DIR)
+    fragment = read(os.path.join(snippets, embed))
+    assert '{n}{b}' in fragment and '{n}{a}' not in fragment
+    fences = [name for name in os.listdir(snippets) if name.startswith('fence-')]
+    assert len(fences) == 1 and fences[0] in latex
+    assert os.path.exists(os.path.join(snippets, md2tex.SNIPPET_STYLE_FILE))
+
+    # A note no longer embedding the code leaves no fragment behind
+    write_note(input_root, 'a.md', 'plain\n')
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    assert sorted(os.listdir(snippets)) == sorted([md2tex.SNIPPET_INDEX, md2tex.SNIPPET_STYLE_FILE])
+
+def test_every_target_is_written_from_one_run(tmp_path):
+    input_root, output_root = make_vault(str(tmp_path), [])
+    write_note(input_root, 'a.md', '# Part\n\n## Topic\n\nText\n')
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root, targets=tuple(md2tex.TARGETS))
+    handout, report, slides = (str(tmp_path / folder / 'a.tex') for folder in ('TeXFiles', 'Reports', 'Slides'))
+    assert read(handout) == '\\section{Part}\n\n\\section{Topic}\n\nText'
+    assert read(report) == '\\section{Part}\n\n\\subsection{Topic}\n\nText'
+    assert '\\begin{frame}[fragile]{Topic}\nText\n\\end{frame}' in read(slides)
+    assert md2tex.convert_targets(read(os.path.join(input_root, 'a.md')), ['slides'])['slides'] == read(slides)
+    assert [os.path.exists(path + md2tex.SOURCE_MAP_SUFFIX) for path in (handout, report, slides)] == [True, True, False]
+
+    # A deleted note takes the outputs of every target with it
+    os.remove(os.path.join(input_root, 'a.md'))
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root, targets=tuple(md2tex.TARGETS))
+    assert not any(os.path.exists(path) for path in (handout, report, slides))
+
+def test_parallel_output_matches_serial(tmp_path):
+    outputs = {}
+    for jobs in (1, 4):
+        input_root, output_root = make_vault(str(tmp_path / f"j{jobs}"))
+        report = md2tex.convert_all_md_in_directory(n_jobs=jobs, input_root=input_root, output_root=output_root)
+        assert not report['failed']
+        outputs[jobs] = output_files(output_root)
+    assert md2tex.CACHE_MANIFEST in outputs[1]
+    assert sorted(name for name in outputs[1] if name.endswith('.tex')) == sorted(
+        [name + '.tex' for name in fixture_names()] + [md2tex.CHAPTER_LIST, md2tex.INCLUDE_ONLY])
+    assert outputs[4] == outputs[1]
+
+# =============================================================================
+# STREAMING
+# =============================================================================
+
+STREAMED_NOTE = ''.join(f"""# Part {i}
+
+## Topic {i}
+
+Text {i}
+- a
+- b
+
+---
+
+More {i} with `code` and $x$
+
+#Warning not a heading
+
+""" for i in range(20))
+
+def convert_both_ways(tmp_path, text, chunk_size=64):
+    """{(streamed, target): bytes} of text converted whole and in small chunks, source maps included."""
+    input_file = str(tmp_path / 'note.md')
+    with open(input_file, 'w', encoding='utf-8') as f:
+        f.write(text)
+    outputs = {}
+    for streamed in (False, True):
+        paths = {target: str(tmp_path / f"{target}-{streamed}.tex") for target in md2tex.TARGETS}
+        extra_outputs = {target: path for target, path in paths.items() if target != 'handout'}
+        if streamed:
+            md2tex.stream_md_to_tex(input_file, paths['handout'], chunk_size, extra_outputs, source_maps=True)
+        else:
+            md2tex.convert_md_to_tex(input_file, paths['handout'], False, extra_outputs, source_maps=True)
+        for target, path in paths.items():
+            for suffix in ('', md2tex.SOURCE_MAP_SUFFIX):
+                if os.path.exists(path + suffix):
+                    with open(path + suffix, 'rb') as f:
+                        outputs[streamed, target + suffix] = f.read()
+    return outputs
+
+@pytest.mark.parametrize('target', list(md2tex.TARGETS))
+def test_streamed_output_matches_whole(tmp_path, target):
+    outputs = convert_both_ways(tmp_path, STREAMED_NOTE)
+    assert outputs[True, target] == outputs[False, target]
+
+def test_streamed_source_map_matches_whole(tmp_path):
+    # Every blank line is a chunk boundary, so each list opens a chunk
+    text = "Intro\n\n- a\n- b\n    - c\n\nmid\n\n- d\n\nend\n"
+    outputs = convert_both_ways(tmp_path, text, chunk_size=1)
+    for target in ('handout', 'report'):
+        assert outputs[True, target + md2tex.SOURCE_MAP_SUFFIX] == outputs[False, target + md2tex.SOURCE_MAP_SUFFIX]
+
+    output_file = str(tmp_path / 'handout-False.tex')
+    source_map = md2tex.load_source_map(output_file)
+    tex_lines = read(output_file).split('\n')
+    md_lines = text.split('\n')
+    # An enumerate opener goes with the list item it opens
+    for tex_line, tex in enumerate(tex_lines, 1):
+        if tex == md2tex.ENUMERATE_BEGIN:
+            item = md_lines[md2tex.source_line(source_map, tex_line) - 1]
+            assert tex_lines[tex_line] == '\\item ' + item.strip().lstrip('- ')
+
+# =============================================================================
+# SOURCE MAPS
+# =============================================================================
+
+MAPPED_NOTE = """# Title
+
+| a | b |
+|---|---|
+| 1 | 2 |
+
+```py
+def f():
+    return 1
+```
+
+~~u
+wide line one
+wide line two
+~~d
+after
+
+~~
+- item
+~~
+QED
+"""
+
+def test_source_map_lookups(tmp_path):
+    input_file, output_file = str(tmp_path / 'note.md'), str(tmp_path / 'note.tex')
+    with open(input_file, 'w', encoding='utf-8') as f:
+        f.write(MAPPED_NOTE)
+    md2tex.convert_md_to_tex(input_file, output_file, source_maps=True)
+    source_map = md2tex.load_source_map(output_file)
+    assert source_map['source'] == input_file
+
+    md_lines = MAPPED_NOTE.split('\n')
+    def source_of(tex):
+        tex_line = read(output_file).split('\n').index(tex) + 1
+        return md_lines[md2tex.source_line(source_map, tex_line) - 1]
+
+    assert source_of('\\section{Title}') == '# Title'
+    assert source_of('\\begin{tabular}{c|c}') in md_lines[2:5]
+    assert source_of('1  & 2  \\\\') in md_lines[2:5]
+    assert source_of('    return 1') == '    return 1'
+    assert source_of('\\end{lstlisting}') == '```'
+    assert source_of('wide line one') == 'wide line one'
+    assert source_of('wide line two') == 'wide line two'
+    assert source_of('after') == 'after'
+    assert source_of('\\item item') == '- item'
+    assert source_of('\\qedz') == 'QED'
+
+
+def test_links_in_tables_are_dependencies(tmp_path):
+    input_root, output_root = make_vault(str(tmp_path), ['short_note'])
+    write_note(input_root, 'a.md', '| a | b |\n|---|---|\n| [[other]] | x |\n')
+    write_note(input_root, 'other.md', 'first\n')
+    md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    manifest = md2tex.load_cache_manifest(os.path.join(output_root, md2tex.CACHE_MANIFEST))
+    assert manifest['files']['a.md']['deps']['notes'] == ['other.md']
+    assert md2tex.dependents(manifest, ['other.md']) == ['a.md']
+
+    write_note(input_root, 'other.md', 'second\n')
+    report = md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+    assert report['rebuilt'] == ['other.md']
+    assert report['affected'] == ['a.md']
+
+def test_missing_images_are_reported_on_cache_hits(tmp_path, monkeypatch, capsys):
+    input_root, output_root = make_vault(str(tmp_path), ['short_note'])
+    write_note(input_root, 'a.md', '![[gone.png]]\n')
+    monkeypatch.setattr(md2tex, 'ASSETS', {'root': str(tmp_path), 'map': {}, 'missing': []})
+    for hit in ([], ['a.md', 'short_note.md']):
+        report = md2tex.convert_all_md_in_directory(input_root=input_root, output_root=output_root)
+        assert report['hit'] == hit
+        warnings = [line for line in capsys.readouterr().out.split('\n') if line.startswith('[Warning]')]
+        assert warnings == [f"[Warning] {os.path.join(input_root, 'a.md')}: missing images Assets/Images/gone.png"]
+
+# =============================================================================
+# LIBRARY API
+# =============================================================================
+
+def test_convert_many_uses_explicit_roots(tmp_path, monkeypatch):
+    input_root, output_root = make_vault(str(tmp_path / 'vault'), ['short_note', 'titled_callouts'])
+    monkeypatch.chdir(tmp_path)  # Neither root is the working directory
+    items = ['titled_callouts.md', ('memo', '# Memo'), 'short_note.md']
+    results = list(md2tex.convert_many(items, input_root, output_root))
+    assert [name for name, _ in results] == ['titled_callouts.md', 'memo', 'short_note.md']
+    assert results[1][1] == '\\section{Memo}'
+    for name in ('titled_callouts', 'short_note'):
+        expected = read(os.path.join(FIXTURES, name + '.tex'))
+        assert read(os.path.join(output_root, name + '.tex')) + '\n' == expected
+    assert read(os.path.join(output_root, 'memo.tex')) == '\\section{Memo}'
+
+def test_convert_options_leave_the_active_callouts(restore_callouts):
+    options = {'callouts': {'aside': {'form': 'single', 'env': 'aside'}}}
+    assert md2tex.convert('> [!aside] x', options) == '\\vspace{5pt}\n\\begin{aside}\nx\n\\end{aside}\n\\vspace{5pt}'
+    assert md2tex.CALLOUTS == md2tex.DEFAULT_CALLOUTS
+    assert '\\begin{zoe}' in md2tex.convert('> [!aside] x')
@@ -0,0 +1,19 @@
+"""
+A small run of stress.py: every adversarial case through every stage, so a
+stage turning quadratic on half-typed input fails here rather than stalling
+the watch loop. The default 4 MB run stays a manual check.
+"""
+
+import pytest
+
+import stress
+
+SIZE = 50_000
+
+@pytest.mark.parametrize('case', sorted(stress.CASES))
+def test_stages_stay_within_budget(case):
+    budget = stress.stage_budget(SIZE)
+    for stage in stress.STAGES:
+        seconds = stress.time_stage(case, stage, SIZE, budget)
+        assert seconds is not None, f"{stage} stalled past {budget:.1f} s"
+        assert not isinstance(seconds, str), f"{stage} raised {seconds}"